@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Times each phase of yabt against a synthetic bundle built by make_bundle.py:
+detection, extraction, decompression, JSON formatting, node discovery, the log
+scan, and each individual health check.  Every run is appended to a history
+file so results can be compared over time and regressions caught.
+
+Example:
+	python3 bench/bench.py --masters 3 --agents 1000 --log-mb 50
+"""
+
+
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import subprocess
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+import d2yabt
+import make_bundle
+
+
+
+DEFAULT_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.jsonl")
+
+
+
+class PhaseTimer:
+	"""This class records how long each phase of a run takes.
+	"""
+	def __init__(self, quiet=True):
+		self.quiet = quiet
+		self.phases = list()
+
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		"""Time the code within a with block as the named phase.  Output printed by
+		yabt during the phase is thrown away unless quiet is False.
+		"""
+		start_time = time.perf_counter()
+
+		if self.quiet:
+			with contextlib.redirect_stdout(io.StringIO()):
+				yield
+
+		else:
+			yield
+
+		self.phases.append((name, time.perf_counter() - start_time))
+
+
+
+def _get_git_revision():
+	"""Returns the git revision of the yabt being benchmarked, or None.
+	"""
+	try:
+		return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode("utf-8").strip()
+
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+
+def run_pipeline(bundle_file, bundle_type, timer, jobs=None, no_extract=False):
+	"""Run yabt against a bundle the same way bin/yabt does, timing each phase.
+	"""
+	d2yabt.util._bundle_type_cache.clear()
+
+	with timer.phase("detect"):
+		d2yabt.util.get_bundle_type(bundle_file)
+
+	if bundle_type == "dcos_diag" and no_extract:
+		with timer.phase("open"):
+			bundle_dir = d2yabt.dcos.bundle.open_diag(bundle_file)
+
+	elif bundle_type == "dcos_diag":
+		with timer.phase("extract"):
+			bundle_dir = d2yabt.dcos.bundle.extract_diag(bundle_file)
+
+		with timer.phase("gunzip"):
+			d2yabt.util.decompress_gzip_files(bundle_dir, jobs=jobs)
+
+		with timer.phase("format_json"):
+			d2yabt.util.format_json(bundle_dir, jobs=jobs, max_size=100 * 1024 * 1024)
+
+	elif bundle_type == "dcos_oneliner":
+		with timer.phase("extract"):
+			bundle_dir = d2yabt.dcos.bundle.extract_oneliner(bundle_file)
+
+	elif bundle_type == "service_diag":
+		with timer.phase("extract"):
+			bundle_dir = d2yabt.service.bundle.extract(bundle_file)
+
+	elif bundle_type == "konvoy_diag":
+		with timer.phase("extract"):
+			bundle_dir = d2yabt.konvoy.bundle.extract(bundle_file, jobs=jobs)
+
+	if bundle_type in ("dcos_diag", "dcos_oneliner"):
+		with timer.phase("get_nodes"):
+			node_objs = d2yabt.dcos.bundle.get_nodes(bundle_dir, bundle_type)
+			d2yabt.dcos.bundle.get_node_info(node_objs)
+
+		# Scan the logs up front so the log checks below are timed on their own
+		with timer.phase("scan_logs"):
+			d2yabt.dcos.check.scan_logs(node_objs, jobs=jobs)
+
+		for check in d2yabt.registry.get_checks(bundle_type):
+			with timer.phase("check:" + check.name):
+				check.run(node_objs, bundle_dir)
+
+	elif bundle_type == "konvoy_diag":
+		with timer.phase("get_nodes"):
+			d2yabt.konvoy.bundle.get_nodes(bundle_dir)
+
+
+
+def load_history(history_file):
+	"""Returns the list of previous runs from a history file.
+	"""
+	history = list()
+
+	if not os.path.exists(history_file):
+		return history
+
+	with open(history_file, "r", encoding="utf-8") as history_handle:
+		for each_line in history_handle:
+			if each_line.strip():
+				history.append(json.loads(each_line))
+
+	return history
+
+
+
+def print_results(record, previous):
+	"""Print a table of phase timings, compared against a previous run if there is one.
+	"""
+	previous_phases = previous["phases"] if previous else dict()
+
+	print("{:<40} {:>10} {:>10} {:>8}".format("Phase", "Seconds", "Previous", "Change"))
+
+	for name, seconds in record["phases"].items():
+		if name in previous_phases and previous_phases[name] > 0:
+			change = "{:+.0%}".format(seconds / previous_phases[name] - 1)
+			previous_seconds = "{:.3f}".format(previous_phases[name])
+
+		else:
+			change = ""
+			previous_seconds = ""
+
+		print("{:<40} {:>10.3f} {:>10} {:>8}".format(name, seconds, previous_seconds, change))
+
+	print("{:<40} {:>10.3f}".format("total", record["total"]))
+
+	if previous:
+		print("Compared against the run at", previous["time"], "(" + str(previous["revision"]) + ")")
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark each phase of yabt against a synthetic bundle")
+
+	parser.add_argument("--type", dest="bundle_type", default="dcos_diag",
+							choices=("dcos_diag", "dcos_oneliner", "service_diag", "konvoy_diag"),
+							help="the type of bundle to benchmark (default: dcos_diag)")
+
+	parser.add_argument("--masters", type=int, default=3,
+							help="number of masters (default: 3)")
+
+	parser.add_argument("--agents", type=int, default=10,
+							help="number of agents (default: 10)")
+
+	parser.add_argument("--log-mb", type=float, default=1.0,
+							help="size of each master's Mesos log in MB (default: 1)")
+
+	parser.add_argument("--density", type=float, default=0.01,
+							help="fraction of log lines which are events the checks look for (default: 0.01)")
+
+	parser.add_argument("--seed", type=int, default=0,
+							help="random seed for the bundle (default: 0)")
+
+	parser.add_argument("-j", "--jobs", type=int, default=None,
+							help="number of worker processes yabt uses (default: one per CPU)")
+
+	parser.add_argument("--no-extract", action="store_true",
+							help="read a DC/OS diagnostic bundle in place instead of extracting it")
+
+	parser.add_argument("--bundle",
+							help="benchmark this bundle file instead of building a synthetic one")
+
+	parser.add_argument("--history", default=DEFAULT_HISTORY,
+							help="file the results are appended to (default: bench/history.jsonl)")
+
+	parser.add_argument("--no-history", action="store_true",
+							help="do not record this run in the history file")
+
+	parser.add_argument("--verbose", action="store_true",
+							help="show yabt's output while benchmarking")
+
+	bench_args = parser.parse_args()
+
+	work_dir = tempfile.mkdtemp(prefix="yabt-bench-")
+	start_dir = os.getcwd()
+
+	try:
+		if bench_args.bundle:
+			bundle_file = shutil.copy(bench_args.bundle, work_dir)
+			bundle_type = d2yabt.util.get_bundle_type(bundle_file)
+			generate_seconds = None
+
+		else:
+			print("Building synthetic", bench_args.bundle_type, "bundle in", work_dir)
+
+			start_time = time.perf_counter()
+
+			bundle_file = make_bundle.make_bundle(bench_args.bundle_type, work_dir, masters=bench_args.masters, agents=bench_args.agents, log_mb=bench_args.log_mb, density=bench_args.density, seed=bench_args.seed)
+			bundle_type = bench_args.bundle_type
+
+			generate_seconds = time.perf_counter() - start_time
+
+		# yabt extracts bundles into the current directory
+		os.chdir(work_dir)
+
+		timer = PhaseTimer(quiet=not bench_args.verbose)
+
+		run_pipeline(os.path.basename(bundle_file), bundle_type, timer, jobs=bench_args.jobs, no_extract=bench_args.no_extract)
+
+	finally:
+		os.chdir(start_dir)
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+	record = {
+		"time": datetime.datetime.now().isoformat(timespec="seconds"),
+		"revision": _get_git_revision(),
+		"version": d2yabt.__version__,
+		"params": {
+			"type": bundle_type,
+			"bundle": os.path.basename(bench_args.bundle) if bench_args.bundle else None,
+			"masters": bench_args.masters,
+			"agents": bench_args.agents,
+			"log_mb": bench_args.log_mb,
+			"density": bench_args.density,
+			"seed": bench_args.seed,
+			"jobs": d2yabt.util.worker_count(bench_args.jobs),
+			"no_extract": bench_args.no_extract,
+		},
+		"generate_seconds": generate_seconds,
+		"phases": dict((name, round(seconds, 6)) for name, seconds in timer.phases),
+		"total": round(sum(x[1] for x in timer.phases), 6),
+	}
+
+	# Only runs with the same parameters are comparable
+	previous_runs = [x for x in load_history(bench_args.history) if x["params"] == record["params"]]
+
+	print_results(record, previous_runs[-1] if previous_runs else None)
+
+	if not bench_args.no_history:
+		with open(bench_args.history, "a", encoding="utf-8") as history_handle:
+			history_handle.write(json.dumps(record) + "\n")
+
+	sys.exit(0)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Measures how fast the Mesos master log patterns are matched, in lines per
+second, against a synthetic log.  Three approaches are compared:
+
+	per-check: each check reads the log itself, runs a cheap prefilter regex on
+		every line and its full regex only on the lines which pass, as the checks
+		did before the log scanner existed
+	single pass: the log is read once and every pattern's regex is run on every line
+	log scanner: memory maps the log, finds each pattern's required literal in
+		the whole buffer and only decodes and runs the regex on those lines
+
+Example:
+	python3 bench/bench_matcher.py --log-mb 2048
+"""
+
+
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+
+import d2yabt
+import make_bundle
+
+
+
+# The prefilter each Mesos master log check ran on every line before its full regex
+PER_CHECK_PREFILTERS = {
+	"unreachable_agents_mesos_log": r"Marking agent.*unreachable",
+	"mesos_leader_changes": r"new leading master",
+	"overlay_master_recovering": r"RECOVERING",
+}
+
+
+
+def per_check(log, patterns):
+	"""Read the log once per pattern, running the pattern's uncompiled prefilter
+	on every line and its uncompiled regex on the lines which pass.
+	"""
+	match_count = 0
+
+	for log_pattern in patterns:
+		prefilter = PER_CHECK_PREFILTERS[log_pattern.name]
+
+		with open(log, "r", encoding="utf-8") as log_handle:
+			for each_line in log_handle:
+				each_line = each_line.rstrip("\n")
+
+				if re.search(prefilter, each_line) is None:
+					continue
+
+				if re.search(log_pattern.regex.pattern, each_line) is not None:
+					match_count += 1
+
+	return match_count
+
+
+
+def single_pass(log, patterns):
+	"""Read the log once, running every compiled regex on every line.
+	"""
+	match_count = 0
+
+	with open(log, "r", encoding="utf-8") as log_handle:
+		for each_line in log_handle:
+			each_line = each_line.rstrip("\n")
+
+			for log_pattern in patterns:
+				if log_pattern.regex.search(each_line) is not None:
+					match_count += 1
+
+	return match_count
+
+
+
+def log_scanner(log, patterns):
+	"""Read the log with the log scanner.
+	"""
+	log_matches = dict((x.name, list()) for x in patterns)
+
+	d2yabt.scan._scan_log(log, patterns, log_matches)
+
+	return sum(len(x) for x in log_matches.values())
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark Mesos master log pattern matching")
+
+	parser.add_argument("--log-mb", type=float, default=256,
+							help="size of the synthetic Mesos master log in MB (default: 256)")
+
+	parser.add_argument("--density", type=float, default=0.001,
+							help="fraction of log lines which are events the checks look for (default: 0.001)")
+
+	parser.add_argument("--skip-per-check", action="store_true",
+							help="skip the per-check approach, which is by far the slowest")
+
+	bench_args = parser.parse_args()
+
+	# first_only patterns would stop the scanner early, search for every match to compare like with like
+	patterns = list()
+
+	for log_pattern in d2yabt.dcos.check.LOG_SCANNER._patterns:
+		if log_pattern.log_glob == "dcos-mesos-master.service*":
+			patterns.append(d2yabt.scan.LogPattern(log_pattern.name, log_pattern.log_glob, log_pattern.regex.pattern))
+
+	print("Patterns and their required literals:")
+
+	for log_pattern in patterns:
+		print("	" + log_pattern.name.ljust(30), repr(log_pattern.literal))
+
+	log_fd, log = tempfile.mkstemp(prefix="yabt-bench-", suffix=".log")
+
+	try:
+		print("Writing", bench_args.log_mb, "MB synthetic Mesos master log to", log)
+
+		with os.fdopen(log_fd, "w", encoding="utf-8") as log_handle:
+			make_bundle.write_mesos_master_log(log_handle, int(bench_args.log_mb * 1024 * 1024), bench_args.density, make_bundle.master_ips(3), make_bundle.agent_ips(1000), random.Random(0))
+
+		with open(log, "rb") as log_handle:
+			line_count = sum(1 for _ in log_handle)
+
+		approaches = [("single pass", single_pass), ("log scanner", log_scanner)]
+
+		if not bench_args.skip_per_check:
+			approaches.insert(0, ("per-check", per_check))
+
+		print("{:<15} {:>10} {:>16} {:>10} {:>10}".format("Approach", "Seconds", "Lines/sec", "MB/sec", "Matches"))
+
+		for approach_name, approach in approaches:
+			start_time = time.perf_counter()
+
+			match_count = approach(log, patterns)
+
+			seconds = time.perf_counter() - start_time
+
+			print("{:<15} {:>10.2f} {:>16,.0f} {:>10.1f} {:>10}".format(approach_name, seconds, line_count / seconds, bench_args.log_mb / seconds, match_count))
+
+	finally:
+		os.remove(log)
+
+	sys.exit(0)
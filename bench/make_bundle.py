@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""Builds synthetic bundles for testing and benchmarking yabt.  The bundles have
+the same layout as the real ones (DC/OS diagnostic, DC/OS oneliner, service
+diagnostic, and Konvoy diagnostic) but their logs are generated, with a
+configurable number of nodes, log size, and density of the events the health
+checks look for.
+
+Example:
+	python3 bench/make_bundle.py --masters 3 --agents 1000 --log-mb 50 --output /tmp/bundles
+"""
+
+
+
+import os
+import io
+import sys
+import json
+import gzip
+import random
+import tarfile
+import zipfile
+import argparse
+import datetime
+
+
+
+START_TIME = datetime.datetime(2019, 8, 1, 0, 0, 0)
+
+
+
+def master_ips(count):
+	"""Returns a list of IPs for the masters.
+	"""
+	return ["10.0.0." + str(x + 1) for x in range(count)]
+
+
+
+def agent_ips(count):
+	"""Returns a list of IPs for the agents.
+	"""
+	return ["10.1." + str(x // 250) + "." + str(x % 250 + 1) for x in range(count)]
+
+
+
+def _log_lines(size_bytes, density, events, noise, rand):
+	"""Generate journal style log lines until size_bytes have been produced.
+		density: the fraction of lines which are events rather than noise
+		events: a list of functions which are given the timestamp text and return an event line
+		noise: a function which is given the timestamp text and returns a noise line
+	"""
+	written = 0
+	line_time = START_TIME
+
+	while written < size_bytes:
+		line_time += datetime.timedelta(microseconds=rand.randint(1000, 200000))
+		timestamp = line_time.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+		if events and rand.random() < density:
+			line = rand.choice(events)(timestamp)
+
+		else:
+			line = noise(timestamp)
+
+		line += "\n"
+		written += len(line)
+
+		yield line
+
+
+
+def _write_log(file_handle, size_bytes, density, events, noise, rand):
+	"""Write a generated log to a text file handle in large chunks.
+	"""
+	chunk = list()
+
+	for line in _log_lines(size_bytes, density, events, noise, rand):
+		chunk.append(line)
+
+		if len(chunk) == 10000:
+			file_handle.write("".join(chunk))
+			chunk = list()
+
+	file_handle.write("".join(chunk))
+
+
+
+def write_mesos_master_log(file_handle, size_bytes, density, masters, agents, rand):
+	"""Write a Mesos master log with unreachable agents, leader changes and overlay errors.
+	"""
+	events = [
+		lambda ts: ts + " master mesos-master[1234]: I0801 master.cpp:7912] Marking agent " + str(rand.randint(0, 9999)) + "-S1 at slave(1)@" + rand.choice(agents) + ":5051 (" + rand.choice(agents) + ") unreachable: health check timed out",
+		lambda ts: ts + " master mesos-master[1234]: I0801 detector.cpp:152] A new leading master (UPID=master@" + rand.choice(masters) + ":5050) is detected",
+		lambda ts: ts + " master mesos-master[1234]: E0801 overlay.cpp:401] overlay-master failed to handle request, in `RECOVERING` state",
+	]
+
+	noise = lambda ts: ts + " master mesos-master[1234]: I0801 master.cpp:" + str(rand.randint(1000, 9999)) + "] Processing ACCEPT call for offers: [ " + str(rand.randint(0, 10 ** 9)) + "-O" + str(rand.randint(0, 9999)) + " ] on agent"
+
+	_write_log(file_handle, size_bytes, density, events if agents else events[1:], noise, rand)
+
+
+
+def write_exhibitor_log(file_handle, size_bytes, density, masters, rand):
+	"""Write an Exhibitor/ZooKeeper log with fsync warnings, leader changes and connection errors.
+	"""
+	events = [
+		lambda ts: ts + " master java[999]: WARN [SyncThread:1:FileTxnLog@338] - fsync-ing the write ahead log in SyncThread:1 took " + str(rand.randint(1000, 30000)) + "ms which will adversely effect operation latency.",
+		lambda ts: ts + " master java[999]: INFO [QuorumPeer[myid=1]/0.0.0.0:2181:QuorumPeer@856] - LEADING",
+		lambda ts: ts + " master java[999]: WARN [QuorumPeer[myid=1]/0.0.0.0:2181:QuorumCnxManager@588] - Unexpected exception, tries=3, connecting to /" + rand.choice(masters) + ":2888",
+		lambda ts: ts + " master java[999]: ERROR [SyncThread:1] - Severe unrecoverable error, exiting java.io.IOException: No space left on device",
+	]
+
+	noise = lambda ts: ts + " master java[999]: INFO [ProcessThread(sid:1 cport:-1)::PrepRequestProcessor@648] - Got user-level KeeperException when processing sessionid:0x" + format(rand.getrandbits(48), "x")
+
+	_write_log(file_handle, size_bytes, density, events, noise, rand)
+
+
+
+def write_marathon_log(file_handle, size_bytes, density, masters, rand):
+	"""Write a Marathon log with leader elections.
+	"""
+	events = [
+		lambda ts: ts + " master marathon[555]: [" + ts + "] INFO  Leader won: " + rand.choice(masters) + ":8443 (mesosphere.marathon.core.election.impl.CuratorElectionService)",
+	]
+
+	noise = lambda ts: ts + " master marathon[555]: [" + ts + "] INFO  10.0.0.1 - - \"GET /v2/apps HTTP/1.1\" 200 " + str(rand.randint(100, 99999))
+
+	_write_log(file_handle, size_bytes, density, events, noise, rand)
+
+
+
+def write_agent_log(file_handle, size_bytes, density, rand):
+	"""Write a Mesos agent log with SSL certificate problems.
+	"""
+	events = [
+		lambda ts: ts + " agent mesos-agent[777]: E0801 fetcher.cpp:613] SSL certificate problem: unable to get local issuer certificate",
+	]
+
+	noise = lambda ts: ts + " agent mesos-agent[777]: I0801 slave.cpp:" + str(rand.randint(1000, 9999)) + "] Got assigned task '" + format(rand.getrandbits(64), "x") + "' for framework"
+
+	_write_log(file_handle, size_bytes, density, events, noise, rand)
+
+
+
+def write_dmesg(file_handle, size_bytes, density, rand):
+	"""Write dmesg -T output with oom-killer and kmem SLUB events.
+	"""
+	events = [
+		lambda ts: "[" + datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f").strftime("%a %b %d %H:%M:%S %Y") + "] Killed process " + str(rand.randint(100, 99999)) + " (" + rand.choice(["java", "python3", "mesos-agent", "node", "postgres"]) + ") total-vm:1234kB, anon-rss:100kB, file-rss:0kB",
+		lambda ts: "[" + datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f").strftime("%a %b %d %H:%M:%S %Y") + "] SLUB: Unable to allocate memory on node -1 (gfp=0x8020)",
+	]
+
+	noise = lambda ts: "[" + datetime.datetime.strptime(ts, "%Y-%m-%d %H:%M:%S.%f").strftime("%a %b %d %H:%M:%S %Y") + "] IPv6: ADDRCONF(NETDEV_CHANGE): veth" + format(rand.getrandbits(24), "x") + ": link becomes ready"
+
+	_write_log(file_handle, size_bytes, density, events, noise, rand)
+
+
+
+def _text_member(text):
+	"""Returns text encoded as bytes.
+	"""
+	return text.encode("utf-8")
+
+
+
+def _log_member(writer, *args):
+	"""Run a log writer and return what it wrote as bytes.
+	"""
+	text_handle = io.StringIO()
+
+	writer(text_handle, *args)
+
+	return text_handle.getvalue().encode("utf-8")
+
+
+
+def dcos_node_files(node_type, node_ip, masters, agents, log_bytes, density, rand, public_agents=0):
+	"""Returns a dict of file name to contents for a DC/OS node.
+	"""
+	node_files = dict()
+
+	node_files["opt/mesosphere/etc/dcos-version.json"] = _text_member(json.dumps({"version": "1.13.3"}))
+	node_files["binsh_-c_cat etc*-release.output"] = _text_member('NAME="CentOS Linux"\nID="centos"\n')
+	node_files["timedatectl.output"] = _text_member("NTP synchronized: " + ("no" if rand.random() < density else "yes") + "\n")
+	node_files["dmesg_-T.output"] = _log_member(write_dmesg, max(log_bytes // 20, 1024), density, rand)
+
+	ps_lines = ["USER PID COMMAND", "root 1 /usr/lib/systemd/systemd"]
+
+	if node_type == "master":
+		node_files["dcos-mesos-master.service"] = _log_member(write_mesos_master_log, log_bytes, density, masters, agents, rand)
+		node_files["dcos-exhibitor.service"] = _log_member(write_exhibitor_log, log_bytes // 2, density, masters, rand)
+		node_files["dcos-marathon.service"] = _log_member(write_marathon_log, log_bytes // 4, density / 10, masters, rand)
+		node_files["dcos-cockroach.service"] = _text_member("2019-08-01 00:00:01.000000 master cockroach[1]: W0801 clock synchronization error: this node is more than 500ms away from at least half of the known nodes, to ensure monotonicity\n")
+		node_files["dcos-checks-poststart.service"] = _text_member("2019-08-01 00:00:01.000000 master dcos-checks[1]: CockroachDB has underreplicated ranges\n")
+
+		frameworks = list()
+
+		for framework_number in range(max(len(agents) // 10, 5)):
+			frameworks.append({
+				"id": "framework-" + str(framework_number),
+				"name": "framework-" + str(framework_number),
+				"active": rand.random() > density,
+				"tasks": [{"id": "task-" + str(x), "state": "TASK_RUNNING", "slave_id": "S" + str(x)} for x in range(20)],
+			})
+
+		node_files["5050-master_state.json"] = _text_member(json.dumps({"frameworks": frameworks}))
+		node_files["5050-master_slaves.json"] = _text_member(json.dumps({"slaves": [{"hostname": x, "reserved_resources": {"slave_public": {}} if n < public_agents else {}} for n, x in enumerate(agents)]}))
+		node_files["5050-registrar_1__registry.json"] = _text_member(json.dumps({"unreachable": {"slaves": [{"id": {"value": "S" + str(x)}, "timestamp": {"nanoseconds": 1564617600000000000 + x * 1000000000}} for x in range(int(len(agents) * density))]}}))
+		node_files["443-exhibitor_exhibitor_v1_cluster_list.json"] = _text_member(json.dumps({"servers": masters}))
+
+		ps_lines.append("root 2 /opt/mesosphere/bin/mesos-master")
+
+	else:
+		agent_log_name = "dcos-mesos-slave-public.service" if node_type == "pub_agent" else "dcos-mesos-slave.service"
+
+		node_files[agent_log_name] = _log_member(write_agent_log, log_bytes // 2, density / 100, rand)
+		node_files["docker_--version.output"] = _text_member("Docker version 18.09.1, build 4c52b90\n")
+
+		if rand.random() > density:
+			ps_lines.append("root 3 /usr/bin/dockerd")
+
+	if rand.random() < density:
+		ps_lines.append("root 4 /usr/sbin/firewalld --nofork")
+
+	node_files["ps_aux_ww_Z.output"] = _text_member("\n".join(ps_lines) + "\n")
+
+	return node_files
+
+
+
+def _node_dirs(masters, agents, public_agents):
+	"""Returns a list of (node type, IP, bundle directory name) for each DC/OS node.
+	"""
+	node_dirs = list()
+
+	for master_ip in masters:
+		node_dirs.append(("master", master_ip, master_ip + "_master"))
+
+	for agent_number, agent_ip in enumerate(agents):
+		if agent_number < public_agents:
+			node_dirs.append(("pub_agent", agent_ip, agent_ip + "_agent_public"))
+
+		else:
+			node_dirs.append(("priv_agent", agent_ip, agent_ip + "_agent"))
+
+	return node_dirs
+
+
+
+def make_dcos_diag(output_dir, name, master_count, agent_count, log_bytes, density, rand, public_agents=0):
+	"""Build a DC/OS diagnostic bundle zip, with each file gzipped as DC/OS does.
+	"""
+	masters = master_ips(master_count)
+	agents = agent_ips(agent_count)
+	bundle_file = os.path.join(output_dir, name + ".zip")
+
+	with zipfile.ZipFile(bundle_file, "w", zipfile.ZIP_STORED) as bundle_zip:
+		for node_type, node_ip, node_dir in _node_dirs(masters, agents, public_agents):
+			for file_name, contents in dcos_node_files(node_type, node_ip, masters, agents, log_bytes, density, rand, public_agents).items():
+				if file_name.startswith("opt/"):
+					bundle_zip.writestr(node_dir + "/" + file_name, contents)
+
+				else:
+					bundle_zip.writestr(node_dir + "/" + file_name + ".gz", gzip.compress(contents, compresslevel=1))
+
+	return bundle_file
+
+
+
+def _add_tar_member(tar_handle, member_name, contents):
+	"""Add bytes to a tarball as a file.
+	"""
+	tar_info = tarfile.TarInfo(member_name)
+	tar_info.size = len(contents)
+	tar_info.mtime = int(START_TIME.timestamp())
+
+	tar_handle.addfile(tar_info, io.BytesIO(contents))
+
+
+
+def make_dcos_oneliner(output_dir, name, log_bytes, density, rand):
+	"""Build a DC/OS oneliner bundle tarball from a single master.
+	"""
+	masters = master_ips(1)
+	bundle_file = os.path.join(output_dir, name + ".tgz")
+
+	with tarfile.open(bundle_file, "w:gz", compresslevel=1) as bundle_tar:
+		for file_name, contents in dcos_node_files("master", masters[0], masters, list(), log_bytes, density, rand).items():
+			if file_name.endswith(".service"):
+				file_name += ".log"
+
+			_add_tar_member(bundle_tar, file_name, contents)
+
+	return bundle_file
+
+
+
+def make_service_diag(output_dir, name, log_bytes, density, rand):
+	"""Build a service diagnostic bundle zip.
+	"""
+	bundle_file = os.path.join(output_dir, name + ".zip")
+
+	with zipfile.ZipFile(bundle_file, "w", zipfile.ZIP_DEFLATED) as bundle_zip:
+		bundle_zip.writestr(name + "/dcos_services.json", json.dumps({"services": [{"name": "kafka", "version": "2.7.0"}]}))
+		bundle_zip.writestr(name + "/kafka/scheduler.log", _log_member(write_agent_log, log_bytes, density, rand))
+
+	return bundle_file
+
+
+
+def make_konvoy_diag(output_dir, name, master_count, agent_count, log_bytes, density, rand):
+	"""Build a Konvoy diagnostic bundle tarball with a tarball per node.
+	"""
+	bundle_file = os.path.join(output_dir, name + ".tar.gz")
+
+	with tarfile.open(bundle_file, "w:gz", compresslevel=1) as bundle_tar:
+		for node_ip in master_ips(master_count) + agent_ips(agent_count):
+			node_tar_bytes = io.BytesIO()
+
+			with tarfile.open(fileobj=node_tar_bytes, mode="w:gz", compresslevel=1) as node_tar:
+				_add_tar_member(node_tar, "kubelet.log", _log_member(write_agent_log, log_bytes, density, rand))
+				_add_tar_member(node_tar, "dmesg.log", _log_member(write_dmesg, max(log_bytes // 20, 1024), density, rand))
+
+			_add_tar_member(bundle_tar, "bundles/" + node_ip + ".tar.gz", node_tar_bytes.getvalue())
+
+	return bundle_file
+
+
+
+def make_bundle(bundle_type, output_dir, name=None, masters=3, agents=10, log_mb=1.0, density=0.01, seed=0, public_agents=0):
+	"""Build a synthetic bundle and return the path to it.
+	"""
+	rand = random.Random(seed)
+	log_bytes = int(log_mb * 1024 * 1024)
+
+	if name is None:
+		name = "synthetic-" + bundle_type.replace("_", "-")
+
+	os.makedirs(output_dir, exist_ok=True)
+
+	if bundle_type == "dcos_diag":
+		return make_dcos_diag(output_dir, name, masters, agents, log_bytes, density, rand, public_agents)
+
+	if bundle_type == "dcos_oneliner":
+		return make_dcos_oneliner(output_dir, name, log_bytes, density, rand)
+
+	if bundle_type == "service_diag":
+		return make_service_diag(output_dir, name, log_bytes, density, rand)
+
+	if bundle_type == "konvoy_diag":
+		return make_konvoy_diag(output_dir, name, masters, agents, log_bytes, density, rand)
+
+	raise ValueError("Unknown bundle type " + bundle_type)
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Build a synthetic bundle for testing and benchmarking yabt")
+
+	parser.add_argument("--type", dest="bundle_type", default="dcos_diag",
+							choices=("dcos_diag", "dcos_oneliner", "service_diag", "konvoy_diag"),
+							help="the type of bundle to build (default: dcos_diag)")
+
+	parser.add_argument("--masters", type=int, default=3,
+							help="number of masters (default: 3)")
+
+	parser.add_argument("--agents", type=int, default=10,
+							help="number of agents (default: 10)")
+
+	parser.add_argument("--public-agents", type=int, default=0,
+							help="how many of the agents are public agents (default: 0)")
+
+	parser.add_argument("--log-mb", type=float, default=1.0,
+							help="size of each master's Mesos log in MB, other logs are scaled from it (default: 1)")
+
+	parser.add_argument("--density", type=float, default=0.01,
+							help="fraction of log lines which are events the checks look for (default: 0.01)")
+
+	parser.add_argument("--seed", type=int, default=0,
+							help="random seed, the same seed builds the same bundle (default: 0)")
+
+	parser.add_argument("--name",
+							help="bundle name, without extension")
+
+	parser.add_argument("--output", default=".",
+							help="directory to write the bundle to (default: .)")
+
+	make_args = parser.parse_args()
+
+	print(make_bundle(make_args.bundle_type, make_args.output, make_args.name, make_args.masters, make_args.agents, make_args.log_mb, make_args.density, make_args.seed, make_args.public_agents))
+
+	sys.exit(0)
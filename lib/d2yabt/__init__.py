@@ -1,18 +1,31 @@
 #!/usr/bin/env python3
 """This file loads the other library files of d2yabt.  It also defines
-any classes provided by d2yabt.
+any classes provided by d2yabt.  The files for each type of bundle, e.g.
+d2yabt.dcos, are only loaded the first time they are used, see __getattr__().
 """
 
 
 
-import operator
+import collections
+import importlib
 import d2yabt.util
-import d2yabt.dcos.bundle
-import d2yabt.dcos.check
-import d2yabt.service.bundle
-import d2yabt.service.check
-import d2yabt.konvoy.bundle
-import d2yabt.konvoy.check
+import d2yabt.bundlefs
+import d2yabt.cache
+import d2yabt.profile
+import d2yabt.output
+import d2yabt.table
+import d2yabt.metrics
+import d2yabt.jsonstream
+import d2yabt.scan
+import d2yabt.registry
+import d2yabt.pipeline
+import d2yabt.batch
+import d2yabt.watch
+
+
+
+# The packages of each type of bundle, see __getattr__()
+BUNDLE_PACKAGES = ("dcos", "service", "konvoy")
 
 
 
@@ -20,48 +33,91 @@ __version__ = "1.0.5"
 
 
 
+class BundleError(Exception):
+	"""This exception is raised when a bundle can't be read or analyzed, e.g. it
+	is corrupt or of an unknown type.  Its message says what went wrong.
+	"""
+
+
+
 class Node:
-	"""This class holds information about a DC/OS or Konvoy node.
+	"""This class holds information about a DC/OS or Konvoy node.  Bundles can have
+	thousands of nodes, so it uses __slots__ and keeps bounded summaries of
+	events rather than every event.
 	"""
+	__slots__ = ("ip", "type", "dir", "os", "dcos_version", "docker_version", "zk_fsync_warning_count", "_zk_longest_fsyncs", "oom_invoked_count", "_oom_procs", "log_matches", "log_missing")
+
 	def __init__(self):
 		self.ip = ""
 		self.type = ""
 		self.dir = ""
 		self.os = ""
 		self.dcos_version = ""
-		self.docker_verison = ""
+		self.docker_version = ""
 		self.zk_fsync_warning_count = 0
-		self._zk_longest_fsyncs = list()
+		self._zk_longest_fsyncs = d2yabt.metrics.TopK(5)
 		self.oom_invoked_count = 0
-		self._oom_procs = dict()
+		self._oom_procs = collections.Counter()
+		self.log_matches = None
+		self.log_missing = dict()
 
 
 	def add_zk_fsync(self, zk_fsync: int):
 		"""Add an ZK fsync time entry.
 		"""
-		self._zk_longest_fsyncs.append(zk_fsync)
-		self._zk_longest_fsyncs.sort(reverse=True)
-		self._zk_longest_fsyncs = self._zk_longest_fsyncs[:5]
+		self._zk_longest_fsyncs.add(int(zk_fsync))
 
 
 	def get_longest_zk_fsyncs(self):
 		"""Returns a list of the top 5 longest ZK fsync times.
 		"""
-		return self._zk_longest_fsyncs
+		return self._zk_longest_fsyncs.get()
 
 
-	def add_oom_proc(self, oom_proc):
+	def add_oom_proc(self, oom_proc, count=1):
 		"""Add a process to the list of ones which invoked oom-killer.
 		"""
-		if oom_proc not in self._oom_procs:
-			self._oom_procs[oom_proc] = 1
-
-		else:
-			self._oom_procs[oom_proc] += 1
+		self._oom_procs[oom_proc] += count
 
 
 	def get_top_oom_procs(self):
-		"""Returns a dict of the top 5 processes which invoked oom-killer.
+		"""Returns a list of (process, count) for the top 5 processes which invoked oom-killer.
 		"""
-		return sorted(self._oom_procs.items(), key=operator.itemgetter(1), reverse=True)[0:5]
+		return self._oom_procs.most_common(5)
+
+
+	def merge(self, other):
+		"""Add the events of another Node object for the same node, e.g. one filled
+		in by a worker process, to this one.
+		"""
+		self.zk_fsync_warning_count += other.zk_fsync_warning_count
+		self._zk_longest_fsyncs.merge(other._zk_longest_fsyncs)
+		self.oom_invoked_count += other.oom_invoked_count
+		self._oom_procs.update(other._oom_procs)
+
+		if other.log_matches is not None:
+			if self.log_matches is None:
+				self.log_matches = dict()
+
+			for name, matches in other.log_matches.items():
+				if name not in self.log_matches:
+					self.log_matches[name] = matches
+
+				elif isinstance(matches, d2yabt.metrics.Tally):
+					self.log_matches[name].merge(matches)
+
+				else:
+					self.log_matches[name].extend(matches)
+
+		self.log_missing.update(other.log_missing)
+
+
+
+def __getattr__(name):
+	"""Load the package for a type of bundle the first time it is used, so a run
+	only loads the code for the bundle it was given.
+	"""
+	if name in BUNDLE_PACKAGES:
+		return importlib.import_module("d2yabt." + name)
 
+	raise AttributeError("module 'd2yabt' has no attribute " + repr(name))
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""This file contains batch mode, which analyzes many bundles at once.  Each
+bundle is extracted and checked in its own worker process, with the number of
+bundles in flight kept within a CPU budget (one process per bundle) and a disk
+budget (the estimated size of the bundles being extracted).  A bundle which
+fails, e.g. a corrupt zip, is reported and the rest carry on.  Once every
+bundle is done a summary shows which bundles tripped which checks.
+"""
+
+
+
+import sys
+import os
+import io
+import time
+import shutil
+import zipfile
+import contextlib
+import concurrent.futures
+import d2yabt
+import d2yabt.util
+import d2yabt.cache
+import d2yabt.output
+import d2yabt.pipeline
+import d2yabt.table
+
+
+
+BUNDLE_SUFFIXES = (".zip", ".tgz", ".tar.gz")
+
+# How many times larger than its tarball an extracted bundle is assumed to be
+TAR_EXPANSION_FACTOR = 5
+
+# How many times a bundle is retried after its worker process dies, e.g. from running out of memory
+MAX_RETRIES = 1
+
+
+
+def find_bundles(paths):
+	"""Returns the bundles in a list of paths.  Bundle files and extracted bundle
+	directories are taken as they are, other directories are searched for bundle
+	files and for extracted bundle directories which don't have their bundle file
+	next to them.
+	"""
+	bundle_names = list()
+
+	for path in paths:
+		if not os.path.isdir(path) or d2yabt.util.is_bundle_dir(path):
+			bundle_names.append(path)
+
+			continue
+
+		dir_entries = sorted(x for x in os.listdir(path) if not x.startswith("."))
+		bundle_files = [x for x in dir_entries if x.endswith(BUNDLE_SUFFIXES) and os.path.isfile(os.path.join(path, x))]
+		bundle_dirs = set(d2yabt.util.get_bundle_dir(x) for x in bundle_files)
+
+		for each_entry in dir_entries:
+			entry_path = os.path.join(path, each_entry)
+
+			if each_entry in bundle_files:
+				bundle_names.append(entry_path)
+
+			elif os.path.isdir(entry_path) and each_entry not in bundle_dirs:
+				bundle_names.append(entry_path)
+
+	return bundle_names
+
+
+
+def estimate_disk_bytes(bundle_name):
+	"""Returns roughly how much disk space extracting a bundle will use.
+	"""
+	if os.path.isdir(bundle_name) or d2yabt.util.is_bundle_extracted(bundle_name):
+		return 0
+
+	if bundle_name.endswith(".zip"):
+		try:
+			with zipfile.ZipFile(bundle_name, "r") as zip_ref:
+				return sum(x.file_size for x in zip_ref.infolist())
+
+		except (zipfile.BadZipFile, OSError):
+			pass
+
+	return os.path.getsize(bundle_name) * TAR_EXPANSION_FACTOR
+
+
+
+def analyze_bundle(bundle_name, options):
+	"""Analyze a bundle in this process, capturing what it prints.  Returns a dict
+	of the bundle's status, its error if it failed, the records of its results,
+	its printed report and the seconds it took.  Any error is caught so it only
+	fails this bundle.
+	"""
+	start_time = time.time()
+	start_dir = os.getcwd()
+	bundle_path = os.path.abspath(bundle_name)
+	report = io.StringIO()
+	result = {"bundle": bundle_name, "status": "ok", "error": None}
+
+	d2yabt.output.start_collecting()
+
+	with contextlib.redirect_stdout(report), contextlib.redirect_stderr(report):
+		try:
+			# Bundle files are moved to the current directory before extraction, so work where the bundle is
+			os.chdir(os.path.dirname(bundle_path))
+
+			d2yabt.pipeline.analyze(os.path.basename(bundle_path), options, jobs=1)
+
+		except d2yabt.BundleError as error:
+			result["status"] = "failed"
+			result["error"] = str(error)
+
+		except Exception as error:
+			result["status"] = "failed"
+			result["error"] = type(error).__name__ + ": " + str(error)
+
+		if result["error"] is not None:
+			print(result["error"], file=sys.stderr)
+
+		os.chdir(start_dir)
+
+	result["records"] = d2yabt.output.stop_collecting()
+	result["report"] = report.getvalue()
+	result["seconds"] = round(time.time() - start_time, 2)
+
+	return result
+
+
+
+def failed_result(bundle_name, error):
+	"""Returns the result of a bundle which could not be analyzed at all.
+	"""
+	return {"bundle": bundle_name, "status": "failed", "error": error, "records": list(), "report": error + "\n", "seconds": 0}
+
+
+
+def get_alerted_checks(result):
+	"""Returns the names of the checks which raised alerts on a bundle.
+	"""
+	return [x["check"] for x in result["records"] if x["type"] == "check" and x["status"] == "alert"]
+
+
+
+def _get_bundle_type(result):
+	"""Returns the type of a bundle from its results, or None if it wasn't found.
+	"""
+	for record in result["records"]:
+		if record["type"] == "bundle":
+			return record["bundle_type"]
+
+	return None
+
+
+
+def report_result(result, done_count=None, bundle_count=None):
+	"""Print the report of a finished bundle and write its records.
+		done_count, bundle_count: how far through the bundles this one is, if known
+	"""
+	progress = str(done_count) + "/" + str(bundle_count) + ", " if bundle_count else ""
+
+	print("=" * 20, result["bundle"], "(" + progress + result["status"] + ",", result["seconds"], "seconds)", "=" * 20)
+	print(result["report"], end="")
+
+	for record in result["records"]:
+		d2yabt.output.emit(dict(record, bundle=result["bundle"]))
+
+	d2yabt.output.emit({"type": "bundle_result", "bundle": result["bundle"], "status": result["status"], "error": result["error"], "seconds": result["seconds"]})
+
+
+
+def print_summary(results):
+	"""Print a table of how each bundle went and a table of which bundles tripped
+	each check, and write them as a summary record.
+	"""
+	print("=" * 20, "Summary of", len(results), "bundles", "=" * 20)
+
+	bundle_table = d2yabt.table.Table({
+			"Bundle": [x["bundle"] for x in results],
+			"Type": [_get_bundle_type(x) or "n/a" for x in results],
+			"Status": [x["status"] for x in results],
+			"Alerting Checks": [len(get_alerted_checks(x)) for x in results],
+			"Seconds": [x["seconds"] for x in results],
+		}
+	)
+
+	print(bundle_table)
+
+	check_bundles = dict()
+
+	for result in results:
+		for check_name in get_alerted_checks(result):
+			check_bundles.setdefault(check_name, list()).append(result["bundle"])
+
+	if check_bundles:
+		check_table = d2yabt.table.Table({
+				"Check": list(check_bundles.keys()),
+				"Bundles": [len(x) for x in check_bundles.values()],
+				"Tripped By": list(check_bundles.values()),
+			}
+		)
+
+		check_table.sort("Bundles", ascending=False)
+
+		print(check_table)
+
+	failed_results = [x for x in results if x["status"] == "failed"]
+
+	for result in failed_results:
+		print("Failed to analyze", result["bundle"] + ":", result["error"], file=sys.stderr)
+
+	d2yabt.output.emit({
+		"type": "summary",
+		"bundles": len(results),
+		"failed": {x["bundle"]: x["error"] for x in failed_results},
+		"checks": check_bundles,
+	})
+
+
+
+def clean_bundle(bundle_name):
+	"""Remove the directory a bundle was extracted to, along with its results
+	cache which would not match the files of a new extraction.
+	"""
+	bundle_dir = d2yabt.util.get_bundle_dir(os.path.abspath(bundle_name))
+
+	shutil.rmtree(bundle_dir, ignore_errors=True)
+
+	with contextlib.suppress(FileNotFoundError):
+		os.remove(d2yabt.cache.get_cache_file(bundle_dir))
+
+
+
+def run(bundle_names, options, jobs=None, disk_mb=None, clean=False):
+	"""Analyze bundles in worker processes and print a summary.  Returns the
+	list of results, see analyze_bundle().
+		jobs: the number of bundles to analyze at once, None for one per CPU
+		disk_mb: only start a bundle when the estimated size of the bundles being extracted stays within this, None for no limit
+		clean: remove the directory of each bundle extracted by this run once it is done
+	"""
+	jobs = d2yabt.util.worker_count(jobs)
+	disk_budget = disk_mb * 1024 * 1024 if disk_mb else None
+
+	print("Analyzing", len(bundle_names), "bundles,", jobs, "at a time" + (", within " + str(disk_mb) + " MB of disk" if disk_budget else ""))
+
+	# Bundles waiting to start, in order, as [bundle name, estimated disk bytes, retries]
+	pending = list()
+	results = dict()
+
+	for bundle_name in bundle_names:
+		try:
+			pending.append([bundle_name, estimate_disk_bytes(bundle_name), 0])
+
+		except OSError as error:
+			results[bundle_name] = failed_result(bundle_name, "Unable to read bundle: " + str(error))
+
+			report_result(results[bundle_name], len(results), len(bundle_names))
+
+	# Only clean up after bundles which this run extracts
+	extracted_here = set(x[0] for x in pending if clean and not os.path.isdir(x[0]) and not d2yabt.util.is_bundle_extracted(x[0]))
+
+	running = dict()
+	used_disk = 0
+	executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+
+	try:
+		while pending or running:
+			# Start bundles in order while they fit, a bundle larger than the whole budget runs on its own
+			while pending and len(running) < jobs:
+				bundle_name, disk_bytes, retries = pending[0]
+
+				if disk_budget is not None and running and used_disk + disk_bytes > disk_budget:
+					break
+
+				# A bundle being retried runs on its own, so if its worker dies again it is the cause
+				if running and (retries or any(x[2] for x in running.values())):
+					break
+
+				pending.pop(0)
+				used_disk += disk_bytes
+
+				# Workers are reused and change directory, so give them the full path
+				running[executor.submit(analyze_bundle, os.path.abspath(bundle_name), options)] = (bundle_name, disk_bytes, retries)
+
+			done_futures, _not_done = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+
+			pool_broken = False
+
+			for future in done_futures:
+				bundle_name, disk_bytes, retries = running.pop(future)
+				used_disk -= disk_bytes
+
+				try:
+					results[bundle_name] = future.result()
+					results[bundle_name]["bundle"] = bundle_name
+
+				except concurrent.futures.process.BrokenProcessPool:
+					pool_broken = True
+
+					if retries < MAX_RETRIES:
+						pending.insert(0, [bundle_name, disk_bytes, retries + 1])
+
+						continue
+
+					results[bundle_name] = failed_result(bundle_name, "The worker process analyzing the bundle exited unexpectedly")
+
+				if bundle_name in extracted_here:
+					clean_bundle(bundle_name)
+
+				report_result(results[bundle_name], len(results), len(bundle_names))
+
+			# A worker which dies takes the pool with it, so start a new one
+			if pool_broken:
+				for _future, (bundle_name, disk_bytes, retries) in running.items():
+					pending.insert(0, [bundle_name, disk_bytes, retries + 1])
+					used_disk -= disk_bytes
+
+				running.clear()
+				executor.shutdown(wait=False)
+				executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+
+	finally:
+		executor.shutdown(wait=True, cancel_futures=True)
+
+	ordered_results = [results[x] for x in bundle_names if x in results]
+
+	print_summary(ordered_results)
+
+	return ordered_results
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""This file contains the functions used to read files from a bundle.  A bundle
+is either a directory on disk or a zip archive which is read in place without
+being extracted (see mount_zip()).  Paths inside a mounted zip look just like
+the paths of the extracted bundle, so the rest of yabt does not need to care
+which one it is working with.
+
+Compressed files (gzip, bzip2 or xz) are presented under their name without the
+compression suffix and are decompressed as they are read, so a bundle does not
+need to have its files expanded before it is analyzed.
+"""
+
+
+
+import os
+import io
+import gzip
+import bz2
+import lzma
+import fnmatch
+import builtins
+import zipfile
+
+
+
+COMPRESSION_SUFFIXES = (".gz", ".bz2", ".xz")
+GZIP_MAGIC = b"\x1f\x8b"
+BZIP2_MAGIC = b"BZh"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+
+# Mounted zip bundles, keyed by the directory name they are mounted at
+_mounts = dict()
+
+
+
+def strip_compression_suffix(name):
+	"""Returns a file name without its compression suffix, if it has one.
+	"""
+	for suffix in COMPRESSION_SUFFIXES:
+		if name.endswith(suffix):
+			return name[:-len(suffix)]
+
+	return name
+
+
+
+def get_compression(magic):
+	"""Returns the compression format ("gzip", "bzip2" or "xz") for the leading
+	bytes of a file, or None if it is not compressed.
+	"""
+	if magic.startswith(GZIP_MAGIC):
+		return "gzip"
+
+	if magic.startswith(BZIP2_MAGIC):
+		return "bzip2"
+
+	if magic.startswith(XZ_MAGIC):
+		return "xz"
+
+	return None
+
+
+
+def decompress_stream(binary_handle, compression):
+	"""Wrap a binary stream in the decompressor for the given compression format.
+	"""
+	if compression == "gzip":
+		return gzip.GzipFile(fileobj=binary_handle, mode="rb")
+
+	if compression == "bzip2":
+		return bz2.BZ2File(binary_handle, "rb")
+
+	if compression == "xz":
+		return lzma.LZMAFile(binary_handle, "rb")
+
+	return binary_handle
+
+
+
+def _uncompressed_size(binary_handle, compression):
+	"""Returns the size of a compressed stream once it is decompressed.
+	"""
+	# The last 4 bytes of a gzip file hold the uncompressed size
+	if compression == "gzip":
+		binary_handle.seek(-4, io.SEEK_END)
+
+		return int.from_bytes(binary_handle.read(4), "little")
+
+	decompressed_handle = decompress_stream(binary_handle, compression)
+
+	size = 0
+
+	for chunk in iter(lambda: decompressed_handle.read(1048576), b""):
+		size += len(chunk)
+
+	return size
+
+
+
+class ZipBundle:
+	"""This class gives access to the members of a zip archive as if it had
+	been extracted and had its compressed files expanded.
+	"""
+	def __init__(self, zip_file, root):
+		# Worker processes may be in another directory when they reopen the zip
+		self.zip_file = os.path.abspath(zip_file)
+		self.root = os.path.normpath(root)
+		self._zip_ref = None
+		self._zip_pid = None
+		self._members = dict()
+		self._dirs = {"": set()}
+
+		zip_ref = self._get_zip_ref()
+		zip_infos = [x for x in zip_ref.infolist() if not x.filename.endswith("/")]
+
+		# As with util.unzip(), if everything is within a single directory treat that directory as the root
+		prefix = ""
+		top_level_names = set(x.filename.split("/")[0] for x in zip_infos)
+
+		if len(top_level_names) == 1 and all("/" in x.filename for x in zip_infos):
+			prefix = top_level_names.pop() + "/"
+
+		for zip_info in zip_infos:
+			member_name = zip_info.filename[len(prefix):]
+
+			# Present foo.gz as foo, the same as decompress_gzip_files() would have left it
+			if strip_compression_suffix(member_name) != member_name:
+				member_name = strip_compression_suffix(member_name)
+
+				if member_name in self._members:
+					continue
+
+			self._members[member_name] = zip_info
+
+			parts = member_name.split("/")
+
+			for depth in range(len(parts)):
+				parent = "/".join(parts[:depth])
+
+				self._dirs.setdefault(parent, set()).add(parts[depth])
+
+				if depth < len(parts) - 1:
+					self._dirs.setdefault("/".join(parts[:depth + 1]), set())
+
+
+	def _get_zip_ref(self):
+		"""Returns an open ZipFile, reopening it if we are in a new process.
+		"""
+		if self._zip_ref is None or self._zip_pid != os.getpid():
+			self._zip_ref = zipfile.ZipFile(self.zip_file, "r")
+			self._zip_pid = os.getpid()
+
+		return self._zip_ref
+
+
+	def close(self):
+		"""Close the zip file, if it is open in this process.
+		"""
+		if self._zip_ref is not None and self._zip_pid == os.getpid():
+			self._zip_ref.close()
+
+		self._zip_ref = None
+		self._zip_pid = None
+
+
+	def __getstate__(self):
+		"""Leave the open ZipFile behind when pickled for a worker process, it is
+		reopened on first use.
+		"""
+		state = self.__dict__.copy()
+		state["_zip_ref"] = None
+		state["_zip_pid"] = None
+
+		return state
+
+
+	def get_member(self, member_name):
+		"""Returns the ZipInfo of a member.
+		"""
+		if member_name not in self._members:
+			raise FileNotFoundError(os.path.join(self.root, member_name))
+
+		return self._members[member_name]
+
+
+	def exists(self, member_name):
+		"""Returns True if the member or directory exists.
+		"""
+		return member_name in self._members or member_name in self._dirs
+
+
+	def isdir(self, member_name):
+		"""Returns True if the name is a directory.
+		"""
+		return member_name in self._dirs
+
+
+	def listdir(self, member_name):
+		"""Returns the names within a directory.
+		"""
+		if member_name not in self._dirs:
+			raise FileNotFoundError(os.path.join(self.root, member_name))
+
+		return sorted(self._dirs[member_name])
+
+
+	def getsize(self, member_name):
+		"""Returns the size of a member as it would be once extracted.
+		"""
+		zip_info = self.get_member(member_name)
+
+		with self._get_zip_ref().open(zip_info) as member_handle:
+			compression = get_compression(member_handle.peek(len(XZ_MAGIC))[:len(XZ_MAGIC)])
+
+			if compression is None:
+				return zip_info.file_size
+
+			return _uncompressed_size(member_handle, compression)
+
+
+	def open(self, member_name):
+		"""Returns a binary stream of a member's decompressed contents.
+		"""
+		zip_info = self.get_member(member_name)
+
+		member_handle = self._get_zip_ref().open(zip_info)
+
+		compression = get_compression(member_handle.peek(len(XZ_MAGIC))[:len(XZ_MAGIC)])
+
+		return decompress_stream(member_handle, compression)
+
+
+
+def mount_zip(zip_file, root):
+	"""Make the contents of a zip file available under the given directory name
+	without extracting it.  Raises zipfile.BadZipFile if the zip can't be read.
+	"""
+	# Mounts are kept by full path, as the same relative name can belong to another bundle once the directory changes
+	unmount(root)
+
+	_mounts[os.path.abspath(root)] = ZipBundle(zip_file, root)
+
+	return root
+
+
+
+def unmount(root):
+	"""Close the zip file mounted under a directory name, see mount_zip().  Does
+	nothing if nothing is mounted there.
+	"""
+	zip_bundle = _mounts.pop(os.path.abspath(root), None)
+
+	if zip_bundle is not None:
+		zip_bundle.close()
+
+
+
+def get_mounts():
+	"""Returns the mounted zip bundles, to be handed to set_mounts() in a worker process.
+	"""
+	return dict(_mounts)
+
+
+
+def set_mounts(mounts):
+	"""Use the zip bundles mounted in the parent process, see get_mounts().  Used
+	as the initializer of worker process pools.
+	"""
+	_mounts.clear()
+	_mounts.update(mounts)
+
+
+
+def _find_mount(path):
+	"""Returns the mounted zip a path falls within and the member name for it,
+	or None and the path if it is not within a mounted zip.
+	"""
+	path = os.path.normpath(path)
+	full_path = os.path.abspath(path)
+
+	for root, zip_bundle in _mounts.items():
+		if full_path == root:
+			return zip_bundle, ""
+
+		if full_path.startswith(root + os.sep):
+			return zip_bundle, full_path[len(root) + 1:].replace(os.sep, "/")
+
+	return None, path
+
+
+
+def _find_on_disk(path):
+	"""Returns the file on disk backing a path, which is either the path itself
+	or the path with a compression suffix, or None if neither exists.
+	"""
+	if os.path.exists(path):
+		return path
+
+	for suffix in COMPRESSION_SUFFIXES:
+		if os.path.exists(path + suffix):
+			return path + suffix
+
+	return None
+
+
+
+def _get_file_compression(path):
+	"""Returns the compression format of a file on disk, see get_compression().
+	"""
+	with builtins.open(path, "rb") as file_handle:
+		return get_compression(file_handle.read(len(XZ_MAGIC)))
+
+
+
+def exists(path):
+	"""Same as os.path.exists() but also works within a mounted zip and finds
+	compressed files.
+	"""
+	zip_bundle, member_name = _find_mount(path)
+
+	if zip_bundle is None:
+		return _find_on_disk(path) is not None
+
+	return zip_bundle.exists(member_name)
+
+
+
+def isdir(path):
+	"""Same as os.path.isdir() but also works within a mounted zip.
+	"""
+	zip_bundle, member_name = _find_mount(path)
+
+	if zip_bundle is None:
+		return os.path.isdir(path)
+
+	return zip_bundle.isdir(member_name)
+
+
+
+def listdir(path):
+	"""Same as os.listdir() but also works within a mounted zip.  Compressed
+	files are listed without their compression suffix.
+	"""
+	zip_bundle, member_name = _find_mount(path)
+
+	if zip_bundle is not None:
+		return zip_bundle.listdir(member_name)
+
+	dir_contents = list()
+
+	for each_name in os.listdir(path):
+		each_name = strip_compression_suffix(each_name)
+
+		if each_name not in dir_contents:
+			dir_contents.append(each_name)
+
+	return dir_contents
+
+
+
+def is_plain_file(path):
+	"""Returns True if path is an uncompressed file on disk, which unlike a zip
+	member or compressed file can be seeked around cheaply.
+	"""
+	zip_bundle, _member_name = _find_mount(path)
+
+	if zip_bundle is not None or not os.path.isfile(path):
+		return False
+
+	return _get_file_compression(path) is None
+
+
+
+def getsize(path):
+	"""Same as os.path.getsize() but also works within a mounted zip.  The size
+	of a compressed file is its decompressed size.
+	"""
+	zip_bundle, member_name = _find_mount(path)
+
+	if zip_bundle is not None:
+		return zip_bundle.getsize(member_name)
+
+	disk_path = _find_on_disk(path)
+
+	if disk_path is None:
+		raise FileNotFoundError(path)
+
+	compression = _get_file_compression(disk_path)
+
+	if compression is None:
+		return os.path.getsize(disk_path)
+
+	with builtins.open(disk_path, "rb") as file_handle:
+		return _uncompressed_size(file_handle, compression)
+
+
+
+def glob(pattern):
+	"""Same as glob.glob() but also works within a mounted zip and finds
+	compressed files.  Only the last component of the pattern may contain
+	wildcards.
+	"""
+	pattern_dir, pattern_base = os.path.split(pattern)
+
+	if not isdir(pattern_dir or "."):
+		return list()
+
+	matches = list()
+
+	for each_name in listdir(pattern_dir or "."):
+		# glob.glob() skips hidden files unless asked for them
+		if each_name.startswith(".") and not pattern_base.startswith("."):
+			continue
+
+		if fnmatch.fnmatchcase(each_name, pattern_base):
+			matches.append(os.path.join(pattern_dir, each_name))
+
+	return matches
+
+
+
+def open(path, mode="r", encoding=None, errors=None):
+	"""Same as open() for reading but also works within a mounted zip.  Files
+	which start with gzip, bzip2 or xz magic bytes are decompressed as they are
+	read.
+		mode: "r" for text or "rb" for bytes
+	"""
+	zip_bundle, member_name = _find_mount(path)
+
+	if zip_bundle is not None:
+		binary_handle = zip_bundle.open(member_name)
+
+	else:
+		disk_path = _find_on_disk(path)
+
+		if disk_path is None:
+			raise FileNotFoundError(path)
+
+		compression = _get_file_compression(disk_path)
+
+		if compression is None:
+			return builtins.open(disk_path, mode, encoding=encoding, errors=errors)
+
+		if compression == "gzip":
+			binary_handle = gzip.open(disk_path, "rb")
+
+		elif compression == "bzip2":
+			binary_handle = bz2.open(disk_path, "rb")
+
+		else:
+			binary_handle = lzma.open(disk_path, "rb")
+
+	if mode == "rb":
+		return binary_handle
+
+	return io.TextIOWrapper(binary_handle, encoding=encoding, errors=errors)
+
+
+
+def fingerprint(path):
+	"""Returns a value which changes whenever the file behind a path changes,
+	or None if the file does not exist.  Used to tell if cached results are stale.
+	"""
+	zip_bundle, member_name = _find_mount(path)
+
+	if zip_bundle is not None:
+		if not zip_bundle.exists(member_name) or zip_bundle.isdir(member_name):
+			return None
+
+		zip_info = zip_bundle.get_member(member_name)
+
+		return [zip_info.CRC, zip_info.file_size]
+
+	disk_path = _find_on_disk(path)
+
+	if disk_path is None:
+		return None
+
+	disk_stat = os.stat(disk_path)
+
+	return [os.path.basename(disk_path), disk_stat.st_size, disk_stat.st_mtime_ns]
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""This file contains the persistent cache of results parsed from a bundle.  The
+cache is a JSON file stored next to the bundle directory.  Each entry records a
+fingerprint of the files it was computed from along with the version of the
+code which computed it, so when yabt is run against the same bundle again only
+the results whose files or checks have changed are recomputed.
+"""
+
+
+
+import sys
+import os
+import json
+import d2yabt.bundlefs
+
+
+
+# Bump this when the layout of the cache file changes
+CACHE_FORMAT = 1
+
+# The cache in use for this run, see load()
+_active_cache = None
+
+
+
+class BundleCache:
+	"""This class holds the cached results for a single bundle.
+	"""
+	def __init__(self, cache_file):
+		self.cache_file = cache_file
+		self._entries = dict()
+		self._dirty = False
+
+		try:
+			with open(cache_file, "r", encoding="utf-8") as cache_file_handle:
+				cache_json = json.load(cache_file_handle)
+
+			if cache_json.get("format") == CACHE_FORMAT:
+				self._entries = cache_json["entries"]
+
+		except FileNotFoundError:
+			pass
+
+		except (json.decoder.JSONDecodeError, UnicodeDecodeError, KeyError, AttributeError):
+			print("Ignoring unreadable cache file", cache_file, file=sys.stderr)
+
+
+	def get(self, key, fingerprint, version):
+		"""Returns a tuple of (True, value) if the key is cached with the same
+		fingerprint and version, otherwise (False, None).
+		"""
+		entry = self._entries.get(key)
+
+		if entry is None or entry["fingerprint"] != fingerprint or entry["version"] != version:
+			return False, None
+
+		return True, entry["value"]
+
+
+	def put(self, key, fingerprint, version, value):
+		"""Store a value in the cache.  The value must be JSON serializable.
+		"""
+		self._entries[key] = {
+			"fingerprint": fingerprint,
+			"version": version,
+			"value": value,
+		}
+
+		self._dirty = True
+
+
+	def save(self):
+		"""Write the cache to disk if anything has changed.
+		"""
+		if not self._dirty:
+			return
+
+		temp_file = self.cache_file + ".tmp"
+
+		try:
+			with open(temp_file, "w", encoding="utf-8") as cache_file_handle:
+				json.dump({"format": CACHE_FORMAT, "entries": self._entries}, cache_file_handle)
+
+			os.replace(temp_file, self.cache_file)
+
+		except OSError as error:
+			print("Unable to write cache file", self.cache_file + ":", error, file=sys.stderr)
+
+		self._dirty = False
+
+
+
+def get_cache_file(bundle_dir):
+	"""Returns the path of the cache file for a bundle directory.
+	"""
+	bundle_dir = os.path.abspath(bundle_dir)
+
+	return os.path.join(os.path.dirname(bundle_dir), os.path.basename(bundle_dir) + ".yabt-cache.json")
+
+
+
+def load(bundle_dir):
+	"""Load the cache for a bundle and use it for the rest of this run.
+	"""
+	global _active_cache
+
+	_active_cache = BundleCache(get_cache_file(bundle_dir))
+
+	return _active_cache
+
+
+
+def unload():
+	"""Stop using a cache, e.g. before analyzing another bundle with --no-cache.
+	"""
+	global _active_cache
+
+	_active_cache = None
+
+
+
+def save():
+	"""Write the cache in use to disk, if there is one.
+	"""
+	if _active_cache is not None:
+		_active_cache.save()
+
+
+
+def fingerprint_files(paths):
+	"""Returns a fingerprint of a list of bundle files, see bundlefs.fingerprint().
+	"""
+	return [[path, d2yabt.bundlefs.fingerprint(path)] for path in paths]
+
+
+
+def lookup(key, paths, version):
+	"""Returns a tuple of (True, value) if key is cached and none of the files in
+	paths have changed since it was computed by the same version, otherwise
+	(False, None).
+	"""
+	if _active_cache is None:
+		return False, None
+
+	return _active_cache.get(key, fingerprint_files(paths), version)
+
+
+
+def store(key, paths, version, value):
+	"""Cache a value computed from the files in paths, if a cache is in use.
+	"""
+	if _active_cache is not None:
+		_active_cache.put(key, fingerprint_files(paths), version, value)
+
+
+
+def cached(key, paths, version, compute):
+	"""Returns the cached value for key if none of the files in paths have changed
+	since it was computed by the same version, otherwise calls compute() and
+	caches what it returns.  If no cache is in use compute() is simply called.
+	"""
+	found, value = lookup(key, paths, version)
+
+	if found:
+		return value
+
+	value = compute()
+
+	store(key, paths, version, value)
+
+	return value
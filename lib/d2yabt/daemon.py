@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""This file contains daemon mode, a long-running service which analyzes bundles
+sent to it over a local HTTP API, on a TCP port or a Unix socket.  d2yabt and
+its checks are loaded once and the bundles are analyzed by a pool of worker
+processes which are kept running between jobs, so each bundle only costs the
+analysis itself.  Jobs wait in a queue until a worker is free.
+
+	POST /jobs                 {"bundle": "/path/to/bundle.zip", "options": {"checks": ["zk_fsync"]}}
+	PUT /bundles/<file name>   the body is a bundle file, which is saved, queued and removed once analyzed
+	GET /jobs                  every job and its status
+	GET /jobs/<id>[?wait=30]   a job and, once it is done, its records, waiting up to 30 seconds for it to finish
+	GET /jobs/<id>/report      the text report of a finished job
+"""
+
+
+
+import sys
+import os
+import json
+import time
+import tempfile
+import threading
+import argparse
+import socketserver
+import http.server
+import urllib.parse
+import concurrent.futures
+import d2yabt
+import d2yabt.util
+import d2yabt.output
+import d2yabt.registry
+import d2yabt.pipeline
+import d2yabt.batch
+
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8750
+
+# Submissions are refused once this many jobs are waiting for a worker
+DEFAULT_MAX_QUEUED = 100
+
+# Finished jobs beyond this many are forgotten, oldest first
+MAX_FINISHED_JOBS = 1000
+
+# Uploads are read from the socket this many bytes at a time
+UPLOAD_CHUNK_SIZE = 1048576
+
+
+
+class Job:
+	"""This class holds a bundle submitted to the daemon and, once it has been
+	analyzed, its result.
+	"""
+	def __init__(self, job_id, bundle_name, future):
+		self.id = job_id
+		self.bundle_name = bundle_name
+		self.future = future
+		self.submitted = time.time()
+
+
+	def get_status(self):
+		"""Returns one of queued, running, ok or failed.
+		"""
+		if not self.future.done():
+			return "running" if self.future.running() else "queued"
+
+		return self.get_result()["status"]
+
+
+	def get_result(self):
+		"""Returns the result of a finished job, see d2yabt.batch.analyze_bundle().
+		"""
+		try:
+			return self.future.result()
+
+		except (concurrent.futures.process.BrokenProcessPool, concurrent.futures.CancelledError):
+			return d2yabt.batch.failed_result(self.bundle_name, "The worker process analyzing the bundle exited unexpectedly")
+
+
+	def to_json(self, with_records=False):
+		"""Returns the job as JSON serializable data.
+			with_records: include the records of a finished job
+		"""
+		job_json = {
+			"id": self.id,
+			"bundle": self.bundle_name,
+			"status": self.get_status(),
+			"submitted": self.submitted,
+		}
+
+		if self.future.done():
+			result = self.get_result()
+
+			job_json["error"] = result["error"]
+			job_json["seconds"] = result["seconds"]
+
+			if with_records:
+				job_json["records"] = result["records"]
+
+		return job_json
+
+
+
+def _get_option_actions():
+	"""Returns a dict of option name to the argparse action of each option a job
+	may set, see d2yabt.pipeline.add_arguments().
+	"""
+	parser = argparse.ArgumentParser(add_help=False)
+
+	d2yabt.pipeline.add_arguments(parser)
+
+	return {x.dest: x for x in parser._actions}
+
+
+
+def _coerce_option(action, option_value):
+	"""Returns an option value from JSON or a query string converted the way
+	argparse would have converted it on the command line.  Raises ValueError if
+	the value is wrong.
+	"""
+	# Flags such as --no-cache
+	if action.nargs == 0:
+		if isinstance(option_value, bool):
+			return option_value
+
+		if isinstance(option_value, str) and option_value.lower() in ("true", "false"):
+			return option_value.lower() == "true"
+
+		raise ValueError("must be true or false")
+
+	if option_value is None and action.default is None:
+		return None
+
+	# Lists such as checks are given to argparse comma separated
+	if isinstance(option_value, list) and all(isinstance(x, str) for x in option_value):
+		option_value = ",".join(option_value)
+
+	elif isinstance(option_value, (int, float)) and not isinstance(option_value, bool):
+		option_value = str(option_value)
+
+	elif not isinstance(option_value, str):
+		raise ValueError("must be a string")
+
+	if action.type is not None:
+		option_value = action.type(option_value)
+
+	if action.choices is not None and option_value not in action.choices:
+		raise ValueError("must be one of " + ", ".join(action.choices))
+
+	return option_value
+
+
+
+def _warm_up():
+	"""Load every check in a worker process ahead of its first job.
+	"""
+	d2yabt.registry.load_checks()
+
+	return os.getpid()
+
+
+
+class Daemon:
+	"""This class holds the job queue and the worker processes which run it.
+		default_options: the options bundles are analyzed with, see d2yabt.pipeline.add_arguments()
+		jobs: how many bundles to analyze at once, None for one per CPU
+		max_queued: how many jobs may wait for a worker before submissions are refused
+		upload_dir: where uploaded bundles are saved and extracted until they have been analyzed
+	"""
+	def __init__(self, default_options, jobs=None, max_queued=DEFAULT_MAX_QUEUED, upload_dir="yabt-uploads"):
+		self.default_options = default_options
+		self.jobs = d2yabt.util.worker_count(jobs)
+		self.max_queued = max_queued
+		self.upload_dir = os.path.abspath(upload_dir)
+		self._option_actions = _get_option_actions()
+		self._jobs = dict()
+		self._next_id = 1
+		self._lock = threading.Lock()
+
+		# Load the checks before the workers are started, so they start with them loaded too
+		d2yabt.registry.load_checks()
+
+		self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+
+		for _worker in range(self.jobs):
+			self._executor.submit(_warm_up)
+
+
+	def get_options(self, option_values):
+		"""Returns the default options with the given values changed.  Values are
+		converted as they would be on the command line.  Raises ValueError if an
+		option is unknown or a value is wrong.
+		"""
+		options = argparse.Namespace(**vars(self.default_options))
+
+		for option_name, option_value in (option_values or dict()).items():
+			if option_name not in self._option_actions:
+				raise ValueError("Unknown option: " + option_name)
+
+			try:
+				setattr(options, option_name, _coerce_option(self._option_actions[option_name], option_value))
+
+			except (ValueError, TypeError) as error:
+				raise ValueError("Invalid value for " + option_name + ": " + str(error))
+
+		option_errors = d2yabt.pipeline.get_option_errors(options)
+
+		if option_errors:
+			raise ValueError("  ".join(option_errors))
+
+		return options
+
+
+	def _count_queued(self):
+		"""Returns how many jobs are waiting for a worker.
+		"""
+		return sum(1 for x in self._jobs.values() if not x.future.done() and not x.future.running())
+
+
+	def _forget_finished(self):
+		"""Drop the oldest finished jobs beyond MAX_FINISHED_JOBS.
+		"""
+		finished_ids = [x.id for x in self._jobs.values() if x.future.done()]
+
+		for job_id in finished_ids[:max(0, len(finished_ids) - MAX_FINISHED_JOBS)]:
+			del self._jobs[job_id]
+
+
+	def submit(self, bundle_name, options, remove_after=False):
+		"""Queue a bundle to be analyzed.  Returns its Job.  Raises
+		OverflowError if the queue is full.
+			remove_after: remove the bundle file and its directory once the job is done, for uploads
+		"""
+		with self._lock:
+			if self._count_queued() >= self.max_queued:
+				raise OverflowError("Too many jobs are queued, try again later")
+
+			job_id = str(self._next_id)
+			self._next_id += 1
+
+			try:
+				future = self._executor.submit(d2yabt.batch.analyze_bundle, os.path.abspath(bundle_name), options)
+
+			# A worker which dies takes the pool with it, its jobs fail and a new pool takes the rest
+			except concurrent.futures.process.BrokenProcessPool:
+				self._executor.shutdown(wait=False)
+				self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.jobs)
+
+				future = self._executor.submit(d2yabt.batch.analyze_bundle, os.path.abspath(bundle_name), options)
+
+			self._jobs[job_id] = Job(job_id, bundle_name, future)
+
+			if remove_after:
+				future.add_done_callback(lambda _future: remove_bundle(bundle_name))
+
+			self._forget_finished()
+
+			return self._jobs[job_id]
+
+
+	def create_upload(self, file_name):
+		"""Creates an empty file to save an uploaded bundle to and returns its path.
+		Each upload gets a file of its own, even when uploads of the same name
+		arrive at once.  Raises ValueError if the name is not that of a bundle file.
+		"""
+		file_name = os.path.basename(file_name)
+
+		if not file_name.endswith(d2yabt.batch.BUNDLE_SUFFIXES):
+			raise ValueError("Bundle files must end in one of " + ", ".join(d2yabt.batch.BUNDLE_SUFFIXES))
+
+		os.makedirs(self.upload_dir, exist_ok=True)
+
+		upload_handle, upload_path = tempfile.mkstemp(dir=self.upload_dir, prefix="upload-", suffix="-" + file_name)
+
+		os.close(upload_handle)
+
+		return upload_path
+
+
+	def get_job(self, job_id):
+		"""Returns a Job, or None if there is no such job.
+		"""
+		with self._lock:
+			return self._jobs.get(job_id)
+
+
+	def get_jobs(self):
+		"""Returns a list of every Job, oldest first.
+		"""
+		with self._lock:
+			return list(self._jobs.values())
+
+
+	def shutdown(self):
+		"""Stop the workers, abandoning any queued jobs.
+		"""
+		self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+	"""This class answers the requests of the HTTP API, see the top of this file.
+	"""
+	server_version = "yabt/" + d2yabt.__version__
+
+
+	def address_string(self):
+		# Clients of a Unix socket have no address
+		if isinstance(self.client_address, tuple):
+			return self.client_address[0]
+
+		return "unix"
+
+
+	def _send_json(self, status_code, body):
+		"""Send a JSON response.
+		"""
+		response_bytes = (json.dumps(body, default=d2yabt.output.json_default) + "\n").encode("utf-8")
+
+		self.send_response(status_code)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(response_bytes)))
+		self.end_headers()
+		self.wfile.write(response_bytes)
+
+
+	def _send_error(self, status_code, message):
+		"""Send a JSON error response.
+		"""
+		self._send_json(status_code, {"error": message})
+
+
+	def _get_options(self, option_values):
+		"""Returns the options of a job, or sends an error and returns None if they
+		are wrong.
+		"""
+		try:
+			return self.server.daemon.get_options(option_values)
+
+		except ValueError as error:
+			self._send_error(400, str(error))
+
+			return None
+
+
+	def _submit(self, bundle_name, options, remove_after=False):
+		"""Queue a bundle and send the new job.
+		"""
+		try:
+			job = self.server.daemon.submit(bundle_name, options, remove_after)
+
+		except OverflowError as error:
+			if remove_after:
+				remove_bundle(bundle_name)
+
+			self._send_error(503, str(error))
+
+			return
+
+		self._send_json(202, job.to_json())
+
+
+	def do_POST(self):
+		"""Queue a bundle already on this host, given its path.
+		"""
+		if urllib.parse.urlsplit(self.path).path.rstrip("/") != "/jobs":
+			self._send_error(404, "Not found")
+
+			return
+
+		try:
+			request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+			bundle_name = request["bundle"]
+			option_values = request.get("options")
+
+		except (ValueError, KeyError, TypeError, AttributeError):
+			self._send_error(400, "Expected a JSON object with a \"bundle\" path and optionally \"options\"")
+
+			return
+
+		if not isinstance(bundle_name, str) or not os.path.exists(bundle_name):
+			self._send_error(400, "No such bundle found: " + str(bundle_name))
+
+			return
+
+		if option_values is not None and not isinstance(option_values, dict):
+			self._send_error(400, "\"options\" must be a JSON object")
+
+			return
+
+		options = self._get_options(option_values)
+
+		if options is not None:
+			self._submit(bundle_name, options)
+
+
+	def do_PUT(self):
+		"""Save an uploaded bundle and queue it.  Options can be given as query
+		parameters, e.g. ?checks=zk_fsync,oom_presence&no_cache=true.  The bundle
+		is removed once its job is done.
+		"""
+		url = urllib.parse.urlsplit(self.path)
+		path_parts = url.path.strip("/").split("/")
+
+		if len(path_parts) != 2 or path_parts[0] != "bundles":
+			self._send_error(404, "Not found")
+
+			return
+
+		try:
+			bytes_left = int(self.headers["Content-Length"])
+
+		except (ValueError, TypeError):
+			self._send_error(411, "Content-Length is required")
+
+			return
+
+		# Check the options before reading the upload
+		options = self._get_options(dict(urllib.parse.parse_qsl(url.query)))
+
+		if options is None:
+			return
+
+		try:
+			upload_path = self.server.daemon.create_upload(urllib.parse.unquote(path_parts[1]))
+
+		except ValueError as error:
+			self._send_error(400, str(error))
+
+			return
+
+		with open(upload_path, "wb") as upload_handle:
+			while bytes_left > 0:
+				chunk = self.rfile.read(min(bytes_left, UPLOAD_CHUNK_SIZE))
+
+				if not chunk:
+					break
+
+				upload_handle.write(chunk)
+				bytes_left -= len(chunk)
+
+		if bytes_left > 0:
+			os.remove(upload_path)
+
+			self._send_error(400, "The upload ended early")
+
+			return
+
+		self._submit(upload_path, options, remove_after=True)
+
+
+	def do_GET(self):
+		"""Send the list of jobs, a job, or a job's report.
+		"""
+		url = urllib.parse.urlsplit(self.path)
+		path_parts = url.path.strip("/").split("/")
+		query = dict(urllib.parse.parse_qsl(url.query))
+
+		if path_parts == ["jobs"]:
+			self._send_json(200, {"jobs": [x.to_json() for x in self.server.daemon.get_jobs()]})
+
+			return
+
+		if len(path_parts) not in (2, 3) or path_parts[0] != "jobs" or (len(path_parts) == 3 and path_parts[2] != "report"):
+			self._send_error(404, "Not found")
+
+			return
+
+		job = self.server.daemon.get_job(path_parts[1])
+
+		if job is None:
+			self._send_error(404, "No such job: " + path_parts[1])
+
+			return
+
+		try:
+			wait_seconds = float(query.get("wait", 0))
+
+		except ValueError:
+			self._send_error(400, "wait must be a number of seconds")
+
+			return
+
+		if wait_seconds > 0:
+			concurrent.futures.wait([job.future], timeout=wait_seconds)
+
+		if len(path_parts) == 2:
+			self._send_json(200, job.to_json(with_records=True))
+
+			return
+
+		if not job.future.done():
+			self._send_error(409, "Job " + job.id + " has not finished")
+
+			return
+
+		report_bytes = job.get_result()["report"].encode("utf-8")
+
+		self.send_response(200)
+		self.send_header("Content-Type", "text/plain; charset=utf-8")
+		self.send_header("Content-Length", str(len(report_bytes)))
+		self.end_headers()
+		self.wfile.write(report_bytes)
+
+
+
+class TCPServer(http.server.ThreadingHTTPServer):
+	"""This class serves the API on a TCP port.
+	"""
+	daemon_threads = True
+
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	"""This class serves the API on a Unix socket.
+	"""
+	daemon_threads = True
+
+
+
+def serve(daemon, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+	"""Answer API requests until interrupted, then stop the workers.
+		socket_path: listen on this Unix socket rather than on host and port
+	"""
+	if socket_path is not None:
+		# A socket left by a daemon which didn't exit cleanly would stop us binding
+		if os.path.exists(socket_path):
+			os.remove(socket_path)
+
+		server = UnixServer(socket_path, RequestHandler)
+
+		print("Listening on", socket_path, file=sys.stderr)
+
+	else:
+		server = TCPServer((host, port), RequestHandler)
+
+		print("Listening on http://" + host + ":" + str(server.server_address[1]), file=sys.stderr)
+
+	server.daemon = daemon
+
+	print("Analyzing up to", daemon.jobs, "bundles at once, uploads are saved in", daemon.upload_dir, file=sys.stderr)
+
+	try:
+		server.serve_forever()
+
+	finally:
+		server.server_close()
+
+		if socket_path is not None and os.path.exists(socket_path):
+			os.remove(socket_path)
+
+		daemon.shutdown()
+
+
+
+def remove_bundle(bundle_name):
+	"""Remove an uploaded bundle file along with the directory it was extracted
+	to and its results cache.
+	"""
+	d2yabt.batch.clean_bundle(bundle_name)
+
+	if os.path.exists(bundle_name):
+		os.remove(bundle_name)
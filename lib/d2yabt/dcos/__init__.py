@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""This file loads the functions and health checks used on a DC/OS bundle.
+"""
+
+
+
+import d2yabt.dcos.bundle
+import d2yabt.dcos.check
@@ -4,11 +4,11 @@
 
 
 
-import sys
 import os
 import re
-import pandas
+import zipfile
 import d2yabt
+import d2yabt.table
 
 
 
@@ -26,6 +26,23 @@ def extract_diag(bundle_name):
 
 
 
+def open_diag(bundle_name):
+	"""Open the DC/OS bundle for reading in place, without extracting it.
+	"""
+	bundle_dir = d2yabt.util.get_bundle_dir(bundle_name)
+
+	print("Reading DC/OS diagnostic bundle in place from", bundle_name)
+
+	try:
+		d2yabt.bundlefs.mount_zip(bundle_name, bundle_dir)
+
+	except zipfile.BadZipFile:
+		raise d2yabt.BundleError("Failed to read bundle in place, corrupt zip?  Run without --no-extract to extract it with 7zip")
+
+	return bundle_dir
+
+
+
 def extract_oneliner(bundle_name):
 	"""Expand the oneliner bundle into a directory.
 	"""
@@ -48,8 +65,8 @@ def get_nodes(bundle_dir, bundle_type):
 	node_objs = list()
 
 	if bundle_type == "dcos_diag":
-		for node_dir in os.listdir(bundle_dir):
-			if not os.path.isdir(os.path.join(bundle_dir, node_dir)):
+		for node_dir in d2yabt.bundlefs.listdir(bundle_dir):
+			if not d2yabt.bundlefs.isdir(os.path.join(bundle_dir, node_dir)):
 				continue
 
 			node_obj = d2yabt.Node()
@@ -74,61 +91,81 @@ def get_nodes(bundle_dir, bundle_type):
 		node_obj.dir = bundle_dir
 		node_obj.ip = "unknown"
 
-		if os.path.exists(os.path.join(bundle_dir, "dcos-mesos-master.service.log")):
+		if d2yabt.bundlefs.exists(os.path.join(bundle_dir, "dcos-mesos-master.service.log")):
 			node_obj.type = "master"
 
-		elif os.path.exists(os.path.join(bundle_dir, "dcos-mesos-slave.service.log")):
+		elif d2yabt.bundlefs.exists(os.path.join(bundle_dir, "dcos-mesos-slave.service.log")):
 			node_obj.type = "priv_agent"
 
-		elif os.path.exists(os.path.join(bundle_dir, "dcos-mesos-slave-public.service.log")):
+		elif d2yabt.bundlefs.exists(os.path.join(bundle_dir, "dcos-mesos-slave-public.service.log")):
 			node_obj.type = "pub_agent"
 
 		node_objs.append(node_obj)
 
 
 	if not node_objs:
-		print("Failed to find any nodes in the bundle directory", file=sys.stderr)
-		sys.exit(1)
+		raise d2yabt.BundleError("Failed to find any nodes in the bundle directory")
 
 	return node_objs
 
 
 
-def get_node_info(node_objs):
-	"""Gather information about DC/OS nodes.
+def _read_node_info(node_obj):
+	"""Read the Docker version and OS of a DC/OS node from its files.
 	"""
-	for node_obj in node_objs:
-		# Get the Docker version
-		if node_obj.type == "master":
-			node_obj.docker_version = "n/a"
+	node_info = dict()
+
+	# Get the Docker version
+	if node_obj.type == "master":
+		node_info["docker_version"] = "n/a"
+
+	else:
+		if d2yabt.bundlefs.exists(os.path.join(node_obj.dir, "docker_--version.output")):
+			docker_version_text = d2yabt.bundlefs.open(os.path.join(node_obj.dir, "docker_--version.output"), "r").read()
+
+			docker_version = re.search(r"Docker version (.*),", docker_version_text).group(1)
+
+			node_info["docker_version"] = docker_version
 
 		else:
-			if os.path.exists(os.path.join(node_obj.dir, "docker_--version.output")):
-				docker_version_text = open(os.path.join(node_obj.dir, "docker_--version.output"), "r").read()
+			node_info["docker_version"] = "unknown"
 
-				docker_version = re.search(r"Docker version (.*),", docker_version_text).group(1)
+	# Get the OS
+	if d2yabt.bundlefs.exists(os.path.join(node_obj.dir, "binsh_-c_cat etc*-release.output")):
+		os_file_text = d2yabt.bundlefs.open(os.path.join(node_obj.dir, "binsh_-c_cat etc*-release.output"), "r").read()
 
-				node_obj.docker_version = docker_version
+		node_os = re.search(r'ID="(.*)"', os_file_text).group(1)
+		node_info["os"] = node_os
 
-			else:
-				node_obj.docker_version = "unknown"
+	else:
+		node_info["os"] = "unkown"
 
-		# Get the OS
-		if os.path.exists(os.path.join(node_obj.dir, "binsh_-c_cat etc*-release.output")):
-			os_file_text = open(os.path.join(node_obj.dir, "binsh_-c_cat etc*-release.output"), "r").read()
+	return node_info
 
-			node_os = re.search(r'ID="(.*)"', os_file_text).group(1)
-			node_obj.os = node_os
 
-		else:
-			node_obj.os = "unkown"
+
+def get_node_info(node_objs):
+	"""Gather information about DC/OS nodes.
+	"""
+	for node_obj in node_objs:
+		node_info_files = [
+			os.path.join(node_obj.dir, "docker_--version.output"),
+			os.path.join(node_obj.dir, "binsh_-c_cat etc*-release.output"),
+		]
+
+		node_info = d2yabt.cache.cached("node_info:" + node_obj.dir + ":" + node_obj.type, node_info_files, d2yabt.__version__, lambda: _read_node_info(node_obj))
+
+		node_obj.docker_version = node_info["docker_version"]
+		node_obj.os = node_info["os"]
+
+		d2yabt.output.node(node_obj)
 
 
 
 def print_nodes(node_objs):
 	"""Prints a table of nodes.
 	"""
-	node_table = pandas.DataFrame(data={
+	node_table = d2yabt.table.Table({
 			"IP": [o.ip for o in node_objs],
 			"Type": [o.type for o in node_objs],
 			"OS": [o.os for o in node_objs],
@@ -136,9 +173,7 @@ def print_nodes(node_objs):
 		}
 	)
 
-	node_table.sort_values("Type", inplace=True)
-	node_table.reset_index(inplace=True, drop=True)
-	node_table.index += 1
+	node_table.sort("Type")
 
 	print(node_table)
 
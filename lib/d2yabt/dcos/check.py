@@ -8,15 +8,229 @@ import sys
 import os
 import json
 import re
+import heapq
+import operator
 import datetime
-import glob
-import pandas
+import d2yabt
+import d2yabt.bundlefs
+import d2yabt.cache
+import d2yabt.jsonstream
+import d2yabt.output
+import d2yabt.scan
+import d2yabt.registry
+import d2yabt.table
 
 
 
-pandas.options.display.max_colwidth = 200
-ANSI_RED_FG = "\033[31m"
-ANSI_END_FORMAT = "\033[0m"
+# The format of the date and time groups of the log patterns
+EVENT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Parsing more event times than this loads pandas to parse them all at once
+VECTORIZE_MIN_EVENTS = 50000
+
+
+
+def _is_master(node_obj):
+	"""Returns True if the node is a master.
+	"""
+	return node_obj.type == "master"
+
+
+
+def _is_not_master(node_obj):
+	"""Returns True if the node is not a master.
+	"""
+	return not node_obj.type == "master"
+
+
+
+def _is_agent(node_obj):
+	"""Returns True if the node is a private or public agent.
+	"""
+	return node_obj.type.endswith("agent")
+
+
+
+# The line patterns searched for by the log checks.  Each log is read once for all of them, see scan_logs().
+LOG_SCANNER = d2yabt.scan.LogScanner()
+
+LOG_SCANNER.register("unreachable_agents_mesos_log", "dcos-mesos-master.service*",
+	r"(\d+-\d+-\d+).*?(\d+:\d+:\d+\.\d+).*Marking agent.*\((\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\) unreachable",
+	node_filter=_is_master)
+
+LOG_SCANNER.register("mesos_leader_changes", "dcos-mesos-master.service*",
+	r"(\d+-\d+-\d+) (\d+:\d+:\d+\.\d+) .* A new leading master \(UPID=master@(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):5050\) is detected",
+	node_filter=_is_master)
+
+LOG_SCANNER.register("overlay_master_recovering", "dcos-mesos-master.service*",
+	r"overlay-master .* `RECOVERING` state",
+	node_filter=_is_master, first_only=True)
+
+LOG_SCANNER.register("zk_leader_changes", "dcos-exhibitor.service*",
+	r"(\d+-\d+-\d+) (\d+:\d+:\d+\.\d+) .* LEADING$",
+	node_filter=_is_master)
+
+LOG_SCANNER.register("zk_fsync", "dcos-exhibitor.service*",
+	r"fsync-ing the write ahead log in SyncThread:\d+ took\s(\d+)ms",
+	node_filter=_is_master, aggregate="top")
+
+LOG_SCANNER.register("zk_diskspace", "dcos-exhibitor.service*",
+	r"No space left on device",
+	node_filter=_is_master, first_only=True)
+
+LOG_SCANNER.register("zk_connection_exception", "dcos-exhibitor.service*",
+	r"Unexpected exception, tries=3, connecting to /(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):2888",
+	node_filter=_is_master)
+
+LOG_SCANNER.register("marathon_leader_changes", "dcos-marathon.service*",
+	r"(\d+-\d+-\d+) (\d+:\d+:\d+\.\d+) .* Leader won: (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):8443",
+	node_filter=_is_master)
+
+LOG_SCANNER.register("crdb_underrep_ranges", "dcos-checks-poststart.service*",
+	r"CockroachDB has underreplicated ranges",
+	node_filter=_is_master, first_only=True)
+
+LOG_SCANNER.register("crdb_monotonicity_error", "dcos-cockroach.service*",
+	r"to ensure monotonicity",
+	node_filter=_is_master, aggregate="count")
+
+LOG_SCANNER.register("crdb_contact_error", "dcos-cockroach.service*",
+	r"unable to contact the other nodes",
+	node_filter=_is_master, aggregate="count")
+
+LOG_SCANNER.register("check_time_failures", "*.service",
+	r"check-time' returned non-zero exit status",
+	single=False, aggregate="count")
+
+LOG_SCANNER.register("kmem_presence", "dmesg*",
+	r"SLUB: Unable to allocate memory on node -1",
+	node_filter=_is_not_master, aggregate="count")
+
+LOG_SCANNER.register("oom_presence", "dmesg*",
+	r"Killed process \d+ \(([^\s]+)\)",
+	aggregate="values")
+
+LOG_SCANNER.register("ssl_cert_error", "dcos-mesos-slave*.service*",
+	r"SSL certificate problem: (.*)$",
+	node_filter=_is_agent, first_only=True)
+
+LOG_SCANNER.register("firewall_running", "ps_aux_ww_Z.output",
+	r"firewalld",
+	timestamped=False)
+
+LOG_SCANNER.register("missing_dockerd", "ps_aux_ww_Z.output",
+	r"dockerd",
+	node_filter=_is_not_master, first_only=True, timestamped=False)
+
+# The window of time events are reported in, see set_time_window()
+_time_window = (None, None)
+
+
+
+def set_time_window(since, until):
+	"""Only report events between two datetimes, either of which may be None.
+	"""
+	global _time_window
+
+	_time_window = (since, until)
+
+	LOG_SCANNER.set_window(since, until)
+
+
+
+def _in_time_window(event_datetime):
+	"""Returns True if a datetime is within the time window.
+	"""
+	since, until = _time_window
+
+	if since is not None and event_datetime < since:
+		return False
+
+	if until is not None and event_datetime > until:
+		return False
+
+	return True
+
+
+
+def get_bundle_time(node_objs):
+	"""Returns the datetime of the last line in the masters' Mesos logs, which is
+	roughly when the bundle was taken, or None if there are no Mesos master logs.
+	"""
+	last_times = list()
+
+	for node_obj in node_objs:
+		if not node_obj.type == "master":
+			continue
+
+		for log in d2yabt.bundlefs.glob(os.path.join(node_obj.dir, "dcos-mesos-master.service*")):
+			last_time = d2yabt.scan.last_timestamp(log)
+
+			if last_time is not None:
+				last_times.append(last_time)
+
+	if not last_times:
+		return None
+
+	return datetime.datetime.strptime(max(last_times), d2yabt.scan.TIMESTAMP_FORMAT)
+
+
+
+def scan_logs(node_objs, jobs=1):
+	"""Scan the logs of each node for every pattern registered with LOG_SCANNER.
+	Nodes which have already been scanned are skipped, so every log check calls
+	this and whichever runs first pays for reading the logs.  bin/yabt calls it
+	before the checks with jobs set so the nodes are scanned in parallel.
+		jobs: the number of nodes to scan at once, None for one per CPU
+	"""
+	pending_nodes = [x for x in node_objs if x.log_matches is None]
+
+	if pending_nodes:
+		LOG_SCANNER.scan_nodes(pending_nodes, jobs=jobs)
+
+
+
+def _read_master_slaves(slaves_file):
+	"""Returns a list of (hostname, is public) for the agents in a Mesos master_slaves
+	file, or None if it can't be parsed.
+	"""
+	try:
+		slaves = d2yabt.jsonstream.read_items(slaves_file, ["slaves"], ("hostname", "reserved_resources"))
+
+	except json.decoder.JSONDecodeError:
+		return None
+
+	return [(slave["hostname"], "slave_public" in slave["reserved_resources"]) for slave in slaves]
+
+
+
+def _parse_event_times(date_strings, time_strings):
+	"""Returns a list of datetimes from the date and time strings of log lines.
+	Large numbers of them are converted in one step with pandas, which is only
+	worth loading when there are enough to make up for the time it takes to
+	import.
+	"""
+	if len(date_strings) < VECTORIZE_MIN_EVENTS:
+		return [datetime.datetime.strptime(x + " " + y, EVENT_TIME_FORMAT) for x, y in zip(date_strings, time_strings)]
+
+	import pandas
+
+	return pandas.to_datetime(pandas.Series(date_strings, dtype=object) + " " + pandas.Series(time_strings, dtype=object), format=EVENT_TIME_FORMAT).tolist()
+
+
+
+def _event_table(date_strings, time_strings, column_name, values):
+	"""Returns a table of events sorted by time.
+	"""
+	event_table = d2yabt.table.Table({
+			"Time": _parse_event_times(date_strings, time_strings),
+			column_name: values,
+		}
+	)
+
+	event_table.sort("Time")
+
+	return event_table
 
 
 
@@ -32,30 +246,30 @@ def nodes_missing_from_bundle(node_objs, bundle_dir):
 			continue
 
 		# Check for missing agents
-		try:
-			with open(os.path.join(node_obj.dir, "5050-master_slaves.json"), "r", encoding="utf-8") as json_file:
-				try:
-					slaves_json = json.load(json_file)
+		slaves_file = os.path.join(node_obj.dir, "5050-master_slaves.json")
 
-				except json.decoder.JSONDecodeError:
-					print("Unable to parse master_slaves JSON from", node_obj.ip, file=sys.stderr)
-					continue
+		try:
+			slaves = d2yabt.cache.cached("master_slaves:" + slaves_file, [slaves_file], d2yabt.__version__, lambda: _read_master_slaves(slaves_file))
 
 		except FileNotFoundError:
 			continue
 
-		for slave in slaves_json["slaves"]:
-			if "slave_public" in slave["reserved_resources"]:
-				if not os.path.exists(os.path.join(bundle_dir, slave["hostname"]) + "_agent_public"):
-					missing_nodes.append((slave["hostname"], "pub_agent"))
+		if slaves is None:
+			print("Unable to parse master_slaves JSON from", node_obj.ip, file=sys.stderr)
+			continue
+
+		for slave_hostname, slave_is_public in slaves:
+			if slave_is_public:
+				if not d2yabt.bundlefs.exists(os.path.join(bundle_dir, slave_hostname) + "_agent_public"):
+					missing_nodes.append((slave_hostname, "pub_agent"))
 
 			else:
-				if not os.path.exists(os.path.join(bundle_dir, slave["hostname"]) + "_agent"):
-					missing_nodes.append((slave["hostname"], "priv_agent"))
+				if not d2yabt.bundlefs.exists(os.path.join(bundle_dir, slave_hostname) + "_agent"):
+					missing_nodes.append((slave_hostname, "priv_agent"))
 
 		# Check for missing masters
 		try:
-			with open(os.path.join(node_obj.dir, "443-exhibitor_exhibitor_v1_cluster_list.json"), "r", encoding="utf-8") as  json_file:
+			with d2yabt.bundlefs.open(os.path.join(node_obj.dir, "443-exhibitor_exhibitor_v1_cluster_list.json"), "r", encoding="utf-8") as  json_file:
 				try:
 					exhib_json = json.load(json_file)
 
@@ -67,26 +281,22 @@ def nodes_missing_from_bundle(node_objs, bundle_dir):
 			continue
 
 			for master_ip in exhib_json["servers"]:
-				if not os.path.exists(os.path.join(bundle_dir, master_ip) + "_master"):
+				if not d2yabt.bundlefs.exists(os.path.join(bundle_dir, master_ip) + "_master"):
 					missing_nodes.append((master_ip, "master"))
 
 		break
 
 	# Print the node table
 	if missing_nodes:
-		print(ANSI_RED_FG + "ALERT: Nodes are missing from the bundle" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [tup[0] for tup in missing_nodes],
 				"Type": [tup[1] for tup in missing_nodes],
 			}
 		)
 
-		node_table.sort_values("Type", inplace=True)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("Type")
 
-		print(node_table)
+		d2yabt.output.alert("Nodes are missing from the bundle", node_table)
 
 
 
@@ -99,7 +309,7 @@ def dcos_version(node_objs):
 
 	for node_obj in node_objs:
 		try:
-			with open(os.path.join(node_obj.dir, "opt/mesosphere/etc/dcos-version.json"), "r", encoding="utf-8") as json_file:
+			with d2yabt.bundlefs.open(os.path.join(node_obj.dir, "opt/mesosphere/etc/dcos-version.json"), "r", encoding="utf-8") as json_file:
 				version_json = json.load(json_file)
 
 			node_obj.dcos_version = version_json["version"]
@@ -115,20 +325,16 @@ def dcos_version(node_objs):
 
 	# Print the node table
 	if len(dcos_versions_set) != 1:
-		print(ANSI_RED_FG + "ALERT: Non-matching DC/OS versions found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [o.ip for o in node_objs],
 				"Type": [o.type for o in node_objs],
 				"DC/OS Version": [o.dcos_version for o in node_objs]
 			}
 		)
 
-		node_table.sort_values("DC/OS Version", inplace=True)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("DC/OS Version")
 
-		print(node_table)
+		d2yabt.output.alert("Non-matching DC/OS versions found", node_table)
 
 
 
@@ -137,36 +343,30 @@ def firewall_running(node_objs):
 	"""
 	print("Checking for running firewall")
 
+	scan_logs(node_objs)
+
 	nodes_with_firewalld = list()
 
 	for node_obj in sorted(node_objs, key=lambda x: x.type):
-		if not os.path.exists(os.path.join(node_obj.dir, "ps_aux_ww_Z.output")):
+		if "firewall_running" in node_obj.log_missing:
 			print("Unable to check for running firewall on", node_obj.ip + ", no ps output available")
 
 			continue
 
-		with open(os.path.join(node_obj.dir, "ps_aux_ww_Z.output"), "r", encoding="utf-8") as ps_file:
-			for each_line in ps_file:
-				each_line = each_line.rstrip("\n")
-
-				if re.search("firewalld", each_line) is not None:
-					nodes_with_firewalld.append(node_obj)
+		for _match in node_obj.log_matches["firewall_running"]:
+			nodes_with_firewalld.append(node_obj)
 
 	# Print the node table
 	if nodes_with_firewalld:
-		print(ANSI_RED_FG + "ALERT: Agents with firewalld running found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [o.ip for o in nodes_with_firewalld],
 				"Type": [o.type for o in nodes_with_firewalld]
 			}
 		)
 
-		node_table.sort_values("Type", inplace=True)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("Type")
 
-		print(node_table)
+		d2yabt.output.alert("Agents with firewalld running found", node_table)
 
 
 
@@ -175,76 +375,47 @@ def unreachable_agents_mesos_log(node_objs):
 	"""
 	print("Checking for unreachable agents in the Mesos master log")
 
-	unreachable_nodes = list()
+	date_strings = list()
+	time_strings = list()
+	unreachable_ips = list()
+
+	scan_logs(node_objs)
 
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		mesos_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-mesos-master.service*"))
-
-		if not len(mesos_log_list) == 1:
-			print("Unable to find log for dcos-mesos-master.service on", node_obj.ip, "(got", len(mesos_log_list), "matches)")
+		if "unreachable_agents_mesos_log" in node_obj.log_missing:
+			print("Unable to find log for dcos-mesos-master.service on", node_obj.ip, "(got", node_obj.log_missing["unreachable_agents_mesos_log"], "matches)")
 
 			continue
 
-		mesos_log = mesos_log_list[0]
-
-		with open(mesos_log, "r", encoding="utf-8") as mesos_master_log:
-			for each_line in mesos_master_log:
-				each_line = each_line.rstrip("\n")
-
-				if re.search(r"Marking agent.*unreachable", each_line) is None:
-					continue
-
-				match = re.search(r"(\d+-\d+-\d+).*(\d+:\d+:\d+\.\d+).*Marking agent.*\((\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\) unreachable", each_line)
-
-				if match is not None:
-					date_string = match.group(1)
-					time_string = match.group(2)
-					unreachable_ip = match.group(3)
-
-					unreachable_datetime = datetime.datetime.strptime(date_string + " " + time_string, "%Y-%m-%d %H:%M:%S.%f")
-
-					unreachable_nodes.append((unreachable_datetime, unreachable_ip))
+		for date_string, time_string, unreachable_ip in node_obj.log_matches["unreachable_agents_mesos_log"]:
+			date_strings.append(date_string)
+			time_strings.append(time_string)
+			unreachable_ips.append(unreachable_ip)
 
 	# Print the node table
-	if unreachable_nodes:
-		print(ANSI_RED_FG + "ALERT: Unreachable agents found in the Mesos master log" + ANSI_END_FORMAT)
-
-		unreachable_nodes.sort(key=lambda tup: tup[0])
-
-		node_table = pandas.DataFrame(data={
-				"Time": [tup[0] for tup in unreachable_nodes],
-				"Agent": [tup[1] for tup in unreachable_nodes],
-			}
-		)
-
-		node_table.index += 1
-
-		print(node_table)
+	if unreachable_ips:
+		d2yabt.output.alert("Unreachable agents found in the Mesos master log", _event_table(date_strings, time_strings, "Agent", unreachable_ips))
 
 	# Find agents that are mentioned in the Mesos master log but are not in the bundle
-	unreachable_ips = set(tup[1] for tup in unreachable_nodes)
+	node_ips = set(x.ip for x in node_objs)
 
 	missing_nodes_from_bundle = list()
 
-	for unreachable_ip in sorted(unreachable_ips):
-		if not any(x.ip == unreachable_ip for x in node_objs):
+	for unreachable_ip in sorted(set(unreachable_ips)):
+		if unreachable_ip not in node_ips:
 			missing_nodes_from_bundle.append(unreachable_ip)
 
 	# Print the node table
 	if missing_nodes_from_bundle:
-		print(ANSI_RED_FG + "ALERT: Agents found in Mesos master log but not in the bundle" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"Agent": missing_nodes_from_bundle,
 			}
 		)
 
-		node_table.index += 1
-
-		print(node_table)
+		d2yabt.output.alert("Agents found in Mesos master log but not in the bundle", node_table)
 
 
 
@@ -255,43 +426,26 @@ def check_time_failures(node_objs):
 
 	check_time_error_nodes = list()
 
-	for node_obj in node_objs:
-		check_time_errors = 0
+	scan_logs(node_objs)
 
-		for file_name in os.listdir(node_obj.dir):
-			if not file_name.endswith(".service"):
-				continue
-
-			with open(os.path.join(node_obj.dir, file_name), "r", encoding="utf-8") as log_file:
-				try:
-					for each_line in log_file:
-						each_line = each_line.rstrip("\n")
-
-						if re.search(r"check-time' returned non-zero exit status", each_line) is not None:
-							check_time_errors += 1
-
-				except UnicodeDecodeError:
-					continue
+	for node_obj in node_objs:
+		check_time_errors = len(node_obj.log_matches["check_time_failures"])
 
 		if not check_time_errors == 0:
 			check_time_error_nodes.append((node_obj, check_time_errors))
 
 	# Print the node table
 	if check_time_error_nodes:
-		print(ANSI_RED_FG + "ALERT: Found nodes with check-time failures" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [tup[0].ip for tup in check_time_error_nodes],
 				"Type": [tup[0].type for tup in check_time_error_nodes],
 				"check-time Failures": [tup[1] for tup in check_time_error_nodes],
 			}
 		)
 
-		node_table.sort_values("check-time Failures", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("check-time Failures", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("Found nodes with check-time failures", node_table)
 
 
 
@@ -302,47 +456,34 @@ def kmem_presence(node_objs):
 
 	kmem_error_nodes = list()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if node_obj.type == "master":
 			continue
 
-		dmesg_file_list = glob.glob(os.path.join(node_obj.dir, "dmesg*"))
-
-		if not len(dmesg_file_list) == 1:
-			print("Unable to find dmesg file on", node_obj.ip, "(got", len(dmesg_file_list), "matches)")
+		if "kmem_presence" in node_obj.log_missing:
+			print("Unable to find dmesg file on", node_obj.ip, "(got", node_obj.log_missing["kmem_presence"], "matches)")
 
 			continue
 
-		dmesg_file = dmesg_file_list[0]
-
-		kmem_slub_error_count = 0
-
-		with open(dmesg_file, "r", encoding="utf-8") as dmesg_file_handle:
-			for each_line in dmesg_file_handle:
-				each_line = each_line.rstrip("\n")
-
-				if re.search("SLUB: Unable to allocate memory on node -1", each_line) is not None:
-					kmem_slub_error_count += 1
+		kmem_slub_error_count = len(node_obj.log_matches["kmem_presence"])
 
 		if not kmem_slub_error_count == 0:
 			kmem_error_nodes.append((node_obj, kmem_slub_error_count))
 
 	# Print the node table
 	if kmem_error_nodes:
-		print(ANSI_RED_FG + "ALERT: Agents with kmem SLUB errors found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [tup[0].ip for tup in kmem_error_nodes],
 				"Type": [tup[0].type for tup in kmem_error_nodes],
 				"kmem SLUB Errors": [tup[1] for tup in kmem_error_nodes],
 			}
 		)
 
-		node_table.sort_values("kmem SLUB Errors", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("kmem SLUB Errors", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("Agents with kmem SLUB errors found", node_table)
 
 
 
@@ -353,49 +494,39 @@ def zk_fsync(node_objs):
 
 	zk_fsync_node_objs = list()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		exhibitor_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-exhibitor.service*"))
-
-		if not len(exhibitor_log_list) == 1:
-			print("Unable to find log for dcos-exhibitor.service on", node_obj.ip, "(got", len(exhibitor_log_list), "matches)")
+		if "zk_fsync" in node_obj.log_missing:
+			print("Unable to find log for dcos-exhibitor.service on", node_obj.ip, "(got", node_obj.log_missing["zk_fsync"], "matches)")
 
 			continue
 
-		exhibitor_log = exhibitor_log_list[0]
-
-		with open(exhibitor_log, "r", encoding="utf-8") as zk_file_handle:
-			for each_line in zk_file_handle:
-				each_line = each_line.rstrip("\n")
-
-				match = re.search(r"fsync-ing the write ahead log in SyncThread:\d+ took\s(\d+)ms", each_line)
+		fsync_tally = node_obj.log_matches["zk_fsync"]
 
-				if match is not None:
-					node_obj.zk_fsync_warning_count += 1
+		if fsync_tally.count:
+			node_obj.zk_fsync_warning_count += fsync_tally.count
 
-					node_obj.add_zk_fsync(match.group(1))
+			for fsync_time in fsync_tally.top.get():
+				node_obj.add_zk_fsync(fsync_time)
 
-					if node_obj not in zk_fsync_node_objs:
-						zk_fsync_node_objs.append(node_obj)
+			zk_fsync_node_objs.append(node_obj)
 
 	# Print the node table
 	if zk_fsync_node_objs:
-		print(ANSI_RED_FG + "ALERT: ZooKeeper slow fsync found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [o.ip for o in zk_fsync_node_objs],
 				"ZK fsync Warnings": [o.zk_fsync_warning_count for o in zk_fsync_node_objs],
 				"ZK Longest fsyncs (ms)": [o.get_longest_zk_fsyncs() for o in zk_fsync_node_objs],
 			}
 		)
 
-		node_table.sort_values("ZK fsync Warnings", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("ZK fsync Warnings", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("ZooKeeper slow fsync found", node_table)
 
 
 
@@ -406,42 +537,30 @@ def zk_diskspace(node_objs):
 
 	zk_diskspace_nodes = list()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		exhibitor_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-exhibitor.service*"))
-
-		if not len(exhibitor_log_list) == 1:
-			print("Unable to find log for dcos-exhibitor.service on", node_obj.ip, "(got", len(exhibitor_log_list), "matches)")
+		if "zk_diskspace" in node_obj.log_missing:
+			print("Unable to find log for dcos-exhibitor.service on", node_obj.ip, "(got", node_obj.log_missing["zk_diskspace"], "matches)")
 
 			continue
 
-		exhibitor_log = exhibitor_log_list[0]
-
-		with open(exhibitor_log, "r", encoding="utf-8") as zk_file_handle:
-			for each_line in zk_file_handle:
-				each_line = each_line.rstrip("\n")
-
-				if re.search("No space left on device", each_line) is not None:
-					zk_diskspace_nodes.append(node_obj.ip)
-
-					break
+		if node_obj.log_matches["zk_diskspace"]:
+			zk_diskspace_nodes.append(node_obj.ip)
 
 	# Print the node table
 	if zk_diskspace_nodes:
-		print(ANSI_RED_FG + "ALERT: ZooKeeper disk space error found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": zk_diskspace_nodes,
 			}
 		)
 
-		node_table.sort_values("IP", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("IP", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("ZooKeeper disk space error found", node_table)
 
 
 
@@ -452,52 +571,37 @@ def zk_connection_exception(node_objs):
 
 	zk_connection_exceptions = dict()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		exhibitor_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-exhibitor.service*"))
-
-		if not len(exhibitor_log_list) == 1:
-			print("Unable to find log for dcos-exhibitor.service on", node_obj.ip, "(got", len(exhibitor_log_list), "matches)")
+		if "zk_connection_exception" in node_obj.log_missing:
+			print("Unable to find log for dcos-exhibitor.service on", node_obj.ip, "(got", node_obj.log_missing["zk_connection_exception"], "matches)")
 
 			continue
 
-		exhibitor_log = exhibitor_log_list[0]
-
-		with open(exhibitor_log, "r", encoding="utf-8") as zk_file_handle:
-			for each_line in zk_file_handle:
-				each_line = each_line.rstrip("\n")
-
-				if re.search(r"Unexpected exception, tries=3, connecting to", each_line) is None:
-					continue
-
-				match = re.search(r"Unexpected exception, tries=3, connecting to /(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):2888", each_line)
+		for (connection_ip,) in node_obj.log_matches["zk_connection_exception"]:
+			exception_connection = node_obj.ip + " --> " + connection_ip
 
-				if match is not None:
-					exception_connection = node_obj.ip + " --> " + match.group(1)
-
-					try:
-						zk_connection_exceptions[exception_connection] += 1
+			try:
+				zk_connection_exceptions[exception_connection] += 1
 
-					except KeyError:
-						zk_connection_exceptions[exception_connection] = 1
+			except KeyError:
+				zk_connection_exceptions[exception_connection] = 1
 
 	# Print the node table
 	if zk_connection_exceptions:
-		print(ANSI_RED_FG + "ALERT: ZooKeeper connection exceptions found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"Connection": list(zk_connection_exceptions.keys()),
 				"Count": [zk_connection_exceptions[connection] for connection in zk_connection_exceptions]
 			}
 		)
 
-		node_table.sort_values("Count", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("Count", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("ZooKeeper connection exceptions found", node_table)
 
 
 
@@ -508,35 +612,27 @@ def oom_presence(node_objs):
 
 	oom_node_objs = list()
 
-	for node_obj in node_objs:
-		dmesg_file_list = glob.glob(os.path.join(node_obj.dir, "dmesg*"))
+	scan_logs(node_objs)
 
-		if not len(dmesg_file_list) == 1:
-			print("Unable to find dmesg file on", node_obj.ip, "(got", len(dmesg_file_list), "matches)")
+	for node_obj in node_objs:
+		if "oom_presence" in node_obj.log_missing:
+			print("Unable to find dmesg file on", node_obj.ip, "(got", node_obj.log_missing["oom_presence"], "matches)")
 
 			continue
 
-		dmesg_file = dmesg_file_list[0]
-
-		with open(dmesg_file, "r", encoding="utf-8") as dmesg_file_handle:
-			for each_line in dmesg_file_handle:
-				each_line = each_line.rstrip("\n")
-
-				match = re.search(r"Killed process \d+ \(([^\s]+)\)", each_line)
+		oom_tally = node_obj.log_matches["oom_presence"]
 
-				if match is not None:
-					node_obj.oom_invoked_count += 1
+		if oom_tally.count:
+			node_obj.oom_invoked_count += oom_tally.count
 
-					node_obj.add_oom_proc(match.group(1))
+			for oom_proc, oom_count in oom_tally.values.items():
+				node_obj.add_oom_proc(oom_proc, oom_count)
 
-					if node_obj not in oom_node_objs:
-						oom_node_objs.append(node_obj)
+			oom_node_objs.append(node_obj)
 
 	# Print the node table
 	if oom_node_objs:
-		print(ANSI_RED_FG + "ALERT: Instances of oom-killer found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [o.ip for o in oom_node_objs],
 				"Type": [o.type for o in oom_node_objs],
 				"oom-killer Invoked": [o.oom_invoked_count for o in oom_node_objs],
@@ -544,11 +640,9 @@ def oom_presence(node_objs):
 			}
 		)
 
-		node_table.sort_values("oom-killer Invoked", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("oom-killer Invoked", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("Instances of oom-killer found", node_table)
 
 
 
@@ -559,42 +653,30 @@ def crdb_underrep_ranges(node_objs):
 
 	underrep_ranges_nodes = list()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		poststart_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-checks-poststart.service*"))
-
-		if not len(poststart_log_list) == 1:
-			print("Unable to find dcos-checks-poststart.service log on", node_obj.ip, "(got", len(poststart_log_list), "matches)")
+		if "crdb_underrep_ranges" in node_obj.log_missing:
+			print("Unable to find dcos-checks-poststart.service log on", node_obj.ip, "(got", node_obj.log_missing["crdb_underrep_ranges"], "matches)")
 
 			continue
 
-		poststart_log = poststart_log_list[0]
-
-		with open(poststart_log, "r", encoding="utf-8") as poststart_file:
-			for each_line in poststart_file:
-				each_line = each_line.rstrip("\n")
-
-				if re.search("CockroachDB has underreplicated ranges", each_line) is not None:
-					underrep_ranges_nodes.append(node_obj.ip)
-
-					break
+		if node_obj.log_matches["crdb_underrep_ranges"]:
+			underrep_ranges_nodes.append(node_obj.ip)
 
 	# Print the node table
 	if underrep_ranges_nodes:
-		print(ANSI_RED_FG + "ALERT: Nodes with under-replicated ranges in CRDB found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": underrep_ranges_nodes,
 			}
 		)
 
-		node_table.sort_values("IP", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("IP", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("Nodes with under-replicated ranges in CRDB found", node_table)
 
 
 
@@ -605,46 +687,33 @@ def crdb_monotonicity_error(node_objs):
 
 	crdb_timesync_nodes = list()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		crdb_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-cockroach.service*"))
-
-		if not len(crdb_log_list) == 1:
-			print("Unable to find dcos-cockroach.service log on", node_obj.ip, "(got", len(crdb_log_list), "matches)")
+		if "crdb_monotonicity_error" in node_obj.log_missing:
+			print("Unable to find dcos-cockroach.service log on", node_obj.ip, "(got", node_obj.log_missing["crdb_monotonicity_error"], "matches)")
 
 			continue
 
-		crdb_log = crdb_log_list[0]
-
-		error_count = 0
-
-		with open(crdb_log, "r", encoding="utf-8") as crdb_log_handle:
-			for each_line in crdb_log_handle:
-				each_line = each_line.rstrip("\n")
-
-				if re.search("to ensure monotonicity", each_line) is not None:
-					error_count += 1
+		error_count = len(node_obj.log_matches["crdb_monotonicity_error"])
 
 		if not error_count == 0:
 			crdb_timesync_nodes.append((node_obj, error_count))
 
 	# Print the node table
 	if crdb_timesync_nodes:
-		print(ANSI_RED_FG + "ALERT: Nodes with time sync errors in CRDB found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [tup[0].ip for tup in crdb_timesync_nodes],
 				"Errors": [tup[1] for tup in crdb_timesync_nodes],
 			}
 		)
 
-		node_table.sort_values("Errors", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("Errors", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("Nodes with time sync errors in CRDB found", node_table)
 
 
 
@@ -655,46 +724,33 @@ def crdb_contact_error(node_objs):
 
 	crdb_contact_error_nodes = list()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		crdb_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-cockroach.service*"))
-
-		if not len(crdb_log_list) == 1:
-			print("Unable to find dcos-cockroach.service log on", node_obj.ip, "(got", len(crdb_log_list), "matches)")
+		if "crdb_contact_error" in node_obj.log_missing:
+			print("Unable to find dcos-cockroach.service log on", node_obj.ip, "(got", node_obj.log_missing["crdb_contact_error"], "matches)")
 
 			continue
 
-		crdb_log = crdb_log_list[0]
-
-		error_count = 0
-
-		with open(crdb_log, "r", encoding="utf-8") as crdb_log_handle:
-			for each_line in crdb_log_handle:
-				each_line = each_line.rstrip("\n")
-
-				if re.search("unable to contact the other nodes", each_line) is not None:
-					error_count += 1
+		error_count = len(node_obj.log_matches["crdb_contact_error"])
 
 		if not error_count == 0:
 			crdb_contact_error_nodes.append((node_obj, error_count))
 
 	# Print the node table
 	if crdb_contact_error_nodes:
-		print(ANSI_RED_FG + "ALERT: Nodes with instance communication errors in CRDB found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [tup[0].ip for tup in crdb_contact_error_nodes],
 				"Errors": [tup[1] for tup in crdb_contact_error_nodes],
 			}
 		)
 
-		node_table.sort_values("Errors", inplace=True, ascending=False)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("Errors", ascending=False)
 
-		print(node_table)
+		d2yabt.output.alert("Nodes with instance communication errors in CRDB found", node_table)
 
 
 
@@ -707,11 +763,11 @@ def state_size(node_objs):
 		if not node_obj.type == "master":
 			continue
 
-		if os.path.exists(os.path.join(node_obj.dir, "5050-master_state.json")):
-			state_size_bytes = os.stat(os.path.join(node_obj.dir, "5050-master_state.json")).st_size
+		if d2yabt.bundlefs.exists(os.path.join(node_obj.dir, "5050-master_state.json")):
+			state_size_bytes = d2yabt.bundlefs.getsize(os.path.join(node_obj.dir, "5050-master_state.json"))
 
 			if state_size_bytes > 5242880:
-				print(ANSI_RED_FG + "ALERT: Mesos state.json is larger than 5MB (" + str(round(state_size_bytes / 1024 / 1024, 2)) + " MB)" + ANSI_END_FORMAT)
+				d2yabt.output.alert("Mesos state.json is larger than 5MB (" + str(round(state_size_bytes / 1024 / 1024, 2)) + " MB)", details={"ip": node_obj.ip, "size_bytes": state_size_bytes})
 
 			break
 
@@ -722,54 +778,29 @@ def mesos_leader_changes(node_objs):
 	"""
 	print("Checking for Mesos leader changes")
 
-	leader_changes = list()
+	date_strings = list()
+	time_strings = list()
+	leader_ips = list()
+
+	scan_logs(node_objs)
 
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		mesos_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-mesos-master.service*"))
-
-		if not len(mesos_log_list) == 1:
-			print("Unable to find log for dcos-mesos-master.service on", node_obj.ip, "(got", len(mesos_log_list), "matches)")
+		if "mesos_leader_changes" in node_obj.log_missing:
+			print("Unable to find log for dcos-mesos-master.service on", node_obj.ip, "(got", node_obj.log_missing["mesos_leader_changes"], "matches)")
 
 			continue
 
-		mesos_log = mesos_log_list[0]
-
-		with open(mesos_log, "r", encoding="utf-8") as mesos_master_log:
-			for each_line in mesos_master_log:
-				each_line = each_line.rstrip("\n")
-
-				if re.search(r"new leading master", each_line) is None:
-					continue
-
-				match = re.search(r"(\d+-\d+-\d+) (\d+:\d+:\d+\.\d+) .* A new leading master \(UPID=master@(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):5050\) is detected", each_line)
-
-				if match is not None:
-					date_string = match.group(1)
-					time_string = match.group(2)
-					leader_ip = match.group(3)
-
-					change_datetime = datetime.datetime.strptime(date_string + " " + time_string, "%Y-%m-%d %H:%M:%S.%f")
-
-					leader_changes.append((change_datetime, leader_ip))
+		for date_string, time_string, leader_ip in node_obj.log_matches["mesos_leader_changes"]:
+			date_strings.append(date_string)
+			time_strings.append(time_string)
+			leader_ips.append(leader_ip)
 
 	# Print the node table
-	if leader_changes:
-		print(ANSI_RED_FG + "ALERT: Mesos leader changes found" + ANSI_END_FORMAT)
-
-		leader_changes.sort(key=lambda tup: tup[0])
-
-		node_table = pandas.DataFrame(data={
-				"Time": [tup[0] for tup in leader_changes],
-				"New Leader": [tup[1] for tup in leader_changes],
-			}
-		)
-
-		node_table.index += 1
-
-		print(node_table)
+	if leader_ips:
+		d2yabt.output.alert("Mesos leader changes found", _event_table(date_strings, time_strings, "New Leader", leader_ips))
 
 
 
@@ -778,53 +809,29 @@ def zk_leader_changes(node_objs):
 	"""
 	print("Checking for ZooKeeper leader changes")
 
-	leader_changes = list()
+	date_strings = list()
+	time_strings = list()
+	leader_ips = list()
+
+	scan_logs(node_objs)
 
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		exhibitor_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-exhibitor.service*"))
-
-		if not len(exhibitor_log_list) == 1:
-			print("Unable to find log for dcos-exhibitor.service on", node_obj.ip, "(got", len(exhibitor_log_list), "matches)")
+		if "zk_leader_changes" in node_obj.log_missing:
+			print("Unable to find log for dcos-exhibitor.service on", node_obj.ip, "(got", node_obj.log_missing["zk_leader_changes"], "matches)")
 
 			continue
 
-		exhibitor_log = exhibitor_log_list[0]
-
-		with open(exhibitor_log, "r", encoding="utf-8") as exhibitor_log_handle:
-			for each_line in exhibitor_log_handle:
-				each_line = each_line.rstrip("\n")
-
-				if re.search(r"LEADING$", each_line) is None:
-					continue
-
-				match = re.search(r"(\d+-\d+-\d+) (\d+:\d+:\d+\.\d+) .* LEADING$", each_line)
-
-				if match is not None:
-					date_string = match.group(1)
-					time_string = match.group(2)
-
-					change_datetime = datetime.datetime.strptime(date_string + " " + time_string, "%Y-%m-%d %H:%M:%S.%f")
-
-					leader_changes.append((change_datetime, node_obj.ip))
+		for date_string, time_string in node_obj.log_matches["zk_leader_changes"]:
+			date_strings.append(date_string)
+			time_strings.append(time_string)
+			leader_ips.append(node_obj.ip)
 
 	# Print the node table
-	if leader_changes:
-		print(ANSI_RED_FG + "ALERT: ZooKeeper leader changes found" + ANSI_END_FORMAT)
-
-		leader_changes.sort(key=lambda tup: tup[0])
-
-		node_table = pandas.DataFrame(data={
-				"Time": [tup[0] for tup in leader_changes],
-				"New Leader": [tup[1] for tup in leader_changes],
-			}
-		)
-
-		node_table.index += 1
-
-		print(node_table)
+	if leader_ips:
+		d2yabt.output.alert("ZooKeeper leader changes found", _event_table(date_strings, time_strings, "New Leader", leader_ips))
 
 
 
@@ -833,54 +840,43 @@ def marathon_leader_changes(node_objs):
 	"""
 	print("Checking for Marathon leader changes")
 
-	leader_changes = list()
+	date_strings = list()
+	time_strings = list()
+	leader_ips = list()
+
+	scan_logs(node_objs)
 
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		marathon_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-marathon.service*"))
-
-		if not len(marathon_log_list) == 1:
-			print("Unable to find log for dcos-marathon.service on", node_obj.ip, "(got", len(marathon_log_list), "matches)")
+		if "marathon_leader_changes" in node_obj.log_missing:
+			print("Unable to find log for dcos-marathon.service on", node_obj.ip, "(got", node_obj.log_missing["marathon_leader_changes"], "matches)")
 
 			continue
 
-		marathon_log = marathon_log_list[0]
-
-		with open(marathon_log, "r", encoding="utf-8") as marathon_log_handle:
-			for each_line in marathon_log_handle:
-				each_line = each_line.rstrip("\n")
-
-				if re.search(r"Leader won:", each_line) is None:
-					continue
-
-				match = re.search(r"(\d+-\d+-\d+) (\d+:\d+:\d+\.\d+) .* Leader won: (\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):8443", each_line)
-
-				if match is not None:
-					date_string = match.group(1)
-					time_string = match.group(2)
-					leader_ip = match.group(3)
-
-					change_datetime = datetime.datetime.strptime(date_string + " " + time_string, "%Y-%m-%d %H:%M:%S.%f")
-
-					leader_changes.append((change_datetime, leader_ip))
+		for date_string, time_string, leader_ip in node_obj.log_matches["marathon_leader_changes"]:
+			date_strings.append(date_string)
+			time_strings.append(time_string)
+			leader_ips.append(leader_ip)
 
 	# Print the node table
-	if leader_changes:
-		print(ANSI_RED_FG + "ALERT: Marathon leader changes found" + ANSI_END_FORMAT)
+	if leader_ips:
+		d2yabt.output.alert("Marathon leader changes found", _event_table(date_strings, time_strings, "New Leader", leader_ips))
 
-		leader_changes.sort(key=lambda tup: tup[0])
 
-		node_table = pandas.DataFrame(data={
-				"Time": [tup[0] for tup in leader_changes],
-				"New Leader": [tup[1] for tup in leader_changes],
-			}
-		)
 
-		node_table.index += 1
+def _read_registry_unreachable(registry_file):
+	"""Returns a list of (nanoseconds since epoch, agent ID) for the unreachable agents
+	in a Mesos registry file, or None if it can't be parsed.
+	"""
+	try:
+		entries = d2yabt.jsonstream.read_items(registry_file, ["unreachable", "slaves"], ("id", "timestamp"))
+
+	except json.decoder.JSONDecodeError:
+		return None
 
-		print(node_table)
+	return [(entry["timestamp"]["nanoseconds"], entry["id"]["value"]) for entry in entries]
 
 
 
@@ -895,48 +891,57 @@ def unreachable_agents_mesos_state(node_objs):
 		if not node_obj.type == "master":
 			continue
 
-		if not os.path.exists(os.path.join(node_obj.dir, "5050-registrar_1__registry.json")):
+		registry_file = os.path.join(node_obj.dir, "5050-registrar_1__registry.json")
+
+		if not d2yabt.bundlefs.exists(registry_file):
 			continue
 
-		with open(os.path.join(node_obj.dir, "5050-registrar_1__registry.json"), "r", encoding="utf-8") as json_file_handle:
-			try:
-				json_data = json.load(json_file_handle)
+		unreachable_entries = d2yabt.cache.cached("registry_unreachable:" + registry_file, [registry_file], d2yabt.__version__, lambda: _read_registry_unreachable(registry_file))
 
-			except json.decoder.JSONDecodeError:
-				print("Unable to check for unreachable agents, failed to parse 5050-registrar_1__registry.json", file=sys.stderr)
+		if unreachable_entries is None:
+			print("Unable to check for unreachable agents, failed to parse 5050-registrar_1__registry.json", file=sys.stderr)
 
-				continue
+			continue
 
-		if "unreachable" in json_data and "slaves" in json_data["unreachable"]:
-			for entry in json_data["unreachable"]["slaves"]:
-				slave_id = entry["id"]["value"]
+		for epoch_nanoseconds, slave_id in unreachable_entries:
+			# Convert nanoseconds since epoch to a datetime object with microsecond accuracy
+			microseconds = int(str(int(epoch_nanoseconds / 1000 % 1000000)).zfill(6))
 
-				# Convert nanoseconds since epoch to a datetime object with microsecond accuracy
-				epoch_nanoseconds = entry["timestamp"]["nanoseconds"]
-				microseconds = int(str(int(epoch_nanoseconds / 1000 % 1000000)).zfill(6))
+			datetime_object = datetime.datetime.fromtimestamp(epoch_nanoseconds // 1000000000)
+			datetime_object += datetime.timedelta(microseconds=microseconds)
 
-				datetime_object = datetime.datetime.fromtimestamp(epoch_nanoseconds // 1000000000)
-				datetime_object += datetime.timedelta(microseconds=microseconds)
+			if not _in_time_window(datetime_object):
+				continue
 
-				unreachable_agents.append((datetime_object, slave_id))
+			unreachable_agents.append((datetime_object, slave_id))
 
 		break
 
 	# Print the node table
 	if unreachable_agents:
-		print(ANSI_RED_FG + "ALERT: Unreachable agents found in Mesos state" + ANSI_END_FORMAT)
-
 		unreachable_agents.sort(key=lambda tup: tup[0])
 
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"Time": [tup[0] for tup in unreachable_agents],
 				"Agent": [tup[1] for tup in unreachable_agents],
 			}
 		)
 
-		node_table.index += 1
+		d2yabt.output.alert("Unreachable agents found in Mesos state", node_table)
+
+
 
-		print(node_table)
+def _read_inactive_frameworks(state_file):
+	"""Returns a list of (name, ID) for the inactive frameworks in a Mesos state
+	file, or None if it can't be parsed.
+	"""
+	try:
+		frameworks = d2yabt.jsonstream.read_items(state_file, ["frameworks"], ("name", "id", "active"))
+
+	except json.decoder.JSONDecodeError:
+		return None
+
+	return [(framework["name"], framework["id"]) for framework in frameworks if framework["active"] is False]
 
 
 
@@ -951,39 +956,34 @@ def inactive_frameworks(node_objs):
 		if not node_obj.type == "master":
 			continue
 
-		if not os.path.exists(os.path.join(node_obj.dir, "5050-master_state.json")):
+		state_file = os.path.join(node_obj.dir, "5050-master_state.json")
+
+		if not d2yabt.bundlefs.exists(state_file):
 			continue
 
-		with open(os.path.join(node_obj.dir, "5050-master_state.json"), "r", encoding="utf-8") as json_file_handle:
-			try:
-				json_data = json.load(json_file_handle)
+		inactive_entries = d2yabt.cache.cached("inactive_frameworks:" + state_file, [state_file], d2yabt.__version__, lambda: _read_inactive_frameworks(state_file))
 
-			except json.decoder.JSONDecodeError:
-				print("Unable to check for inactive frameworks, failed to parse 5050-master_state.json", file=sys.stderr)
+		if inactive_entries is None:
+			print("Unable to check for inactive frameworks, failed to parse 5050-master_state.json", file=sys.stderr)
 
-				break
+			break
 
-		for framework in json_data["frameworks"]:
-			if framework["active"] is False:
-				inactive_frameworks_list.append((framework["name"], framework["id"]))
+		for framework_name, framework_id in inactive_entries:
+			inactive_frameworks_list.append((framework_name, framework_id))
 
 		break
 
 	# Print the node table
 	if inactive_frameworks_list:
-		print(ANSI_RED_FG + "ALERT: Found inactive frameworks" + ANSI_END_FORMAT)
-
 		inactive_frameworks_list.sort(key=lambda tup: tup[0])
 
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"Name": [tup[0] for tup in inactive_frameworks_list],
 				"ID": [tup[1] for tup in inactive_frameworks_list],
 			}
 		)
 
-		node_table.index += 1
-
-		print(node_table)
+		d2yabt.output.alert("Found inactive frameworks", node_table)
 
 
 
@@ -992,43 +992,32 @@ def missing_dockerd(node_objs):
 	"""
 	print("Checking for missing Docker daemon on agents")
 
+	scan_logs(node_objs)
+
 	agents_missing_dockerd = list()
 
 	for node_obj in node_objs:
 		if node_obj.type == "master":
 			continue
 
-		if not os.path.exists(os.path.join(node_obj.dir, "ps_aux_ww_Z.output")):
+		if "missing_dockerd" in node_obj.log_missing:
 			print("Unable to check for missing Docker daemon on", node_obj.ip + ", no ps output available")
 
 			continue
 
-		with open(os.path.join(node_obj.dir, "ps_aux_ww_Z.output"), "r", encoding="utf-8") as ps_file:
-			found_dockerd = False
-
-			for each_line in ps_file:
-				if re.search("dockerd", each_line) is not None:
-					found_dockerd = True
-
-					break
-
-			if found_dockerd is False:
-				agents_missing_dockerd.append(node_obj.ip)
+		if not node_obj.log_matches["missing_dockerd"]:
+			agents_missing_dockerd.append(node_obj.ip)
 
 	# Print the node table
 	if agents_missing_dockerd:
-		print(ANSI_RED_FG + "ALERT: Found agents with Docker daemon not running" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": agents_missing_dockerd,
 			}
 		)
 
-		node_table.sort_values("IP", inplace=True)
-		node_table.reset_index(inplace=True, drop=True)
-		node_table.index += 1
+		node_table.sort("IP")
 
-		print(node_table)
+		d2yabt.output.alert("Found agents with Docker daemon not running", node_table)
 
 
 
@@ -1039,42 +1028,29 @@ def ssl_cert_error(node_objs):
 
 	ssl_error_nodes = list()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if not node_obj.type.endswith("agent"):
 			continue
 
-		mesos_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-mesos-slave*.service*"))
-
-		if not len(mesos_log_list) == 1:
-			print("Unable to find log for dcos-mesos-slave*.service on", node_obj.ip, "(got", len(mesos_log_list), "matches)")
+		if "ssl_cert_error" in node_obj.log_missing:
+			print("Unable to find log for dcos-mesos-slave*.service on", node_obj.ip, "(got", node_obj.log_missing["ssl_cert_error"], "matches)")
 
 			continue
 
-		mesos_log = mesos_log_list[0]
-
-		with open(mesos_log, "r", encoding="utf-8") as mesos_slave_log:
-			for each_line in mesos_slave_log:
-				each_line = each_line.rstrip("\n")
-
-				match = re.search(r"SSL certificate problem: (.*)$", each_line)
-
-				if match is not None:
-					ssl_error_nodes.append((node_obj, match.group(1)))
-					break
+		for (ssl_problem,) in node_obj.log_matches["ssl_cert_error"]:
+			ssl_error_nodes.append((node_obj, ssl_problem))
 
 	# Print the node table
 	if ssl_error_nodes:
-		print(ANSI_RED_FG + "ALERT: SSL certificate problem found in Mesos slave log (CA missing from /var/lib/dcos/pki/tls/certs?)" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [tup[0].ip for tup in ssl_error_nodes],
 				"Problem": [tup[1] for tup in ssl_error_nodes],
 			}
 		)
 
-		node_table.index += 1
-
-		print(node_table)
+		d2yabt.output.alert("SSL certificate problem found in Mesos slave log (CA missing from /var/lib/dcos/pki/tls/certs?)", node_table)
 
 
 
@@ -1085,44 +1061,28 @@ def overlay_master_recovering(node_objs):
 
 	overlay_error_nodes = list()
 
+	scan_logs(node_objs)
+
 	for node_obj in node_objs:
 		if not node_obj.type == "master":
 			continue
 
-		mesos_log_list = glob.glob(os.path.join(node_obj.dir, "dcos-mesos-master.service*"))
-
-		if not len(mesos_log_list) == 1:
-			print("Unable to find log for dcos-mesos-master.service on", node_obj.ip, "(got", len(mesos_log_list), "matches)")
+		if "overlay_master_recovering" in node_obj.log_missing:
+			print("Unable to find log for dcos-mesos-master.service on", node_obj.ip, "(got", node_obj.log_missing["overlay_master_recovering"], "matches)")
 
 			continue
 
-		mesos_log = mesos_log_list[0]
-
-		with open(mesos_log, "r", encoding="utf-8") as mesos_master_log:
-			for each_line in mesos_master_log:
-				each_line = each_line.rstrip("\n")
-
-				if re.search("RECOVERING", each_line) is None:
-					continue
-
-				match = re.search(r"overlay-master .* `RECOVERING` state", each_line)
-
-				if match is not None:
-					overlay_error_nodes.append(node_obj)
-					break
+		if node_obj.log_matches["overlay_master_recovering"]:
+			overlay_error_nodes.append(node_obj)
 
 	# Print the node table
 	if overlay_error_nodes:
-		print(ANSI_RED_FG + "ALERT: overlay-master in RECOVERING state detected" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [node.ip for node in overlay_error_nodes]
 			}
 		)
 
-		node_table.index += 1
-
-		print(node_table)
+		d2yabt.output.alert("overlay-master in RECOVERING state detected", node_table)
 
 
 
@@ -1134,23 +1094,117 @@ def ntp_sync(node_objs):
 	ntp_sync_nodes = list()
 
 	for node_obj in node_objs:
-		if not glob.glob(os.path.join(node_obj.dir, "timedatectl.output")):
+		if not d2yabt.bundlefs.glob(os.path.join(node_obj.dir, "timedatectl.output")):
 			continue
 
-		timedatectl_text = open(os.path.join(node_obj.dir, "timedatectl.output"), "r").read()
+		timedatectl_text = d2yabt.bundlefs.open(os.path.join(node_obj.dir, "timedatectl.output"), "r").read()
 
 		if re.search(r"NTP synchronized: yes", timedatectl_text) is None:
 			ntp_sync_nodes.append(node_obj)
 			
 	if ntp_sync_nodes:
-		print(ANSI_RED_FG + "ALERT: Nodes with NTP not synchronized according to timedatectl found" + ANSI_END_FORMAT)
-
-		node_table = pandas.DataFrame(data={
+		node_table = d2yabt.table.Table({
 				"IP": [node.ip for node in ntp_sync_nodes]
 			}
 		)
 
-		node_table.index += 1
+		d2yabt.output.alert("Nodes with NTP not synchronized according to timedatectl found", node_table)
+
+
+
+# The log patterns shown by --timeline and how each of their events is described.
+# Each pattern's first two groups are the date and time of the event.
+TIMELINE_EVENTS = {
+	"mesos_leader_changes": "Mesos leader is now {2}",
+	"unreachable_agents_mesos_log": "Agent {2} marked unreachable",
+	"zk_leader_changes": "ZooKeeper leader elected on this node",
+	"marathon_leader_changes": "Marathon leader is now {2}",
+}
+
+
+
+def _timeline_events(node_obj, log_stream):
+	"""Yields a tuple of (datetime, node IP, pattern name, description) for each
+	timeline event in a log, in the order they are in the log.
+	"""
+	for log_pattern, groups in log_stream:
+		event_datetime = datetime.datetime.strptime(groups[0] + " " + groups[1], EVENT_TIME_FORMAT)
+
+		if not _in_time_window(event_datetime):
+			continue
+
+		yield event_datetime, node_obj.ip, log_pattern.name, TIMELINE_EVENTS[log_pattern.name].format(*groups)
+
+
+
+def iter_timeline(node_objs):
+	"""Returns a generator of the timeline events of every node in time order,
+	see _timeline_events().  Each log is already in time order, so the logs are
+	read side by side and merged a line at a time with a heap rather than
+	collecting and sorting every event.
+	"""
+	event_streams = list()
+
+	for node_obj in node_objs:
+		for log_stream in LOG_SCANNER.iter_log_matches(node_obj, TIMELINE_EVENTS):
+			event_streams.append(_timeline_events(node_obj, log_stream))
+
+	return heapq.merge(*event_streams, key=operator.itemgetter(0))
 
-		print(node_table)
 
+
+def print_timeline(node_objs):
+	"""Print the leader changes and unreachable agents of every node as a single
+	list in time order.
+	"""
+	print("Cluster event timeline")
+
+	event_count = 0
+
+	for event_datetime, node_ip, event_name, description in iter_timeline(node_objs):
+		event_count += 1
+
+		if d2yabt.output.is_structured():
+			d2yabt.output.emit({"type": "event", "time": event_datetime, "node": node_ip, "event": event_name, "description": description})
+
+			continue
+
+		if event_count == 1:
+			print("{:<26} {:<15} {:<28} {}".format("Time", "Node", "Event", "Description"))
+
+		print("{:<26} {:<15} {:<28} {}".format(event_datetime.isoformat(sep=" ", timespec="microseconds"), node_ip, event_name, description))
+
+	if event_count == 0:
+		print("No events found")
+
+
+
+# The checks in the order they are run.  A check's log patterns are registered with LOG_SCANNER under the check's name.
+MASTER = ("master",)
+AGENTS = ("priv_agent", "pub_agent")
+DIAG = ("dcos_diag",)
+DIAG_AND_ONELINER = ("dcos_diag", "dcos_oneliner")
+
+d2yabt.registry.register(nodes_missing_from_bundle, DIAG, roles=MASTER, inputs=["5050-master_slaves.json"], pass_bundle_dir=True)
+d2yabt.registry.register(dcos_version, DIAG, inputs=["opt/mesosphere/etc/dcos-version.json"])
+d2yabt.registry.register(firewall_running, DIAG, inputs=LOG_SCANNER.globs("firewall_running"))
+d2yabt.registry.register(state_size, DIAG, roles=MASTER, inputs=["5050-master_state.json"])
+d2yabt.registry.register(ntp_sync, DIAG, inputs=["timedatectl.output"])
+d2yabt.registry.register(inactive_frameworks, DIAG, roles=MASTER, inputs=["5050-master_state.json"])
+d2yabt.registry.register(missing_dockerd, DIAG, roles=AGENTS, inputs=LOG_SCANNER.globs("missing_dockerd"))
+d2yabt.registry.register(unreachable_agents_mesos_state, DIAG, roles=MASTER, inputs=["5050-registrar_1__registry.json"])
+d2yabt.registry.register(unreachable_agents_mesos_log, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("unreachable_agents_mesos_log"))
+d2yabt.registry.register(mesos_leader_changes, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("mesos_leader_changes"))
+d2yabt.registry.register(zk_leader_changes, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("zk_leader_changes"))
+d2yabt.registry.register(marathon_leader_changes, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("marathon_leader_changes"))
+d2yabt.registry.register(check_time_failures, DIAG_AND_ONELINER, inputs=LOG_SCANNER.globs("check_time_failures"))
+d2yabt.registry.register(kmem_presence, DIAG_AND_ONELINER, roles=AGENTS, inputs=LOG_SCANNER.globs("kmem_presence"))
+d2yabt.registry.register(zk_fsync, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("zk_fsync"))
+d2yabt.registry.register(zk_diskspace, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("zk_diskspace"))
+d2yabt.registry.register(zk_connection_exception, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("zk_connection_exception"))
+d2yabt.registry.register(oom_presence, DIAG_AND_ONELINER, inputs=LOG_SCANNER.globs("oom_presence"))
+d2yabt.registry.register(crdb_underrep_ranges, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("crdb_underrep_ranges"))
+d2yabt.registry.register(crdb_monotonicity_error, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("crdb_monotonicity_error"))
+d2yabt.registry.register(crdb_contact_error, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("crdb_contact_error"))
+d2yabt.registry.register(ssl_cert_error, DIAG_AND_ONELINER, roles=AGENTS, inputs=LOG_SCANNER.globs("ssl_cert_error"))
+d2yabt.registry.register(overlay_master_recovering, DIAG_AND_ONELINER, roles=MASTER, inputs=LOG_SCANNER.globs("overlay_master_recovering"))
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""This file contains an incremental JSON reader used on the large JSON files
+in a bundle, such as the Mesos state.  Rather than loading the whole document
+it walks to an array, e.g. the frameworks in 5050-master_state.json, and hands
+back the fields wanted from each item one at a time.  Everything else is
+skipped over without being kept, so memory use stays bounded by the size of a
+single item no matter how large the file is, and reading stops once the array
+has been read.
+"""
+
+
+
+import io
+import os
+import json
+import time
+import d2yabt.bundlefs
+import d2yabt.profile
+
+
+
+CHUNK_SIZE = 1048576
+
+WHITESPACE = " \t\n\r"
+
+NUMBER_CHARACTERS = "0123456789+-.eE"
+
+
+
+class JSONStream:
+	"""This class reads JSON values from a text file handle a piece at a time.
+	"""
+	def __init__(self, file_handle, chunk_size=CHUNK_SIZE):
+		self._file_handle = file_handle
+		self._chunk_size = chunk_size
+		self._decoder = json.JSONDecoder()
+		self._buffer = ""
+		self._pos = 0
+		self._at_eof = False
+
+
+	def _fill(self):
+		"""Read another chunk of the file into the buffer, dropping what has already
+		been consumed.  Returns False at the end of the file.
+		"""
+		if self._at_eof:
+			return False
+
+		chunk = self._file_handle.read(self._chunk_size)
+
+		if not chunk:
+			self._at_eof = True
+
+			return False
+
+		self._buffer = self._buffer[self._pos:] + chunk
+		self._pos = 0
+
+		return True
+
+
+	def _error(self, message):
+		"""Returns a JSONDecodeError for the current position.
+		"""
+		return json.decoder.JSONDecodeError(message, self._buffer, self._pos)
+
+
+	def peek(self):
+		"""Returns the next character which is not whitespace without consuming it,
+		or an empty string at the end of the file.
+		"""
+		while True:
+			while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+				self._pos += 1
+
+			if self._pos < len(self._buffer):
+				return self._buffer[self._pos]
+
+			if not self._fill():
+				return ""
+
+
+	def expect(self, character):
+		"""Consume the next character, which must be the one given.
+		"""
+		if self.peek() != character:
+			raise self._error("Expecting " + repr(character))
+
+		self._pos += 1
+
+
+	def read_value(self, max_size=None):
+		"""Returns the next value.  If max_size is set and the value does not fit
+		in that many characters of buffer, nothing is consumed and the
+		JSONStream itself is returned instead, so the caller can walk into it.
+		"""
+		self.peek()
+
+		while True:
+			try:
+				value, end = self._decoder.raw_decode(self._buffer, self._pos)
+
+				# A number cut off by the end of the buffer continues in the next chunk
+				if self._at_eof or (end < len(self._buffer) and self._buffer[end] not in NUMBER_CHARACTERS):
+					self._pos = end
+
+					return value
+
+			except json.decoder.JSONDecodeError:
+				if self._at_eof:
+					raise
+
+			if max_size is not None and len(self._buffer) - self._pos >= max_size:
+				return self
+
+			# At the end of the file this sets _at_eof, so the next try is the last
+			self._fill()
+
+
+	def skip_value(self):
+		"""Consume the next value without keeping it.  Containers too large for a
+		chunk are walked through an item at a time.
+		"""
+		if self.peek() not in ("{", "["):
+			self.read_value()
+
+			return
+
+		if self.read_value(max_size=self._chunk_size) is not self:
+			return
+
+		if self.peek() == "{":
+			for _key in self.object_keys():
+				self.skip_value()
+
+		else:
+			for _index in self.array_items():
+				self.skip_value()
+
+
+	def object_keys(self):
+		"""Yields the keys of the next object.  The value of each key must be
+		consumed, with read_value() or skip_value(), before the next key.
+		"""
+		self.expect("{")
+
+		if self.peek() == "}":
+			self._pos += 1
+
+			return
+
+		while True:
+			key = self.read_value()
+
+			if not isinstance(key, str):
+				raise self._error("Expecting property name")
+
+			self.expect(":")
+
+			yield key
+
+			if self.peek() == ",":
+				self._pos += 1
+
+				continue
+
+			self.expect("}")
+
+			return
+
+
+	def array_items(self):
+		"""Yields the index of each item of the next array.  Each item must be
+		consumed before the next one.
+		"""
+		self.expect("[")
+
+		if self.peek() == "]":
+			self._pos += 1
+
+			return
+
+		index = 0
+
+		while True:
+			yield index
+
+			index += 1
+
+			if self.peek() == ",":
+				self._pos += 1
+
+				continue
+
+			self.expect("]")
+
+			return
+
+
+	def find(self, path):
+		"""Move to the value at a path of object keys from the top of the
+		document.  Returns False if the path is not in the document.
+		"""
+		for key in path:
+			if self.peek() != "{":
+				return False
+
+			for each_key in self.object_keys():
+				if each_key == key:
+					break
+
+				self.skip_value()
+
+			else:
+				return False
+
+		return True
+
+
+	def items(self, path, fields=None):
+		"""Yields the items of the array at a path of object keys, or nothing if
+		the array is not in the document.
+			fields: only read these keys of each item, the rest are skipped
+		"""
+		if not self.find(path) or self.peek() != "[":
+			return
+
+		for _index in self.array_items():
+			if fields is None or self.peek() != "{":
+				yield self.read_value()
+
+				continue
+
+			item = dict()
+
+			for key in self.object_keys():
+				if key in fields:
+					item[key] = self.read_value()
+
+				else:
+					self.skip_value()
+
+			yield item
+
+
+
+def read_items(json_file, path, fields=None):
+	"""Returns a list of the items of the array at a path within a bundle JSON
+	file, only keeping the given fields of each.  How much of the file was read,
+	the time taken and the peak memory use while reading it are printed.  Raises
+	JSONDecodeError if the file is malformed.
+	"""
+	start_time = time.time()
+	was_reset = d2yabt.profile.reset_peak_rss()
+
+	with d2yabt.bundlefs.open(json_file, "rb") as json_binary_handle:
+		json_stream = JSONStream(io.TextIOWrapper(json_binary_handle, encoding="utf-8"))
+		items = list(json_stream.items(path, fields))
+
+		# Bytes taken from the (decompressed) file, including the text reader's read ahead
+		bytes_read = json_binary_handle.tell()
+
+	d2yabt.profile.add_read(bytes_read)
+
+	peak_rss = d2yabt.profile.get_peak_rss_mb(was_reset)
+
+	print("Parsed", os.path.basename(json_file) + ", read", round(bytes_read / 1024 / 1024, 2), "MB in", round(time.time() - start_time, 2), "seconds" + (", peak RSS " + str(round(peak_rss, 1)) + " MB" if peak_rss is not None else ""))
+
+	return items
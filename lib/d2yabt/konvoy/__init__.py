@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""This file loads the functions and health checks used on a Konvoy bundle.
+"""
+
+
+
+import d2yabt.konvoy.bundle
+import d2yabt.konvoy.check
@@ -4,16 +4,39 @@
 
 
 
-import sys
 import os
 import re
-import pandas
+import time
+import concurrent.futures
 import d2yabt
+import d2yabt.table
 
 
 
-def extract(bundle_name):
+def _extract_node_tarball(file_with_path):
+	"""Untar a node's tarball next to itself.
+		Returns the tarball, its size in bytes and the seconds it took to extract.
+	"""
+	start_time = time.time()
+
+	d2yabt.util.untar(file_with_path, file_with_path[:-7])
+
+	return file_with_path, os.path.getsize(file_with_path), time.time() - start_time
+
+
+
+def _print_node_progress(file_with_path, size_bytes, seconds):
+	"""Print the throughput of a node tarball extraction.
+	"""
+	size_mb = size_bytes / 1024 / 1024
+
+	print("	Extracted", os.path.basename(file_with_path), "(" + str(round(size_mb, 2)), "MB in", round(seconds, 2), "seconds,", round(size_mb / max(seconds, 0.001), 2), "MB/s)")
+
+
+
+def extract(bundle_name, jobs=None):
 	"""Expand the Konvoy bundle into a directory.
+		jobs: the number of node tarballs to extract at once, None for one per CPU
 	"""
 	bundle_name = d2yabt.util.relocate_bundle(bundle_name)
 	bundle_dir = d2yabt.util.get_bundle_dir(bundle_name)
@@ -22,16 +45,30 @@ def extract(bundle_name):
 
 	d2yabt.util.untar(bundle_name, bundle_dir)
 
+	node_tarballs = list()
+
 	for root, _dirs, files in os.walk(bundle_dir):
 		for each_file in files:
 			if not each_file.endswith(".tar.gz"):
 				continue
 
-			file_with_path = os.path.join(root, each_file)
+			node_tarballs.append(os.path.join(root, each_file))
+
+	# Start with the largest tarballs so a single big node isn't the last one running
+	node_tarballs.sort(key=os.path.getsize, reverse=True)
+
+	jobs = d2yabt.util.worker_count(jobs)
 
-			file_with_path_no_ext = file_with_path[:-7]
+	if jobs == 1:
+		for file_with_path in node_tarballs:
+			_print_node_progress(*_extract_node_tarball(file_with_path))
 
-			d2yabt.util.untar(file_with_path, file_with_path_no_ext)
+	else:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+			futures = [executor.submit(_extract_node_tarball, x) for x in node_tarballs]
+
+			for future in concurrent.futures.as_completed(futures):
+				_print_node_progress(*future.result())
 
 	return bundle_dir
 
@@ -59,10 +96,10 @@ def get_nodes(bundle_dir):
 
 		node_objs.append(node_obj)
 
-	if not node_objs:
-		print("Failed to find any nodes in the bundle directory", file=sys.stderr)
+		d2yabt.output.node(node_obj)
 
-		sys.exit(1)
+	if not node_objs:
+		raise d2yabt.BundleError("Failed to find any nodes in the bundle directory")
 
 	return node_objs
 
@@ -71,13 +108,11 @@ def get_nodes(bundle_dir):
 def print_nodes(node_objs):
 	"""Prints a table of nodes.
 	"""
-	node_table = pandas.DataFrame(data={
+	node_table = d2yabt.table.Table({
 			"IP": [o.ip for o in node_objs],
 			"Type": [o.type for o in node_objs]
 		}
 	)
 
-	node_table.index += 1
-
 	print(node_table)
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""This file contains small, mergeable summaries of the events found on a node.
+Rather than keeping every matching log line, a pattern can keep a count, the
+largest few values, and how often each value was seen.  Summaries from
+separate logs or worker processes are combined with merge(), and they pickle
+and cache much smaller than the lines they stand for.
+"""
+
+
+
+import heapq
+import collections
+
+
+
+class TopK:
+	"""This class keeps the k largest values added to it in a min-heap, so adding
+	a value costs O(log k) however many are added.
+	"""
+	__slots__ = ("k", "_heap")
+
+	def __init__(self, k):
+		self.k = k
+		self._heap = list()
+
+
+	def add(self, value):
+		"""Add a value, dropping the smallest kept value if there are more than k.
+		"""
+		if len(self._heap) < self.k:
+			heapq.heappush(self._heap, value)
+
+		elif value > self._heap[0]:
+			heapq.heapreplace(self._heap, value)
+
+
+	def merge(self, other):
+		"""Add the values kept by another TopK.
+		"""
+		for value in other._heap:
+			self.add(value)
+
+
+	def get(self):
+		"""Returns the kept values, largest first.
+		"""
+		return sorted(self._heap, reverse=True)
+
+
+
+class Tally:
+	"""This class summarizes the matches of a log pattern.  It always counts them,
+	and can also keep the largest values of the first group as ints and the
+	number of times each value of the first group was seen.
+		top_k: how many of the largest values to keep, 0 to keep none
+		count_values: count each value of the first group
+	"""
+	__slots__ = ("count", "top", "values")
+
+	def __init__(self, top_k=0, count_values=False):
+		self.count = 0
+		self.top = TopK(top_k) if top_k else None
+		self.values = collections.Counter() if count_values else None
+
+
+	def append(self, groups):
+		"""Add a match, given the groups of the matching line.  Named append so a
+		Tally can stand in for the list of matches in LogScanner results.
+		"""
+		self.count += 1
+
+		if self.top is not None:
+			self.top.add(int(groups[0]))
+
+		if self.values is not None:
+			self.values[groups[0]] += 1
+
+
+	def merge(self, other):
+		"""Add the matches summarized by another Tally.
+		"""
+		self.count += other.count
+
+		if self.top is not None and other.top is not None:
+			self.top.merge(other.top)
+
+		if self.values is not None and other.values is not None:
+			self.values.update(other.values)
+
+
+	def __len__(self):
+		return self.count
+
+
+	def to_json(self):
+		"""Returns the Tally as JSON serializable data, see from_json().
+		"""
+		return {
+			"count": self.count,
+			"top_k": self.top.k if self.top is not None else 0,
+			"top": self.top.get() if self.top is not None else None,
+			"values": list(self.values.items()) if self.values is not None else None,
+		}
+
+
+	@classmethod
+	def from_json(cls, tally_json):
+		"""Returns a Tally from the data given by to_json().
+		"""
+		tally = cls(tally_json["top_k"], tally_json["values"] is not None)
+		tally.count = tally_json["count"]
+
+		for value in tally_json["top"] or list():
+			tally.top.add(value)
+
+		for value, value_count in tally_json["values"] or list():
+			tally.values[value] = value_count
+
+		return tally
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""This file contains the machine-readable output behind --output.  By default
+yabt prints text for people to read.  With --output json or ndjson each node
+and each check result is also written to stdout as a record the moment it is
+found, and the text is moved to stderr so stdout holds nothing but records.
+json writes the records as a single array, ndjson one record per line.
+"""
+
+
+
+import sys
+import json
+import atexit
+
+
+
+FORMATS = ("text", "json", "ndjson")
+
+ANSI_RED_FG = "\033[31m"
+ANSI_END_FORMAT = "\033[0m"
+
+_format = "text"
+
+# Where records are written, the real stdout
+_record_stream = None
+
+_record_count = 0
+
+# Records kept rather than written, see start_collecting()
+_collected = None
+
+# The check being run and how many alerts it has raised, see start_check()
+_current_check = None
+_check_alerts = 0
+
+
+
+def set_format(output_format):
+	"""Set the output format, one of FORMATS.  For json and ndjson, records go to
+	stdout and everything printed from then on goes to stderr.
+	"""
+	global _format
+	global _record_stream
+
+	_format = output_format
+
+	if output_format == "text":
+		return
+
+	_record_stream = sys.stdout
+	sys.stdout = sys.stderr
+
+	# Close the json array however yabt exits
+	atexit.register(finish)
+
+
+
+def is_structured():
+	"""Returns True if records are being written or collected.
+	"""
+	return _format != "text" or _collected is not None
+
+
+
+def json_default(value):
+	"""Convert the values json can't, such as datetimes and numpy numbers.
+	"""
+	if hasattr(value, "isoformat"):
+		return value.isoformat()
+
+	if hasattr(value, "item"):
+		return value.item()
+
+	return str(value)
+
+
+
+def emit(record):
+	"""Write a record, a dict with a "type" key, straight away.
+	"""
+	global _record_count
+
+	if _collected is not None:
+		_collected.append(record)
+
+		return
+
+	if not is_structured():
+		return
+
+	record_text = json.dumps(record, default=json_default)
+
+	if _format == "ndjson":
+		_record_stream.write(record_text + "\n")
+
+	elif _record_count == 0:
+		_record_stream.write("[\n" + record_text)
+
+	else:
+		_record_stream.write(",\n" + record_text)
+
+	_record_stream.flush()
+
+	_record_count += 1
+
+
+
+def finish():
+	"""End the output, closing the json array.
+	"""
+	global _record_count
+	global _record_stream
+
+	if _format != "json" or _record_stream is None:
+		return
+
+	_record_stream.write(("[" if _record_count == 0 else "\n") + "]\n")
+	_record_stream.flush()
+
+	# Only close the array once
+	_record_count = 0
+	_record_stream = None
+
+
+
+def start_collecting():
+	"""Keep the records from now on in a list rather than writing them, e.g. to
+	hand the results of a bundle analyzed by a worker process back to batch mode.
+	"""
+	global _collected
+	global _current_check
+	global _check_alerts
+
+	_collected = list()
+	_current_check = None
+	_check_alerts = 0
+
+
+
+def stop_collecting():
+	"""Returns the records kept since start_collecting() and stops keeping them.
+	"""
+	global _collected
+
+	records = _collected or list()
+	_collected = None
+
+	return records
+
+
+
+def bundle(bundle_name, bundle_type, version):
+	"""Write a record describing the bundle being checked.
+	"""
+	emit({"type": "bundle", "bundle": bundle_name, "bundle_type": bundle_type, "yabt_version": version})
+
+
+
+def node(node_obj):
+	"""Write a record describing a node.
+	"""
+	emit({
+		"type": "node",
+		"ip": node_obj.ip,
+		"node_type": node_obj.type,
+		"os": node_obj.os,
+		"docker_version": node_obj.docker_version,
+		"dir": node_obj.dir,
+	})
+
+
+
+def start_check(check_name):
+	"""Note that a check is starting, so its alerts are recorded against it.
+	"""
+	global _current_check
+	global _check_alerts
+
+	_current_check = check_name
+	_check_alerts = 0
+
+
+
+def end_check():
+	"""Write a record of the result of the check which just ran.
+	"""
+	global _current_check
+
+	emit({"type": "check", "check": _current_check, "status": "alert" if _check_alerts else "ok", "alerts": _check_alerts})
+
+	_current_check = None
+
+
+
+def skip_check(check_name, reason):
+	"""Write a record of a check which was not run.
+	"""
+	emit({"type": "check", "check": check_name, "status": "skipped", "reason": reason})
+
+
+
+def alert(message, table=None, details=None):
+	"""Print an alert found by a check along with its d2yabt.table.Table, if any, and
+	write it as a record with a row for each row of the table.
+		details: a dict of extra values for the record
+	"""
+	global _check_alerts
+
+	_check_alerts += 1
+
+	print(ANSI_RED_FG + "ALERT: " + message + ANSI_END_FORMAT)
+
+	if table is not None:
+		print(table)
+
+	if not is_structured():
+		return
+
+	record = {"type": "alert", "check": _current_check, "message": message}
+
+	if table is not None:
+		record["rows"] = table.get_rows()
+
+	if details is not None:
+		record.update(details)
+
+	emit(record)
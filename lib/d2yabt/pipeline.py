@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""This file contains the steps yabt takes to analyze a bundle, from working out
+its type and extracting it to running the health checks.  bin/yabt runs them on
+a single bundle and batch mode runs them on many bundles in worker processes.
+Problems with a bundle raise d2yabt.BundleError rather than exiting, so one bad
+bundle doesn't stop the others from being analyzed.
+"""
+
+
+
+import sys
+import os
+import argparse
+import datetime
+import d2yabt
+import d2yabt.util
+import d2yabt.bundlefs
+import d2yabt.cache
+import d2yabt.profile
+import d2yabt.output
+import d2yabt.registry
+
+
+
+# The bundle types whose logs are scanned and which support a time window
+DCOS_BUNDLE_TYPES = ("dcos_diag", "dcos_oneliner")
+
+
+
+def add_arguments(parser):
+	"""Add the options which control how each bundle is analyzed to an argparse
+	parser.
+	"""
+	parser.add_argument("-x", "--extract",
+							action="store_true",
+							help="only extract the bundle")
+
+	parser.add_argument("--no-extract",
+							action="store_true",
+							help="read a DC/OS diagnostic bundle zip in place instead of extracting it")
+
+	parser.add_argument("--keep-compressed",
+							action="store_true",
+							help="leave the compressed files within the bundle compressed, they are decompressed as they are read")
+
+	parser.add_argument("--no-format-json",
+							action="store_true",
+							help="do not pretty-print the JSON files within the bundle")
+
+	parser.add_argument("--json-max-mb",
+							type=float, default=100,
+							help="JSON files larger than this are not loaded into memory to be pretty-printed (default: 100)")
+
+	parser.add_argument("--large-json",
+							choices=("stream", "skip"), default="stream",
+							help="re-indent JSON files larger than --json-max-mb without sorting their keys, or skip them (default: stream)")
+
+	parser.add_argument("--no-cache",
+							action="store_true",
+							help="do not use or update the results cache kept next to the bundle directory")
+
+	parser.add_argument("--checks",
+							type=lambda x: x.split(","),
+							help="comma separated list of the only checks to run")
+
+	parser.add_argument("--skip-checks",
+							type=lambda x: x.split(","),
+							help="comma separated list of checks not to run")
+
+	parser.add_argument("--since",
+							help="only report events from this time on, either a date and time such as \"2019-08-01 10:30\" or a duration such as 2h before the bundle was taken (or before --until)")
+
+	parser.add_argument("--until",
+							help="only report events up to this time, either a date and time or a duration before the bundle was taken")
+
+	parser.add_argument("--timeline",
+							action="store_true",
+							help="instead of running the checks, list the leader changes and unreachable agents of every node in time order")
+
+
+
+def get_default_options():
+	"""Returns the options of add_arguments() with their default values.
+	"""
+	parser = argparse.ArgumentParser(add_help=False)
+
+	add_arguments(parser)
+
+	return parser.parse_args(list())
+
+
+
+def get_option_errors(options):
+	"""Returns a list of what is wrong with the check names and times in the
+	options, so they can be caught before any bundle is touched.
+	"""
+	option_errors = list()
+
+	for each_name in d2yabt.registry.get_unknown_checks((options.checks or list()) + (options.skip_checks or list())):
+		option_errors.append("Unknown check: " + each_name + ".  Use --list-checks to see the available checks")
+
+	for time_arg in (options.since, options.until):
+		if not time_arg:
+			continue
+
+		try:
+			d2yabt.util.parse_time_arg(time_arg)
+
+		except ValueError as error:
+			option_errors.append(str(error))
+
+	return option_errors
+
+
+
+def check_options(options):
+	"""Exit with an error if the check names or times in the options are wrong.
+	"""
+	option_errors = get_option_errors(options)
+
+	for option_error in option_errors:
+		print(option_error, file=sys.stderr)
+
+	if option_errors:
+		sys.exit(1)
+
+
+
+def open_bundle(bundle_name, options, jobs=None):
+	"""Work out the type of a bundle and extract it, unless it has been already.
+	Returns a tuple of (bundle type, bundle directory).
+		jobs: the number of worker processes to use, None for one per CPU
+	"""
+	with d2yabt.profile.phase("detect"):
+		bundle_type = d2yabt.util.get_bundle_type(bundle_name)
+		bundle_dir = d2yabt.util.get_bundle_dir(bundle_name)
+
+	d2yabt.output.bundle(bundle_name, bundle_type, d2yabt.__version__)
+
+	if os.path.isdir(bundle_name):
+		pass
+
+	elif d2yabt.util.is_bundle_extracted(bundle_name):
+		print("Bundle has already been extracted, using existing directory,", bundle_dir)
+
+	elif bundle_type == "dcos_diag" and options.no_extract:
+		with d2yabt.profile.phase("open"):
+			bundle_dir = d2yabt.dcos.bundle.open_diag(bundle_name)
+
+	elif bundle_type == "dcos_diag":
+		with d2yabt.profile.phase("unzip"):
+			bundle_dir = d2yabt.dcos.bundle.extract_diag(bundle_name)
+
+		if not options.keep_compressed:
+			with d2yabt.profile.phase("decompress_gzip_files"):
+				d2yabt.util.decompress_gzip_files(bundle_dir, jobs=jobs)
+
+		if not options.no_format_json:
+			with d2yabt.profile.phase("format_json"):
+				d2yabt.util.format_json(bundle_dir, jobs=jobs, max_size=options.json_max_mb * 1024 * 1024, large_files=options.large_json)
+
+	elif bundle_type == "dcos_oneliner":
+		with d2yabt.profile.phase("untar"):
+			bundle_dir = d2yabt.dcos.bundle.extract_oneliner(bundle_name)
+
+	elif bundle_type == "service_diag":
+		with d2yabt.profile.phase("untar"):
+			bundle_dir = d2yabt.service.bundle.extract(bundle_name)
+
+	elif bundle_type == "konvoy_diag":
+		with d2yabt.profile.phase("untar"):
+			bundle_dir = d2yabt.konvoy.bundle.extract(bundle_name, jobs=jobs)
+
+	return bundle_type, bundle_dir
+
+
+
+def get_nodes(bundle_type, bundle_dir):
+	"""Returns a list of the nodes in an extracted bundle, after printing a table
+	of them.
+	"""
+	node_objs = list()
+
+	if bundle_type in DCOS_BUNDLE_TYPES:
+		with d2yabt.profile.phase("get_nodes"):
+			node_objs = d2yabt.dcos.bundle.get_nodes(bundle_dir, bundle_type)
+
+		with d2yabt.profile.phase("get_node_info"):
+			d2yabt.dcos.bundle.get_node_info(node_objs)
+
+		d2yabt.dcos.bundle.print_nodes(node_objs)
+
+	elif bundle_type == "konvoy_diag":
+		with d2yabt.profile.phase("get_nodes"):
+			node_objs = d2yabt.konvoy.bundle.get_nodes(bundle_dir)
+
+		d2yabt.konvoy.bundle.print_nodes(node_objs)
+
+	return node_objs
+
+
+
+def set_time_window(bundle_type, node_objs, since_arg, until_arg):
+	"""Limit the checks to the window of time given by --since and --until, or
+	clear any window left from a previous bundle if neither is given.
+	"""
+	if bundle_type not in DCOS_BUNDLE_TYPES:
+		return
+
+	if not since_arg and not until_arg:
+		d2yabt.dcos.check.set_time_window(None, None)
+
+		return
+
+	try:
+		since = d2yabt.util.parse_time_arg(since_arg) if since_arg else None
+		until = d2yabt.util.parse_time_arg(until_arg) if until_arg else None
+
+	except ValueError as error:
+		raise d2yabt.BundleError(str(error))
+
+	# Durations are measured back from when the bundle was taken, or for --since from --until if it was given
+	bundle_time = None
+
+	if isinstance(until, datetime.timedelta) or (isinstance(since, datetime.timedelta) and until is None):
+		bundle_time = d2yabt.dcos.check.get_bundle_time(node_objs)
+
+		if bundle_time is None:
+			raise d2yabt.BundleError("Unable to tell when the bundle was taken, use a date and time rather than a duration")
+
+		print("Bundle was taken at", bundle_time)
+
+	if isinstance(until, datetime.timedelta):
+		until = bundle_time - until
+
+	if isinstance(since, datetime.timedelta):
+		since = (until or bundle_time) - since
+
+	print("Only reporting events from", since or "the start of the logs", "to", until or "the end of the logs")
+
+	d2yabt.dcos.check.set_time_window(since, until)
+
+
+
+def skip_missing_checks(checks, node_objs):
+	"""Returns the checks which have input files in the bundle, reporting the
+	rest as skipped.
+	"""
+	checks, skipped_checks = d2yabt.registry.plan_checks(checks, node_objs)
+
+	for check in skipped_checks:
+		print("Skipping", check.name + ", none of its input files are in the bundle")
+
+		d2yabt.output.skip_check(check.name, "none of its input files are in the bundle")
+
+	return checks
+
+
+
+def run_checks(bundle_type, bundle_dir, node_objs, checks, jobs=None):
+	"""Run the checks, reading the logs they need up front.
+		jobs: the number of worker processes to scan logs with, None for one per CPU
+	"""
+	# Read the logs the checks need up front, spreading the nodes across worker processes
+	if bundle_type in DCOS_BUNDLE_TYPES:
+		d2yabt.dcos.check.LOG_SCANNER.select([x.name for x in checks])
+
+		with d2yabt.profile.phase("scan_logs"):
+			d2yabt.dcos.check.scan_logs(node_objs, jobs=jobs)
+
+	d2yabt.registry.run_checks(checks, node_objs, bundle_dir)
+
+
+
+def analyze(bundle_name, options, jobs=None):
+	"""Extract a bundle and run the health checks on it, or with --extract or
+	--timeline only do that.  Returns a tuple of (bundle type, bundle directory).
+	Raises d2yabt.BundleError if the bundle can't be analyzed.
+		options: see add_arguments() and get_default_options()
+		jobs: the number of worker processes to use, None for one per CPU
+	"""
+	bundle_type, bundle_dir = open_bundle(bundle_name, options, jobs)
+
+	# A bundle read in place is closed afterwards, so a later bundle of the same name in this process isn't read from it
+	try:
+		if options.extract:
+			return bundle_type, bundle_dir
+
+		# Work out which checks to run, exiting early if a check name is wrong
+		checks = d2yabt.registry.select_checks(bundle_type, options.checks, options.skip_checks)
+
+		# Reuse results from previous runs on this bundle
+		if options.no_cache:
+			d2yabt.cache.unload()
+
+		else:
+			d2yabt.cache.load(bundle_dir)
+
+		node_objs = get_nodes(bundle_type, bundle_dir)
+
+		checks = skip_missing_checks(checks, node_objs)
+
+		set_time_window(bundle_type, node_objs, options.since, options.until)
+
+		# Show the cluster's events in time order instead of running the checks
+		if options.timeline:
+			if bundle_type not in DCOS_BUNDLE_TYPES:
+				raise d2yabt.BundleError("The timeline is only available for DC/OS bundles")
+
+			with d2yabt.profile.phase("timeline"):
+				d2yabt.dcos.check.print_timeline(node_objs)
+
+		else:
+			run_checks(bundle_type, bundle_dir, node_objs, checks, jobs)
+
+		d2yabt.cache.save()
+
+		return bundle_type, bundle_dir
+
+	finally:
+		d2yabt.bundlefs.unmount(bundle_dir)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""This file contains the instrumentation behind --profile.  Each phase of a
+run, e.g. extracting the bundle or a single check, is wrapped in phase() which
+records its wall time, CPU time including that of worker processes, the bytes
+of bundle files it read, the log lines it scanned, and its peak memory use.
+Nothing is recorded unless enable() has been called.
+"""
+
+
+
+import os
+import sys
+import json
+import time
+import contextlib
+
+try:
+	import resource
+
+except ImportError:
+	resource = None
+
+
+
+# Linux can reset a process's peak memory use so it can be measured per phase
+CLEAR_REFS_FILE = "/proc/self/clear_refs"
+STATUS_FILE = "/proc/self/status"
+
+_enabled = False
+
+# The phases recorded so far, in the order they finished
+_phases = list()
+
+# The counters of the phase being recorded, see add_read()
+_counters = None
+
+# Each check's share of the shared log scan, see add_scan_shares()
+_scan_shares = dict()
+
+
+
+def enable():
+	"""Start recording phases.
+	"""
+	global _enabled
+
+	_enabled = True
+
+
+
+def is_enabled():
+	"""Returns True if phases are being recorded.
+	"""
+	return _enabled
+
+
+
+def add_read(bytes_read, lines_scanned=0):
+	"""Count bundle data read by the phase being recorded.  Work done in worker
+	processes must be counted by the parent once the results come back.
+	"""
+	if _counters is None:
+		return
+
+	_counters["bytes_read"] += bytes_read
+	_counters["lines_scanned"] += lines_scanned
+
+
+
+def add_scan_shares(scan_shares):
+	"""Count each check's share of the log scan.  Every log is read once for all
+	the checks searching it, within a single phase, so the cost of each log is
+	split evenly between them to show which checks make the scan slow.
+		scan_shares: a dict of check name to a list of wall seconds, CPU seconds, bytes and lines
+	"""
+	if not _enabled:
+		return
+
+	for check_name, check_share in scan_shares.items():
+		total_share = _scan_shares.setdefault(check_name, [0, 0, 0, 0])
+
+		for index, value in enumerate(check_share):
+			total_share[index] += value
+
+
+
+def get_scan_shares():
+	"""Returns a list of dicts of each check's share of the log scan, largest
+	first.
+	"""
+	scan_shares = [{
+			"check": x,
+			"wall_seconds": round(y[0], 6),
+			"cpu_seconds": round(y[1], 6),
+			"bytes_read": int(y[2]),
+			"lines_scanned": int(y[3]),
+		} for x, y in _scan_shares.items()]
+
+	return sorted(scan_shares, key=lambda x: x["wall_seconds"], reverse=True)
+
+
+
+def _get_cpu_seconds():
+	"""Returns the CPU time used by this process and its finished worker processes.
+	"""
+	times = os.times()
+
+	return times.user + times.system + times.children_user + times.children_system
+
+
+
+def reset_peak_rss():
+	"""Reset this process's peak memory use if the OS allows it, so the peak of a
+	piece of work can be read with get_peak_rss_mb().  The peak so far is kept
+	for the phase being recorded.  Returns True if it was reset.
+	"""
+	if _counters is not None:
+		_counters["peak_rss_mb"] = max(_counters["peak_rss_mb"] or 0, get_peak_rss_mb(True) or 0)
+
+	try:
+		with open(CLEAR_REFS_FILE, "w") as clear_refs_handle:
+			clear_refs_handle.write("5")
+
+		return True
+
+	except OSError:
+		return False
+
+
+
+def get_peak_rss_mb(was_reset):
+	"""Returns the peak memory use of this process in MB, since the last reset if
+	was_reset is True, otherwise since it started.  None if it is not available.
+	"""
+	if was_reset:
+		try:
+			with open(STATUS_FILE, "r") as status_handle:
+				for each_line in status_handle:
+					if each_line.startswith("VmHWM:"):
+						return int(each_line.split()[1]) / 1024
+
+		except (OSError, ValueError, IndexError):
+			pass
+
+	if resource is None:
+		return None
+
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+	# Linux reports KB, macOS bytes
+	if sys.platform == "darwin":
+		return peak_rss / 1024 / 1024
+
+	return peak_rss / 1024
+
+
+
+@contextlib.contextmanager
+def phase(name):
+	"""Record the code within a with block as the named phase.  Phases do not nest,
+	a phase started within another is folded into it.
+	"""
+	global _counters
+
+	if not _enabled or _counters is not None:
+		yield
+
+		return
+
+	was_reset = reset_peak_rss()
+
+	_counters = {"bytes_read": 0, "lines_scanned": 0, "peak_rss_mb": None}
+
+	start_cpu = _get_cpu_seconds()
+	start_time = time.perf_counter()
+
+	try:
+		yield
+
+	finally:
+		peak_rss = get_peak_rss_mb(was_reset)
+
+		# The peak may have been reset within the phase, see reset_peak_rss()
+		if peak_rss is not None and _counters["peak_rss_mb"] is not None:
+			peak_rss = max(peak_rss, _counters["peak_rss_mb"])
+
+		_phases.append({
+			"phase": name,
+			"wall_seconds": round(time.perf_counter() - start_time, 6),
+			"cpu_seconds": round(_get_cpu_seconds() - start_cpu, 6),
+			"bytes_read": _counters["bytes_read"],
+			"lines_scanned": _counters["lines_scanned"],
+			"peak_rss_mb": peak_rss,
+		})
+
+		_counters = None
+
+
+
+def get_phases():
+	"""Returns a list of dicts of the phases recorded so far.
+	"""
+	return list(_phases)
+
+
+
+def print_report():
+	"""Print a table of the recorded phases.
+	"""
+	print("Profile")
+	print("{:<40} {:>10} {:>10} {:>10} {:>12} {:>14}".format("Phase", "Wall (s)", "CPU (s)", "Read (MB)", "Lines", "Peak RSS (MB)"))
+
+	for each_phase in _phases:
+		peak_rss = "{:.1f}".format(each_phase["peak_rss_mb"]) if each_phase["peak_rss_mb"] is not None else "n/a"
+
+		print("{:<40} {:>10.3f} {:>10.3f} {:>10.2f} {:>12,} {:>14}".format(each_phase["phase"], each_phase["wall_seconds"], each_phase["cpu_seconds"], each_phase["bytes_read"] / 1024 / 1024, each_phase["lines_scanned"], peak_rss))
+
+	print("{:<40} {:>10.3f} {:>10.3f}".format("total", sum(x["wall_seconds"] for x in _phases), sum(x["cpu_seconds"] for x in _phases)))
+
+	scan_shares = get_scan_shares()
+
+	if not scan_shares:
+		return
+
+	print()
+	print("The check rows above exclude reading their logs, which every log check shares in the scan_logs phase.")
+	print("Each log's cost is split evenly between the checks which search it:")
+	print("{:<40} {:>10} {:>10} {:>10} {:>12}".format("Log scan share", "Wall (s)", "CPU (s)", "Read (MB)", "Lines"))
+
+	for scan_share in scan_shares:
+		print("{:<40} {:>10.3f} {:>10.3f} {:>10.2f} {:>12,}".format("check:" + scan_share["check"], scan_share["wall_seconds"], scan_share["cpu_seconds"], scan_share["bytes_read"] / 1024 / 1024, scan_share["lines_scanned"]))
+
+
+
+def write_report(report_file):
+	"""Write the recorded phases to a JSON file.
+	"""
+	try:
+		with open(report_file, "w", encoding="utf-8") as report_handle:
+			json.dump({"phases": _phases, "scan_shares": get_scan_shares()}, report_handle, indent=2)
+			report_handle.write("\n")
+
+	except OSError as error:
+		print("Unable to write profile report", report_file + ":", error, file=sys.stderr)
+
+
+
+def finish(report_file=None):
+	"""Print the recorded phases and write them to report_file if given.  Does
+	nothing unless enable() was called.
+	"""
+	if not _enabled:
+		return
+
+	print_report()
+
+	if report_file:
+		write_report(report_file)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""This file contains the registry of health checks.  Each check module registers
+its check functions here along with the bundle types they support, the node
+roles they look at, and the files they read.  bin/yabt then asks the registry
+which checks to run rather than calling each one by hand, which lets checks be
+selected by name and lets checks whose files are not in the bundle be skipped.
+"""
+
+
+
+import os
+import fnmatch
+import importlib
+import d2yabt
+import d2yabt.bundlefs
+import d2yabt.profile
+import d2yabt.output
+
+
+
+class Check:
+	"""This class holds a registered health check.
+	"""
+	def __init__(self, function, bundle_types, roles=None, inputs=None, pass_bundle_dir=False):
+		self.name = function.__name__
+		self.function = function
+		self.bundle_types = tuple(bundle_types)
+		self.roles = tuple(roles) if roles is not None else None
+		self.inputs = tuple(inputs) if inputs is not None else tuple()
+		self.pass_bundle_dir = pass_bundle_dir
+		self.description = (function.__doc__ or "").strip().split("\n")[0]
+
+
+	def applies_to(self, node_obj):
+		"""Returns True if the check looks at the given node.
+		"""
+		return self.roles is None or node_obj.type in self.roles
+
+
+	def run(self, node_objs, bundle_dir):
+		"""Run the check.
+		"""
+		if self.pass_bundle_dir:
+			self.function(node_objs, bundle_dir)
+
+		else:
+			self.function(node_objs)
+
+
+
+# Every registered check, in the order they are run
+_checks = list()
+
+# The package whose check module registers the checks for each bundle type, see load_checks()
+CHECK_PACKAGES = {
+	"dcos_diag": "d2yabt.dcos",
+	"dcos_oneliner": "d2yabt.dcos",
+	"service_diag": "d2yabt.service",
+	"konvoy_diag": "d2yabt.konvoy",
+}
+
+
+
+def register(function, bundle_types, roles=None, inputs=None, pass_bundle_dir=False):
+	"""Register a check function.  Checks are run in the order they are registered.
+		bundle_types: the bundle types the check supports, e.g. ("dcos_diag", "dcos_oneliner")
+		roles: the node types the check looks at, None for every node
+		inputs: globs relative to a node's directory of the files the check reads
+		pass_bundle_dir: call the check with the bundle directory as well as the nodes
+	"""
+	_checks.append(Check(function, bundle_types, roles, inputs, pass_bundle_dir))
+
+	return function
+
+
+
+def load_checks(bundle_type=None):
+	"""Import the checks for a bundle type, or for every bundle type if
+	bundle_type is None.  Checks register themselves when their module is
+	imported, and each module is only imported once.
+	"""
+	for each_type, package_name in CHECK_PACKAGES.items():
+		if bundle_type is None or bundle_type == each_type:
+			importlib.import_module(package_name)
+
+
+
+def get_checks(bundle_type=None):
+	"""Returns the registered checks which support a bundle type, or every check
+	if bundle_type is None.
+	"""
+	load_checks(bundle_type)
+
+	return [x for x in _checks if bundle_type is None or bundle_type in x.bundle_types]
+
+
+
+def get_unknown_checks(names):
+	"""Returns the names in a list which are not registered checks.
+	"""
+	# Unknown names are only known to be unknown once every check is loaded
+	if names:
+		load_checks()
+
+	known_names = set(x.name for x in _checks)
+
+	return [x for x in names if x not in known_names]
+
+
+
+def select_checks(bundle_type, only=None, skip=None):
+	"""Returns the checks to run on a bundle.  Raises d2yabt.BundleError if a
+	check name is unknown.
+		only: a list of check names, run just these
+		skip: a list of check names, run everything but these
+	"""
+	unknown_names = get_unknown_checks((only or list()) + (skip or list()))
+
+	if unknown_names:
+		raise d2yabt.BundleError("Unknown check: " + ", ".join(unknown_names) + ".  Use --list-checks to see the available checks")
+
+	checks = get_checks(bundle_type)
+
+	if only:
+		checks = [x for x in checks if x.name in only]
+
+	if skip:
+		checks = [x for x in checks if x.name not in skip]
+
+	return checks
+
+
+
+def _has_input(node_obj, input_glob, dir_listings):
+	"""Returns True if a node has a file matching one of a check's inputs.
+		dir_listings: directory listings already read, shared between checks so each directory is only listed once
+	"""
+	input_dir, input_base = os.path.split(input_glob)
+	dir_path = os.path.join(node_obj.dir, input_dir)
+
+	if dir_path not in dir_listings:
+		if d2yabt.bundlefs.isdir(dir_path):
+			dir_listings[dir_path] = d2yabt.bundlefs.listdir(dir_path)
+
+		else:
+			dir_listings[dir_path] = list()
+
+	for each_name in dir_listings[dir_path]:
+		if fnmatch.fnmatchcase(each_name, input_base):
+			return True
+
+	return False
+
+
+
+def plan_checks(checks, node_objs):
+	"""Returns the checks which have at least one of their input files on at
+	least one of the nodes they look at, and the checks which do not.
+	"""
+	dir_listings = dict()
+	runnable_checks = list()
+	skipped_checks = list()
+
+	for check in checks:
+		if not check.inputs:
+			runnable_checks.append(check)
+
+			continue
+
+		found_input = False
+
+		for node_obj in node_objs:
+			if not check.applies_to(node_obj):
+				continue
+
+			if any(_has_input(node_obj, x, dir_listings) for x in check.inputs):
+				found_input = True
+
+				break
+
+		if found_input:
+			runnable_checks.append(check)
+
+		else:
+			skipped_checks.append(check)
+
+	return runnable_checks, skipped_checks
+
+
+
+def run_checks(checks, node_objs, bundle_dir):
+	"""Run each check in turn, each as its own phase when profiling.
+	"""
+	for check in checks:
+		d2yabt.output.start_check(check.name)
+
+		with d2yabt.profile.phase("check:" + check.name):
+			check.run(node_objs, bundle_dir)
+
+		d2yabt.output.end_check()
+
+
+
+def print_checks():
+	"""Prints the registered checks and the bundle types they support.
+	"""
+	load_checks()
+
+	for check in _checks:
+		print(check.name.ljust(34), ", ".join(check.bundle_types).ljust(27), check.description)
@@ -0,0 +1,778 @@
+#!/usr/bin/env python3
+"""This file contains the log scan engine used by the health checks.  Checks
+register the line patterns they are interested in against a log file and the
+engine reads each log file only once, handing every matching line to each
+check which asked for it.
+"""
+
+
+
+import os
+import io
+import re
+import json
+import time
+import datetime
+import mmap
+import hashlib
+import concurrent.futures
+import d2yabt.util
+import d2yabt.bundlefs
+import d2yabt.cache
+import d2yabt.metrics
+import d2yabt.profile
+
+try:
+	import re._parser as sre_parse
+	import re._constants as sre_constants
+
+except ImportError:
+	import sre_parse
+	import sre_constants
+
+
+
+# Literals shorter than this rule out too few lines to be worth checking for
+MIN_LITERAL_LENGTH = 3
+
+# Lines of time-ordered logs such as the systemd journal start with this
+JOURNAL_TIMESTAMP_BYTES_REGEX = re.compile(rb"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+# Lines of dmesg -T start with this, e.g. [Thu Aug  1 00:00:01 2019]
+DMESG_TIMESTAMP_BYTES_REGEX = re.compile(rb"\[(\w{3} \w{3} +\d+ \d{2}:\d{2}:\d{2} \d{4})\]")
+
+# Both kinds of timestamp are found within this many bytes of the start of a line
+TIMESTAMP_BYTES = 64
+
+# Timestamps are compared as text in this format, which sorts the same as the times do
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Newlines are counted in blocks of this many bytes of a mapped log, see _count_lines()
+COUNT_LINES_BYTES = 16777216
+
+# When seeking to the start of a time window, stop bisecting and read forward once this close
+SEEK_SCAN_BYTES = 65536
+
+# How a pattern's matches can be summarized instead of kept line by line, see
+# LogScanner.register().  Each maps to the arguments of a d2yabt.metrics.Tally
+AGGREGATES = {
+	"count": dict(),
+	"top": {"top_k": 5},
+	"values": {"count_values": True},
+}
+
+REPEAT_OPS = tuple(getattr(sre_constants, x) for x in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT") if hasattr(sre_constants, x))
+
+
+
+def _literal_runs(parsed_pattern):
+	"""Returns the runs of literal text which every match of a parsed regex contains.
+	"""
+	runs = list()
+	current_run = list()
+
+	for op, av in parsed_pattern:
+		if op == sre_constants.LITERAL:
+			current_run.append(chr(av))
+
+			continue
+
+		if current_run:
+			runs.append("".join(current_run))
+			current_run = list()
+
+		# A group always has to match, unless it changes case sensitivity
+		if op == sre_constants.SUBPATTERN and not av[1] & re.IGNORECASE:
+			runs.extend(_literal_runs(av[-1]))
+
+		# As does the content of a repeat which must happen at least once
+		elif op in REPEAT_OPS and av[0] >= 1:
+			runs.extend(_literal_runs(av[2]))
+
+	if current_run:
+		runs.append("".join(current_run))
+
+	return runs
+
+
+
+def required_literal(regex):
+	"""Returns the longest piece of plain text every match of a compiled regex
+	must contain, or None if it has none worth searching for.  A line which does
+	not contain the text can be skipped without running the regex.
+	"""
+	if regex.flags & re.IGNORECASE:
+		return None
+
+	runs = _literal_runs(sre_parse.parse(regex.pattern, regex.flags))
+
+	if not runs:
+		return None
+
+	longest_run = max(runs, key=len)
+
+	if len(longest_run) < MIN_LITERAL_LENGTH:
+		return None
+
+	return longest_run
+
+
+
+def compile_gate(patterns):
+	"""Returns a bytes regex which matches any line containing the required
+	literal of one of the patterns, or None if a pattern has no literal and so
+	every line has to be tried.
+	"""
+	literals = set(x.literal for x in patterns)
+
+	if None in literals or not literals:
+		return None
+
+	# Longest first so a literal which contains another is still found
+	return re.compile(b"|".join(re.escape(x.encode("utf-8")) for x in sorted(literals, key=len, reverse=True)))
+
+
+
+class LogPattern:
+	"""This class holds a line pattern registered by a check.
+	"""
+	def __init__(self, name, log_glob, pattern, node_filter=None, first_only=False, single=True, timestamped=True, aggregate=None):
+		if aggregate is not None and aggregate not in AGGREGATES:
+			raise ValueError("Unknown log pattern aggregate: " + str(aggregate))
+
+		self.name = name
+		self.log_glob = log_glob
+		self.regex = re.compile(pattern)
+		self.literal = required_literal(self.regex)
+		self.node_filter = node_filter
+		self.first_only = first_only
+		self.single = single
+		self.timestamped = timestamped
+		self.aggregate = aggregate
+
+
+	def new_matches(self):
+		"""Returns an empty container for this pattern's matches, a list of the
+		groups of each matching line or a Tally summarizing them.
+		"""
+		if self.aggregate is None:
+			return list()
+
+		return d2yabt.metrics.Tally(**AGGREGATES[self.aggregate])
+
+
+	def applies_to(self, node_obj):
+		"""Returns True if this pattern should be searched for on the given node.
+		"""
+		if self.node_filter is None:
+			return True
+
+		return self.node_filter(node_obj)
+
+
+
+class LogScanner:
+	"""This class streams each node log once and hands matching lines to every
+	pattern registered against that log.
+	"""
+	def __init__(self):
+		self._patterns = list()
+		self._selected = None
+		self._window = None
+
+
+	def register(self, name, log_glob, pattern, node_filter=None, first_only=False, single=True, timestamped=True, aggregate=None):
+		"""Register a line pattern against the logs matching log_glob.  The pattern
+		is only tried on lines containing its required literal, see required_literal().
+			name: the key the matches are stored under in Node.log_matches
+			node_filter: a function which is given a node object and returns True if the pattern applies to it
+			first_only: stop searching for the pattern after its first match
+			single: the glob must match exactly one log, otherwise the log is recorded as missing
+			timestamped: the log's lines have timestamps, so the time window applies to it, see set_window()
+			aggregate: summarize the matches in a d2yabt.metrics.Tally rather than keeping every line,
+				"count" just counts them, "top" also keeps the 5 largest values of the first group and
+				"values" also counts each value of the first group
+		"""
+		self._patterns.append(LogPattern(name, log_glob, pattern, node_filter, first_only, single, timestamped, aggregate))
+
+
+	def select(self, names):
+		"""Only search for the patterns with the given names, or every pattern if
+		names is None.  Used to skip the logs of checks which are not being run.
+		"""
+		self._selected = set(names) if names is not None else None
+
+
+	def set_window(self, since, until):
+		"""Only search the lines of timestamped logs between two datetimes, either
+		of which may be None.
+		"""
+		if since is None and until is None:
+			self._window = None
+
+		else:
+			self._window = (since.strftime(TIMESTAMP_FORMAT) if since else None, until.strftime(TIMESTAMP_FORMAT) if until else None)
+
+
+	def globs(self, name):
+		"""Returns the log globs the patterns with the given name are registered against.
+		"""
+		return [x.log_glob for x in self._patterns if x.name == name]
+
+
+	def _get_patterns(self, node_obj, names=None):
+		"""Returns the selected patterns which apply to a node, or the named ones
+		if names is given.
+		"""
+		selected = self._selected if names is None else set(names)
+
+		return [x for x in self._patterns if (selected is None or x.name in selected) and x.applies_to(node_obj)]
+
+
+	def plan(self, node_obj, names=None):
+		"""Work out which logs need to be read on a node and which patterns apply to each.
+			Returns a dict of log path to pattern list and a dict of pattern name to
+			the number of logs found for patterns whose log is missing.
+			names: plan for these patterns rather than the selected ones
+		"""
+		log_patterns = dict()
+		log_missing = dict()
+		glob_results = dict()
+
+		for log_pattern in self._get_patterns(node_obj, names):
+			if log_pattern.log_glob not in glob_results:
+				glob_results[log_pattern.log_glob] = sorted(d2yabt.bundlefs.glob(os.path.join(node_obj.dir, log_pattern.log_glob)))
+
+			log_list = glob_results[log_pattern.log_glob]
+
+			if log_pattern.single and not len(log_list) == 1:
+				log_missing[log_pattern.name] = len(log_list)
+
+				continue
+
+			for log in log_list:
+				log_patterns.setdefault(log, list()).append(log_pattern)
+
+		return log_patterns, log_missing
+
+
+	def signature(self, patterns):
+		"""Returns a string which changes whenever the given patterns or the version
+		of yabt change, used to tell if cached scan results are stale.
+		"""
+		pattern_specs = [(x.name, x.log_glob, x.regex.pattern, x.first_only, x.single, x.aggregate) for x in patterns]
+
+		return d2yabt.__version__ + "-" + hashlib.sha1(repr(pattern_specs).encode("utf-8")).hexdigest()
+
+
+	def _prepare(self, node_obj):
+		"""Returns the cache key, files, and version of a node's scan results along
+		with its scan plan, see plan().
+		"""
+		log_patterns, log_missing = self.plan(node_obj)
+
+		node_patterns = self._get_patterns(node_obj)
+
+		version = self.signature(node_patterns) + "-" + json.dumps(log_missing, sort_keys=True) + "-" + json.dumps(self._window)
+
+		return "scan:" + node_obj.dir, sorted(log_patterns), version, log_patterns, log_missing, node_patterns
+
+
+	def scan(self, node_obj):
+		"""Scan the logs of a node for every registered pattern which applies to it.
+			The groups of each matching line are stored in node_obj.log_matches under
+			the pattern's name.  Results are reused from the bundle cache when none
+			of the node's logs have changed.
+		"""
+		self.scan_nodes([node_obj])
+
+
+	def iter_log_matches(self, node_obj, names):
+		"""Returns a generator for each of a node's logs which the named patterns are
+		registered against, see iter_matches().  Logs are only opened once their
+		generator is first used.
+		"""
+		log_patterns, _log_missing = self.plan(node_obj, names)
+
+		log_streams = list()
+
+		for log, patterns in sorted(log_patterns.items()):
+			window = self._window if all(x.timestamped for x in patterns) else None
+
+			log_streams.append(iter_matches(log, patterns, window))
+
+		return log_streams
+
+
+	def scan_nodes(self, node_objs, jobs=1):
+		"""Same as scan() for a list of nodes.  The nodes which are not in the
+			bundle cache are scanned by a pool of worker processes.
+			jobs: the number of nodes to scan at once, None for one per CPU
+		"""
+		pending = list()
+
+		for node_obj in node_objs:
+			cache_key, log_files, version, log_patterns, log_missing, node_patterns = self._prepare(node_obj)
+
+			found, log_matches_json = d2yabt.cache.lookup(cache_key, log_files, version)
+
+			if found:
+				_set_node_matches(node_obj, _matches_from_json(log_matches_json), log_missing)
+
+			else:
+				pending.append((node_obj, cache_key, log_files, version, log_patterns, log_missing, node_patterns))
+
+		jobs = d2yabt.util.worker_count(jobs)
+
+		scan_args = ([x[4] for x in pending], [x[6] for x in pending], [self._window] * len(pending), [d2yabt.profile.is_enabled()] * len(pending))
+
+		if jobs == 1 or len(pending) < 2:
+			results = list(map(_scan_logs, *scan_args))
+
+		else:
+			with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=d2yabt.bundlefs.set_mounts, initargs=(d2yabt.bundlefs.get_mounts(),)) as executor:
+				results = list(executor.map(_scan_logs, *scan_args))
+
+		# Results come back in the order the nodes were given, so output matches a serial scan
+		for (node_obj, cache_key, log_files, version, _log_patterns, log_missing, _node_patterns), (log_matches, bytes_scanned, lines_scanned, scan_shares) in zip(pending, results):
+			d2yabt.profile.add_read(bytes_scanned, lines_scanned)
+			d2yabt.profile.add_scan_shares(scan_shares)
+
+			d2yabt.cache.store(cache_key, log_files, version, _matches_to_json(log_matches))
+
+			_set_node_matches(node_obj, log_matches, log_missing)
+
+
+
+def _matches_to_json(log_matches):
+	"""Returns scan results as JSON serializable data for the bundle cache.
+	"""
+	return dict((name, matches.to_json() if isinstance(matches, d2yabt.metrics.Tally) else matches) for name, matches in log_matches.items())
+
+
+
+def _matches_from_json(log_matches_json):
+	"""Returns scan results from the data given by _matches_to_json().
+	"""
+	log_matches = dict()
+
+	for name, matches in log_matches_json.items():
+		if isinstance(matches, dict):
+			log_matches[name] = d2yabt.metrics.Tally.from_json(matches)
+
+		else:
+			# Groups come back from JSON as lists
+			log_matches[name] = [tuple(x) for x in matches]
+
+	return log_matches
+
+
+
+def _set_node_matches(node_obj, log_matches, log_missing):
+	"""Store scan results on a node.
+	"""
+	node_obj.log_matches = log_matches
+	node_obj.log_missing = log_missing
+
+
+
+def _scan_logs(log_patterns, node_patterns, window=None, count_lines=False):
+	"""Scan each log for its patterns.  Runs in a worker process when scanning in parallel.
+		log_patterns: a dict of log path to the patterns searched for in it
+		node_patterns: every pattern which applies to the node
+		window: a tuple of the since and until timestamp text, see LogScanner.set_window()
+		count_lines: count the lines of memory mapped logs too, see _scan_log()
+	Returns a dict of pattern name to the groups of each matching line, or to a
+	Tally of them for patterns with an aggregate, along with the number of bytes
+	and lines scanned and, when count_lines is set, each pattern's share of the
+	work, see d2yabt.profile.add_scan_shares().
+	"""
+	log_matches = dict((x.name, x.new_matches()) for x in node_patterns)
+	bytes_scanned = 0
+	lines_scanned = 0
+	scan_shares = dict()
+
+	for log, patterns in log_patterns.items():
+		start_time = time.perf_counter()
+		start_cpu = time.process_time()
+
+		if window is not None and all(x.timestamped for x in patterns):
+			log_bytes, log_lines = _scan_log(log, patterns, log_matches, window, count_lines)
+
+		else:
+			log_bytes, log_lines = _scan_log(log, patterns, log_matches, count_lines=count_lines)
+
+		bytes_scanned += log_bytes
+		lines_scanned += log_lines
+
+		# A log is read once for all its patterns, so its cost is split evenly between them
+		if count_lines:
+			log_cost = (time.perf_counter() - start_time, time.process_time() - start_cpu, log_bytes, log_lines)
+			pattern_names = set(x.name for x in patterns)
+
+			for pattern_name in pattern_names:
+				pattern_share = scan_shares.setdefault(pattern_name, [0, 0, 0, 0])
+
+				for index, value in enumerate(log_cost):
+					pattern_share[index] += value / len(pattern_names)
+
+	return log_matches, bytes_scanned, lines_scanned, scan_shares
+
+
+
+def line_timestamp(line):
+	"""Returns the timestamp text of a journal or dmesg -T line (as bytes), in
+	TIMESTAMP_FORMAT, and whether the log is one whose lines are in time order.
+	Returns None if the line has no timestamp.
+	"""
+	journal_match = JOURNAL_TIMESTAMP_BYTES_REGEX.match(line)
+
+	if journal_match is not None:
+		return journal_match.group(0).decode("ascii"), True
+
+	if line.startswith(b"["):
+		dmesg_match = DMESG_TIMESTAMP_BYTES_REGEX.match(line)
+
+		if dmesg_match is not None:
+			try:
+				return datetime.datetime.strptime(dmesg_match.group(1).decode("ascii"), "%a %b %d %H:%M:%S %Y").strftime(TIMESTAMP_FORMAT), False
+
+			except ValueError:
+				pass
+
+	return None, False
+
+
+
+def _in_window(line_time, since, until):
+	"""Returns True if the timestamp text of a line is between since and until.
+	"""
+	if line_time is None:
+		return False
+
+	if since is not None and line_time < since:
+		return False
+
+	if until is not None and line_time > until:
+		return False
+
+	return True
+
+
+
+def _lines_in_window(log_handle, since, until):
+	"""Yields the lines of a binary log handle between the since and until
+	timestamp text.  Lines without a timestamp belong to the last timestamp seen,
+	and reading stops at the first line past until in a time-ordered log.
+	"""
+	line_time = None
+
+	for each_line in log_handle:
+		timestamp, ordered = line_timestamp(each_line)
+
+		if timestamp is not None:
+			line_time = timestamp
+
+			if ordered and until is not None and line_time > until:
+				return
+
+		if _in_window(line_time, since, until):
+			yield each_line
+
+
+
+def _seek_to_time(log_handle, since):
+	"""Move a binary handle (or mmap) of a time-ordered log to just before its
+	first line at or after the since timestamp text, by bisecting on byte offset.
+	"""
+	log_handle.seek(0, io.SEEK_END)
+
+	low = 0
+	high = log_handle.tell()
+
+	while high - low > SEEK_SCAN_BYTES:
+		middle = (low + high) // 2
+
+		# Skip the partial line we landed in and find the next timestamp
+		log_handle.seek(middle)
+		log_handle.readline()
+
+		middle_time = None
+
+		for each_line in iter(log_handle.readline, b""):
+			timestamp_match = JOURNAL_TIMESTAMP_BYTES_REGEX.match(each_line)
+
+			if timestamp_match is not None:
+				middle_time = timestamp_match.group(0).decode("ascii")
+
+				break
+
+		if middle_time is None or middle_time >= since:
+			high = middle
+
+		else:
+			low = middle
+
+	log_handle.seek(low)
+
+	if low > 0:
+		log_handle.readline()
+
+
+
+def _open_log(log, window=None):
+	"""Open a log for reading as bytes.  If the log is a plain file in time order,
+	it is positioned near the start of the time window rather than at the beginning.
+	"""
+	log_handle = d2yabt.bundlefs.open(log, "rb")
+
+	if window is None or window[0] is None or not d2yabt.bundlefs.is_plain_file(log):
+		return log_handle
+
+	if JOURNAL_TIMESTAMP_BYTES_REGEX.match(log_handle.readline()) is not None:
+		_seek_to_time(log_handle, window[0])
+
+	else:
+		log_handle.seek(0)
+
+	return log_handle
+
+
+
+def _get_offset(log_handle):
+	"""Returns the position of a log handle in its decompressed data, or 0 if it
+	can't tell.
+	"""
+	try:
+		return log_handle.tell()
+
+	except (OSError, ValueError):
+		return 0
+
+
+
+def last_timestamp(log):
+	"""Returns the timestamp text of the last journal line in a log, or None.
+	Only the end of a plain file is read.
+	"""
+	if d2yabt.bundlefs.is_plain_file(log):
+		with d2yabt.bundlefs.open(log, "rb") as log_handle:
+			log_handle.seek(0, io.SEEK_END)
+			log_handle.seek(max(log_handle.tell() - 1048576, 0))
+
+			for each_line in reversed(log_handle.read().split(b"\n")):
+				timestamp_match = JOURNAL_TIMESTAMP_BYTES_REGEX.match(each_line)
+
+				if timestamp_match is not None:
+					return timestamp_match.group(0).decode("ascii")
+
+	last_time = None
+
+	with d2yabt.bundlefs.open(log, "rb") as log_handle:
+		for each_line in log_handle:
+			timestamp_match = JOURNAL_TIMESTAMP_BYTES_REGEX.match(each_line)
+
+			if timestamp_match is not None:
+				last_time = timestamp_match.group(0).decode("ascii")
+
+	return last_time
+
+
+
+def _match_line(each_line, active_patterns, log_matches):
+	"""Search a decoded line for each of the active patterns.  Returns the
+	first_only patterns which matched and so are finished with.
+	"""
+	finished_patterns = list()
+
+	for log_pattern in active_patterns:
+		if log_pattern.literal is not None and log_pattern.literal not in each_line:
+			continue
+
+		match = log_pattern.regex.search(each_line)
+
+		if match is None:
+			continue
+
+		log_matches[log_pattern.name].append(match.groups())
+
+		if log_pattern.first_only:
+			finished_patterns.append(log_pattern)
+
+	return finished_patterns
+
+
+
+def iter_matches(log, patterns, window=None):
+	"""Yields a tuple of (pattern, groups) for each line of a log matching one of
+	the patterns, in the order the lines are in the log.  Only one line is held in
+	memory at a time.
+		window: a tuple of the since and until timestamp text, only lines between them are searched
+	"""
+	gate = compile_gate(patterns)
+
+	with _open_log(log, window) as log_handle:
+		log_lines = log_handle if window is None else _lines_in_window(log_handle, *window)
+
+		for each_line in log_lines:
+			if gate is not None and gate.search(each_line) is None:
+				continue
+
+			each_line = each_line.rstrip(b"\n").decode("utf-8", "replace")
+
+			for log_pattern in patterns:
+				if log_pattern.literal is not None and log_pattern.literal not in each_line:
+					continue
+
+				match = log_pattern.regex.search(each_line)
+
+				if match is not None:
+					yield log_pattern, match.groups()
+
+
+
+def _mapped_line_time(log_map, line_start):
+	"""Returns the timestamp text of the line of a mapped log starting at
+	line_start, or of the closest line before it with a timestamp.
+	"""
+	while True:
+		timestamp, _ordered = line_timestamp(log_map[line_start:line_start + TIMESTAMP_BYTES])
+
+		if timestamp is not None or line_start == 0:
+			return timestamp
+
+		line_start = log_map.rfind(b"\n", 0, line_start - 1) + 1
+
+
+
+def _count_lines(log_map, start, end):
+	"""Returns the number of lines between two offsets of a mapped log.
+	"""
+	line_count = 0
+
+	for block_start in range(start, end, COUNT_LINES_BYTES):
+		line_count += log_map[block_start:min(block_start + COUNT_LINES_BYTES, end)].count(b"\n")
+
+	# A last line without a newline
+	if end > start and log_map[end - 1:end] != b"\n":
+		line_count += 1
+
+	return line_count
+
+
+
+def _scan_mapped_log(log, patterns, log_matches, window=None, count_lines=False):
+	"""Search a plain log file by memory mapping it and finding each pattern's
+	required literal in the whole buffer, which is much faster than searching it
+	line by line.  Only the lines containing a literal are decoded and searched,
+	the rest of the file is never turned into Python strings.  Returns the number
+	of bytes and lines scanned, lines are only counted if count_lines is True.
+	"""
+	active_patterns = list(patterns)
+
+	with open(log, "rb") as log_handle, mmap.mmap(log_handle.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+		position = 0
+		ordered = JOURNAL_TIMESTAMP_BYTES_REGEX.match(log_map, 0) is not None
+
+		if window is not None and window[0] is not None and ordered:
+			_seek_to_time(log_map, window[0])
+
+			position = log_map.tell()
+
+		scan_start = position
+		scan_end = len(log_map)
+
+		# The next offset of each literal, -1 once there are no more
+		next_hits = dict((x, log_map.find(x, position)) for x in set(y.literal.encode("utf-8") for y in active_patterns))
+
+		while True:
+			hits = [(offset, literal) for literal, offset in next_hits.items() if offset != -1]
+
+			if not hits:
+				break
+
+			hit_offset, hit_literal = min(hits)
+
+			line_start = log_map.rfind(b"\n", 0, hit_offset) + 1
+			line_end = log_map.find(b"\n", hit_offset + len(hit_literal))
+
+			if line_end == -1:
+				line_end = len(log_map)
+
+			position = line_end + 1
+
+			# Move on the literals which were also found on this line
+			for literal, offset in next_hits.items():
+				if offset != -1 and offset < position:
+					next_hits[literal] = log_map.find(literal, position)
+
+			if window is not None:
+				line_time = _mapped_line_time(log_map, line_start)
+
+				# The rest of a time-ordered log is past the window
+				if ordered and line_time is not None and window[1] is not None and line_time > window[1]:
+					scan_end = line_start
+
+					break
+
+				if not _in_window(line_time, *window):
+					continue
+
+			finished_patterns = _match_line(log_map[line_start:line_end].decode("utf-8", "replace"), active_patterns, log_matches)
+
+			if finished_patterns:
+				active_patterns = [x for x in active_patterns if x not in finished_patterns]
+
+				# Every pattern has what it needs, stop reading
+				if not active_patterns:
+					scan_end = min(position, len(log_map))
+
+					break
+
+				active_literals = set(x.literal.encode("utf-8") for x in active_patterns)
+
+				next_hits = dict((x, y) for x, y in next_hits.items() if x in active_literals)
+
+		return scan_end - scan_start, _count_lines(log_map, scan_start, scan_end) if count_lines else 0
+
+
+
+def _scan_log(log, patterns, log_matches, window=None, count_lines=False):
+	"""Read a single log, searching each line for the given patterns.  A single
+	search for all of the patterns' required literals rules out most lines, and
+	each pattern's regex is only run on the lines containing its literal.  Lines
+	are read as bytes and only the ones which get past the literal search are
+	decoded, replacing any bytes which are not valid UTF-8.
+		window: a tuple of the since and until timestamp text, only lines between them are searched
+		count_lines: count the lines of memory mapped logs, which are otherwise never split into lines
+	Returns the number of bytes and lines scanned.
+	"""
+	# Plain files are memory mapped and searched without splitting them into lines
+	if compile_gate(patterns) is not None and d2yabt.bundlefs.is_plain_file(log) and os.path.getsize(log) > 0:
+		return _scan_mapped_log(log, patterns, log_matches, window, count_lines)
+
+	active_patterns = list(patterns)
+	gate = compile_gate(active_patterns)
+	line_count = 0
+
+	with _open_log(log, window) as log_handle:
+		start_offset = _get_offset(log_handle)
+
+		log_lines = log_handle if window is None else _lines_in_window(log_handle, *window)
+
+		for line_count, each_line in enumerate(log_lines, 1):
+			if gate is not None and gate.search(each_line) is None:
+				continue
+
+			finished_patterns = _match_line(each_line.rstrip(b"\n").decode("utf-8", "replace"), active_patterns, log_matches)
+
+			if finished_patterns:
+				active_patterns = [x for x in active_patterns if x not in finished_patterns]
+
+				# Every pattern has what it needs, stop reading
+				if not active_patterns:
+					break
+
+				gate = compile_gate(active_patterns)
+
+		return _get_offset(log_handle) - start_offset, line_count
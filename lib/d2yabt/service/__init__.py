@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+"""This file loads the functions and health checks used on a service bundle.
+"""
+
+
+
+import d2yabt.service.bundle
+import d2yabt.service.check
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""This file contains the small table used to print nodes and the findings of
+checks.  It lays out its columns the way pandas prints a DataFrame, numbered
+from 1, so the output reads the same without having to load pandas, which
+takes most of a second to import.
+"""
+
+
+
+import datetime
+
+
+
+# Longer values are cut short and end in "..."
+MAX_COLWIDTH = 200
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+
+def _format_value(value):
+	"""Returns a value as text, with lists and tuples printed without quotes
+	around their items.
+	"""
+	if isinstance(value, list):
+		return "[" + ", ".join(_format_value(x) for x in value) + "]"
+
+	if isinstance(value, tuple):
+		if len(value) == 1:
+			return "(" + _format_value(value[0]) + ",)"
+
+		return "(" + ", ".join(_format_value(x) for x in value) + ")"
+
+	return str(value)
+
+
+
+def _get_datetime_length(values):
+	"""Returns how many characters of DATETIME_FORMAT are needed to show every
+	datetime in a column with the same precision, dropping the parts which are
+	zero in all of them.
+	"""
+	if any(x.microsecond % 1000 for x in values):
+		return 26
+
+	if any(x.microsecond for x in values):
+		return 23
+
+	if any(x.hour or x.minute or x.second for x in values):
+		return 19
+
+	return 10
+
+
+
+def _format_column(values):
+	"""Returns the values of a column as text.  Anything but a datetime gets a
+	space in front of it, as pandas leaves room for a sign.
+	"""
+	if values and all(isinstance(x, datetime.datetime) for x in values):
+		datetime_length = _get_datetime_length(values)
+
+		return [x.strftime(DATETIME_FORMAT)[:datetime_length] for x in values]
+
+	formatted_values = list()
+
+	for value in values:
+		value_text = _format_value(value)
+
+		if not isinstance(value, (int, float)) or isinstance(value, bool) or value >= 0:
+			value_text = " " + value_text
+
+		if len(value_text) > MAX_COLWIDTH:
+			value_text = value_text[:MAX_COLWIDTH - 3] + "..."
+
+		formatted_values.append(value_text)
+
+	return formatted_values
+
+
+
+class Table:
+	"""This class holds rows of values under named columns.
+		columns: a dict of column name to a list of the values in that column
+	"""
+	def __init__(self, columns):
+		self.columns = list(columns.keys())
+		self.rows = [dict(zip(self.columns, x)) for x in zip(*columns.values())]
+
+
+	def __len__(self):
+		return len(self.rows)
+
+
+	def sort(self, column, ascending=True):
+		"""Sort the rows by a column.  Rows with the same value keep their order.
+		"""
+		self.rows.sort(key=lambda x: x[column], reverse=not ascending)
+
+
+	def get_rows(self):
+		"""Returns a list of dicts, one per row.
+		"""
+		return [dict(x) for x in self.rows]
+
+
+	def __str__(self):
+		index_strings = [str(x) for x in range(1, len(self.rows) + 1)]
+		index_width = max([len(x) for x in index_strings], default=0)
+
+		lines = [[" " * index_width]] + [[x.ljust(index_width)] for x in index_strings]
+
+		for column in self.columns:
+			values = [x[column] for x in self.rows]
+			value_strings = _format_column(values)
+
+			# Like their values, the names of number columns get a space in front
+			if all(isinstance(x, (int, float)) for x in values):
+				column_string = " " + str(column)
+
+			else:
+				column_string = str(column)
+
+			column_width = max([len(x) for x in value_strings] + [len(column_string)])
+
+			lines[0].append(column_string.rjust(column_width))
+
+			for line, value_string in zip(lines[1:], value_strings):
+				line.append(value_string.rjust(column_width))
+
+		return "\n".join(" ".join(x) for x in lines)
@@ -6,18 +6,25 @@
 
 import sys
 import os
+import re
+import time
+import datetime
 import gzip
 import shutil
 import json
 import zipfile
 import tarfile
 import subprocess
+import concurrent.futures
+import d2yabt.profile
 
 
 
 def untar(tar_file, output_dir):
 	"""Untar a gzipped tar file to a given directory.
 	"""
+	d2yabt.profile.add_read(os.path.getsize(tar_file))
+
 	tarfile_obj = tarfile.open(tar_file, "r:gz")
 	tarfile_obj.extractall(output_dir)
 	tarfile_obj.close()
@@ -27,6 +34,8 @@ def untar(tar_file, output_dir):
 def unzip(zip_file, output_dir):
 	"""Unzip a file to a given directory.
 	"""
+	d2yabt.profile.add_read(os.path.getsize(zip_file))
+
 	os.mkdir(output_dir)
 
 	try:
@@ -40,8 +49,7 @@ def unzip(zip_file, output_dir):
 		zip7_command = shutil.which("7z")
 
 		if zip7_command is None:
-			print("7zip command (7z) not found.  Please install 7zip.", file=sys.stderr)
-			sys.exit(1)
+			raise d2yabt.BundleError("7zip command (7z) not found.  Please install 7zip.")
 
 		zip7_process = subprocess.Popen([zip7_command, "x", "-o" + output_dir, "-y", zip_file], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
@@ -60,40 +68,234 @@ def unzip(zip_file, output_dir):
 
 
 
-def decompress_gzip_files(start_dir):
+DURATION_REGEX = re.compile(r"^(\d+)([smhd])$")
+DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+
+def parse_time_arg(time_text):
+	"""Parse a --since or --until value.  Returns a datetime for a date and time
+	such as "2019-08-01 10:30" or a timedelta for a duration such as "2h".
+	Raises ValueError if it is neither.
+	"""
+	duration_match = DURATION_REGEX.match(time_text)
+
+	if duration_match is not None:
+		return datetime.timedelta(**{DURATION_UNITS[duration_match.group(2)]: int(duration_match.group(1))})
+
+	try:
+		return datetime.datetime.fromisoformat(time_text)
+
+	except ValueError:
+		raise ValueError("Unable to parse time " + time_text + ", use a date and time such as \"2019-08-01 10:30\" or a duration such as 2h")
+
+
+
+def worker_count(jobs):
+	"""Returns the number of worker processes to use for the given --jobs value.
+	A value of None or 0 means one worker per CPU.
+	"""
+	if not jobs:
+		return os.cpu_count() or 1
+
+	return jobs
+
+
+
+def _gunzip_file(gzipfile_with_path):
+	"""Decompress a single gzip file next to itself and remove the original.
+		Returns None on success or an error message on failure.
+	"""
+	gzipfile_with_path_no_ext = gzipfile_with_path[:-3]
+
+	try:
+		with gzip.open(gzipfile_with_path, "rb") as f_in:
+			with open(gzipfile_with_path_no_ext, "wb") as f_out:
+				shutil.copyfileobj(f_in, f_out)
+
+	except EOFError:
+		return "Failed to expand " + gzipfile_with_path + " EOF reached, incomplete file?"
+
+	except OSError:
+		return "Failed to expand " + gzipfile_with_path + ", not a gzip file?"
+
+	os.remove(gzipfile_with_path)
+
+	return None
+
+
+
+def decompress_gzip_files(start_dir, jobs=1):
 	"""Walk a directory tree and decompress all gzip files found.
+		jobs: the number of worker processes to use, None for one per CPU
 	"""
 	print("Expanding bundle files")
 
+	gzip_files = list()
+
 	for root, _dirs, files in os.walk(start_dir):
 		for each_file in files:
 			if not each_file.endswith(".gz"):
 				continue
 
-			gzipfile_with_path = os.path.join(root, each_file)
-			gzipfile_with_path_no_ext = gzipfile_with_path[:-3]
+			gzip_files.append(os.path.join(root, each_file))
 
-			try:
-				with gzip.open(gzipfile_with_path, "rb") as f_in:
-					with open(gzipfile_with_path_no_ext, "wb") as f_out:
-						shutil.copyfileobj(f_in, f_out)
+	# Start with the largest files so a single big log isn't the last one running
+	gzip_files.sort(key=os.path.getsize, reverse=True)
+
+	d2yabt.profile.add_read(sum(os.path.getsize(x) for x in gzip_files))
 
-			except EOFError:
-				print("Failed to expand", gzipfile_with_path, "EOF reached, incomplete file?")
+	jobs = worker_count(jobs)
 
-			except OSError:
-				print("Failed to expand", gzipfile_with_path + ", not a gzip file?")
+	if jobs == 1:
+		results = map(_gunzip_file, gzip_files)
+
+	else:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+			results = list(executor.map(_gunzip_file, gzip_files))
+
+	for error_message in results:
+		if error_message is not None:
+			print(error_message)
+
+
+
+JSON_TOKEN_REGEX = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\],:]|[^\s"{}\[\],:]+|\s+')
+
+
+
+def reindent_json_stream(in_handle, out_handle):
+	"""Re-indent JSON text from one file handle to another in the same layout as
+	json.dumps(indent=2) without loading the document into memory.  Keys are
+	left in their original order.  Returns False if the JSON is malformed.
+	"""
+	depth = 0
+	pending_open = None
+	pending_text = ""
+	at_eof = False
+
+	while not at_eof:
+		chunk = in_handle.read(1048576)
+
+		if not chunk:
+			at_eof = True
+
+		pending_text += chunk
+		pos = 0
+		output = list()
+
+		while pos < len(pending_text):
+			match = JSON_TOKEN_REGEX.match(pending_text, pos)
+
+			# Either an unterminated string or a token running off the end of the chunk, wait for more text
+			if match is None or (match.end() == len(pending_text) and not at_eof):
+				break
+
+			pos = match.end()
+			token = match.group(0)
+
+			if token[0].isspace():
+				continue
+
+			# Containers are only opened once we know if they are empty, as json.dumps() writes those as {} and []
+			if pending_open is not None:
+				if token in ("}", "]"):
+					output.append(pending_open + token)
+					pending_open = None
+
+					continue
+
+				depth += 1
+				output.append(pending_open + "\n" + "  " * depth)
+				pending_open = None
+
+			if token in ("{", "["):
+				pending_open = token
+
+			elif token in ("}", "]"):
+				depth -= 1
+
+				if depth < 0:
+					return False
+
+				output.append("\n" + "  " * depth + token)
+
+			elif token == ",":
+				output.append(",\n" + "  " * depth)
+
+			elif token == ":":
+				output.append(": ")
 
 			else:
-				os.remove(gzipfile_with_path)
+				output.append(token)
+
+		pending_text = pending_text[pos:]
+		out_handle.write("".join(output))
+
+	if depth != 0 or pending_open is not None or pending_text.strip():
+		return False
+
+	out_handle.write("\n")
+
+	return True
 
 
 
-def format_json(bundle_dir):
+def _format_json_file(file_with_path, max_size=None, large_files="stream"):
+	"""Format a single JSON file in place.
+		Returns None on success or an error message on failure.
+	"""
+	if max_size is not None and os.path.getsize(file_with_path) > max_size:
+		if large_files == "skip":
+			return None
+
+		temp_file = file_with_path + ".yabt-tmp"
+
+		with open(file_with_path, "r") as in_handle, open(temp_file, "w") as out_handle:
+			try:
+				reindented = reindent_json_stream(in_handle, out_handle)
+
+			except UnicodeDecodeError:
+				reindented = False
+
+		if not reindented:
+			os.remove(temp_file)
+
+			return "Failed to parse JSON: " + file_with_path
+
+		os.replace(temp_file, file_with_path)
+
+		return None
+
+	with open(file_with_path, "r+") as json_file_handle:
+		try:
+			json_data = json.load(json_file_handle)
+
+			json_file_handle.seek(0)
+			json_file_handle.write(json.dumps(json_data, indent=2, sort_keys=True))
+			json_file_handle.write("\n")
+			json_file_handle.truncate()
+
+		except (json.decoder.JSONDecodeError, UnicodeDecodeError):
+			return "Failed to parse JSON: " + file_with_path
+
+	return None
+
+
+
+def format_json(bundle_dir, jobs=1, max_size=None, large_files="stream"):
 	"""Format the JSON files into a human-readable form.
+		jobs: the number of worker processes to use, None for one per CPU
+		max_size: files larger than this many bytes are not loaded into memory
+		large_files: what to do with files larger than max_size, either "skip"
+			them or "stream" them through reindent_json_stream(), which does not sort keys
 	"""
 	print("Formatting JSON files")
 
+	start_time = time.time()
+
+	json_files = list()
+
 	for root, _dirs, files in os.walk(bundle_dir):
 		for each_file in files:
 			if not each_file.endswith(".json"):
@@ -103,63 +305,84 @@ def format_json(bundle_dir):
 			if each_file == "443-licensing_v1_audit_decrypt_1.json":
 				continue
 
-			file_with_path = os.path.join(root, each_file)
+			json_files.append(os.path.join(root, each_file))
 
-			with open(file_with_path, "r+") as json_file_handle:
-				try:
-					json_data = json.load(json_file_handle)
+	# Start with the largest files so a single big state.json isn't the last one running
+	json_files.sort(key=os.path.getsize, reverse=True)
 
-					json_file_handle.seek(0)
-					json_file_handle.write(json.dumps(json_data, indent=2, sort_keys=True))
-					json_file_handle.write("\n")
+	d2yabt.profile.add_read(sum(os.path.getsize(x) for x in json_files))
 
-				except (json.decoder.JSONDecodeError, UnicodeDecodeError):
-					print("Failed to parse JSON:", file_with_path, file=sys.stderr)
+	jobs = worker_count(jobs)
 
+	if jobs == 1:
+		results = [_format_json_file(x, max_size, large_files) for x in json_files]
 
+	else:
+		with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+			results = list(executor.map(_format_json_file, json_files, [max_size] * len(json_files), [large_files] * len(json_files)))
 
-def get_bundle_type(bundle_name):
-	"""Determine the type of bundle given and return a string of either:
-		* dcos_diag
-		* dcos_oneliner
-		* service_diag
-		* konvoy_diag
+	for error_message in results:
+		if error_message is not None:
+			print(error_message, file=sys.stderr)
+
+	print("Formatted", len(json_files), "JSON files in", round(time.time() - start_time, 2), "seconds")
+
+
+
+BUNDLE_FILE_TYPES = {
+	"dcos-mesos-master.service": "dcos_diag",
+	"dcos-mesos-master.service.gz": "dcos_diag",
+	"dcos-mesos-master.service.log": "dcos_oneliner",
+	"dcos-mesos-slave.service.log": "dcos_oneliner",
+	"dcos-mesos-slave-public.service.log": "dcos_oneliner",
+	"dcos_services.json": "service_diag",
+	"bundles": "konvoy_diag"
+}
+
+# Bundle types already detected this run, keyed by bundle path, size and mtime
+_bundle_type_cache = dict()
+
+
+
+def _get_entry_bundle_type(entry):
+	"""Returns the bundle type an archive entry name marks, or None.
 	"""
+	for each in os.path.split(entry):
+		if each in BUNDLE_FILE_TYPES:
+			return BUNDLE_FILE_TYPES[each]
+
+	return None
 
-	bundle_file_types = {
-		"dcos-mesos-master.service": "dcos_diag",
-		"dcos-mesos-master.service.gz": "dcos_diag",
-		"dcos-mesos-master.service.log": "dcos_oneliner",
-		"dcos-mesos-slave.service.log": "dcos_oneliner",
-		"dcos-mesos-slave-public.service.log": "dcos_oneliner",
-		"dcos_services.json": "service_diag",
-		"bundles": "konvoy_diag"
-	}
 
-	bundle_contents = list()
 
+def _detect_bundle_type(bundle_name):
+	"""Look through a bundle for the first file or directory which marks its type.
+		Returns the bundle type or None if no marker was found.
+	"""
 	if os.path.isdir(bundle_name):
 		for _root, dirs, files in os.walk(bundle_name):
-			for each_file in files:
-				bundle_contents.append(each_file)
-
-			for each_dir in dirs:
-				bundle_contents.append(each_dir)
+			for each_name in files + dirs:
+				if each_name in BUNDLE_FILE_TYPES:
+					return BUNDLE_FILE_TYPES[each_name]
 
 	elif bundle_name.endswith(".tgz") or bundle_name.endswith(".tar.gz"):
-		mytar = tarfile.open(bundle_name, "r:gz")
+		# Read the tarball as a stream so we only decompress up to the first marker
+		with tarfile.open(bundle_name, "r|gz") as mytar:
+			for each_member in mytar:
+				bundle_type = _get_entry_bundle_type(each_member.name)
 
-		for each_entry in mytar.getnames():
-			for each in os.path.split(each_entry):
-				bundle_contents.append(each)
+				if bundle_type is not None:
+					return bundle_type
 
 	elif bundle_name.endswith(".zip"):
 		try:
-			myzip = zipfile.ZipFile(bundle_name, "r")
+			# The names come from the zip's central directory, no members are read
+			with zipfile.ZipFile(bundle_name, "r") as myzip:
+				for each_entry in myzip.namelist():
+					bundle_type = _get_entry_bundle_type(each_entry)
 
-			for each_entry in myzip.namelist():
-				for each in os.path.split(each_entry):
-					bundle_contents.append(each)
+					if bundle_type is not None:
+						return bundle_type
 
 		except zipfile.BadZipFile:
 			print("Failed to list archive contents, corrupt zip?  Attempting to list contents with 7zip", file=sys.stderr)
@@ -167,27 +390,48 @@ def get_bundle_type(bundle_name):
 			zip7_command = shutil.which("7z")
 
 			if zip7_command is None:
-				print("7zip command (7z) not found.  Please install 7zip.", file=sys.stderr)
-				sys.exit(1)
+				raise d2yabt.BundleError("7zip command (7z) not found.  Please install 7zip.")
 
 			zip7_process = subprocess.Popen([zip7_command, "-ba", "l", bundle_name], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
 
-			for line in zip7_process.stdout:
-				line = line.decode("UTF-8").rstrip()
+			try:
+				for line in zip7_process.stdout:
+					line = line.decode("UTF-8").rstrip()
+
+					bundle_type = _get_entry_bundle_type(line.split()[-1])
 
-				each_entry = line.split()[-1]
+					if bundle_type is not None:
+						return bundle_type
 
-				for each in os.path.split(each_entry):
-					bundle_contents.append(each)
+			finally:
+				zip7_process.kill()
+				zip7_process.wait()
+
+	return None
+
+
+
+def get_bundle_type(bundle_name):
+	"""Determine the type of bundle given and return a string of either:
+		* dcos_diag
+		* dcos_oneliner
+		* service_diag
+		* konvoy_diag
+	Detection stops at the first file which marks the bundle type and the result
+	is cached, so calling this again for the same bundle is free.
+	"""
+	bundle_stat = os.stat(bundle_name)
+	cache_key = (os.path.abspath(bundle_name), bundle_stat.st_size, bundle_stat.st_mtime)
 
+	if cache_key not in _bundle_type_cache:
+		bundle_type = _detect_bundle_type(bundle_name)
 
-	for bundle_content in bundle_contents:
-		if bundle_content in bundle_file_types:
-			return bundle_file_types[bundle_content]
+		if bundle_type is None:
+			raise d2yabt.BundleError("Unable to determine bundle type")
 
+		_bundle_type_cache[cache_key] = bundle_type
 
-	print("Unable to determine bundle type", file=sys.stderr)
-	sys.exit(1)
+	return _bundle_type_cache[cache_key]
 
 
 
@@ -203,8 +447,7 @@ def get_bundle_dir(bundle_name):
 	if bundle_name.endswith(".tar.gz"):
 		return bundle_name[:-7]
 
-	print("Unable to parse bundle name", file=sys.stderr)
-	sys.exit(1)
+	raise d2yabt.BundleError("Unable to parse bundle name")
 
 
 
@@ -222,6 +465,31 @@ def is_bundle_extracted(bundle_name):
 
 
 
+def is_bundle_dir(path):
+	"""Checks if a directory is an extracted bundle rather than, e.g., a directory
+	of bundles.  Only the top of the directory is looked at, where a bundle keeps
+	the file or directory which marks its type, or for a DC/OS diagnostic bundle
+	the top of its node directories.
+		If yes: return True
+		If no: return False
+	"""
+	for each_name in os.listdir(path):
+		if each_name in BUNDLE_FILE_TYPES:
+			return True
+
+		node_dir = os.path.join(path, each_name)
+
+		if not os.path.isdir(node_dir):
+			continue
+
+		for each_node_name in os.listdir(node_dir):
+			if BUNDLE_FILE_TYPES.get(each_node_name) == "dcos_diag":
+				return True
+
+	return False
+
+
+
 def relocate_bundle(bundle_name):
 	"""Moves the bundle file to the current working directory if it isn't already there.
 		Returns the new bundle name without path.
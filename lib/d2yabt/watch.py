@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""This file contains watch mode, which polls a spool directory that bundles are
+copied or uploaded into and analyzes each one as soon as it has finished
+arriving.  A bundle file is taken to be complete once its size and mtime are
+the same on two polls in a row and it hasn't been modified for a while.  Every
+bundle analyzed is recorded in a JSON file in the spool directory, so a bundle
+is only analyzed again if it changes, even across restarts.
+"""
+
+
+
+import sys
+import os
+import json
+import time
+import tarfile
+import datetime
+import concurrent.futures
+import d2yabt
+import d2yabt.util
+import d2yabt.batch
+
+
+
+# Bump this when the layout of the record file changes
+RECORD_FORMAT = 1
+
+# The record of processed bundles, kept in the spool directory unless given
+RECORD_FILE_NAME = ".yabt-processed.json"
+
+# Seconds between polls of the spool directory
+DEFAULT_INTERVAL = 5
+
+# A bundle file must not have been modified for this many seconds before it is analyzed
+DEFAULT_SETTLE_SECONDS = 10
+
+
+
+class ProcessedRecord:
+	"""This class holds the record of the bundles in a spool directory which have
+	been analyzed, or are being analyzed, keyed by file name.
+	"""
+	def __init__(self, record_file):
+		self.record_file = record_file
+		self._bundles = dict()
+
+		try:
+			with open(record_file, "r", encoding="utf-8") as record_file_handle:
+				record_json = json.load(record_file_handle)
+
+			if record_json.get("format") == RECORD_FORMAT:
+				self._bundles = record_json["bundles"]
+
+		except FileNotFoundError:
+			pass
+
+		except (json.decoder.JSONDecodeError, UnicodeDecodeError, KeyError, AttributeError):
+			print("Ignoring unreadable record file", record_file, file=sys.stderr)
+
+
+	def get(self, file_name):
+		"""Returns the entry of a bundle, or None if it has never been started.
+		"""
+		return self._bundles.get(file_name)
+
+
+	def is_processed(self, file_name, file_stat):
+		"""Returns True if a bundle file has been analyzed, or started, since it
+		last changed.
+		"""
+		entry = self._bundles.get(file_name)
+
+		return entry is not None and entry["size"] == file_stat.st_size and entry["mtime"] == file_stat.st_mtime
+
+
+	def get_interrupted(self):
+		"""Returns the file names of the bundles which were still being analyzed
+		when the watch was last stopped.
+		"""
+		return [x for x, y in self._bundles.items() if y["status"] == "running"]
+
+
+	def update(self, file_name, **values):
+		"""Change the entry of a bundle and write the record to disk.
+		"""
+		self._bundles.setdefault(file_name, dict()).update(values)
+
+		self.save()
+
+
+	def remove(self, file_name):
+		"""Forget a bundle, so it is analyzed again, and write the record to disk.
+		"""
+		self._bundles.pop(file_name, None)
+
+		self.save()
+
+
+	def save(self):
+		"""Write the record to disk.
+		"""
+		temp_file = self.record_file + ".tmp"
+
+		try:
+			with open(temp_file, "w", encoding="utf-8") as record_file_handle:
+				json.dump({"format": RECORD_FORMAT, "bundles": self._bundles}, record_file_handle, indent=2)
+
+			os.replace(temp_file, self.record_file)
+
+		except OSError as error:
+			print("Unable to write record file", self.record_file + ":", error, file=sys.stderr)
+
+
+
+def _get_now():
+	"""Returns the current time as text for the record.
+	"""
+	return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+
+def poll(spool_dir, last_seen, settle_seconds, skip):
+	"""Look through a spool directory for bundle files which have finished
+	arriving.  Returns a tuple of (list of the paths of the bundles which are
+	ready, number of bundles still arriving).
+		last_seen: a dict of file name to (size, mtime) from the previous poll, which is updated
+		skip: a function given a file name and its os.stat() result which returns True if the file should be ignored, e.g. because it has already been analyzed
+	"""
+	ready_names = list()
+	arriving_count = 0
+	seen_names = set()
+
+	for each_name in sorted(os.listdir(spool_dir)):
+		bundle_path = os.path.join(spool_dir, each_name)
+
+		if each_name.startswith(".") or not each_name.endswith(d2yabt.batch.BUNDLE_SUFFIXES):
+			continue
+
+		try:
+			file_stat = os.stat(bundle_path)
+
+		# The file may be renamed or removed between listing and stat()
+		except FileNotFoundError:
+			continue
+
+		if not os.path.isfile(bundle_path) or skip(each_name, file_stat):
+			continue
+
+		seen_names.add(each_name)
+
+		file_signature = (file_stat.st_size, file_stat.st_mtime)
+
+		if last_seen.get(each_name) == file_signature and time.time() - file_stat.st_mtime >= settle_seconds:
+			ready_names.append(bundle_path)
+
+		else:
+			arriving_count += 1
+
+		last_seen[each_name] = file_signature
+
+	for each_name in set(last_seen) - seen_names:
+		del last_seen[each_name]
+
+	return ready_names, arriving_count
+
+
+
+def _start_bundle(bundle_path, record, executor, options, clean):
+	"""Record that a bundle is being analyzed and submit it to a worker.  Returns
+	the future of its result, or None if it isn't a bundle.
+		clean: remove the directory the bundle is extracted to once it is done
+	"""
+	file_name = os.path.basename(bundle_path)
+	file_stat = os.stat(bundle_path)
+	previous_entry = record.get(file_name)
+
+	# A bundle which has been replaced by a new one of the same name must not reuse the old directory
+	if previous_entry is not None and previous_entry.get("extracted_here"):
+		d2yabt.batch.clean_bundle(bundle_path)
+
+	entry = {
+		"size": file_stat.st_size,
+		"mtime": file_stat.st_mtime,
+		"started": _get_now(),
+	}
+
+	try:
+		entry["bundle_type"] = d2yabt.util.get_bundle_type(bundle_path)
+
+	except (d2yabt.BundleError, OSError, EOFError, tarfile.TarError) as error:
+		print("Not analyzing", file_name + ", it isn't a bundle which can be read:", error, file=sys.stderr)
+
+		record.update(file_name, **entry, status="failed", error=str(error), alerts=list(), finished=_get_now())
+
+		return None
+
+	# Only the directories of the bundles which the watch extracts are ever removed
+	entry["extracted_here"] = not d2yabt.util.is_bundle_extracted(bundle_path)
+
+	record.update(file_name, **entry, status="running", error=None, clean=clean)
+
+	print("Analyzing", file_name, "(" + entry["bundle_type"] + ")")
+
+	return executor.submit(d2yabt.batch.analyze_bundle, bundle_path, options)
+
+
+
+def _finish_bundle(bundle_path, result, record):
+	"""Report a finished bundle and record its result.
+	"""
+	file_name = os.path.basename(bundle_path)
+
+	result["bundle"] = file_name
+
+	entry = record.get(file_name)
+
+	if entry["clean"] and entry["extracted_here"]:
+		d2yabt.batch.clean_bundle(bundle_path)
+
+	d2yabt.batch.report_result(result)
+
+	record.update(file_name, status=result["status"], error=result["error"], alerts=d2yabt.batch.get_alerted_checks(result), seconds=result["seconds"], finished=_get_now())
+
+
+
+def run(spool_dir, options, jobs=None, interval=DEFAULT_INTERVAL, settle_seconds=DEFAULT_SETTLE_SECONDS, record_file=None, clean=False, once=False):
+	"""Analyze the bundles which arrive in a spool directory until interrupted.
+		jobs: the number of bundles to analyze at once, None for one per CPU
+		interval: seconds between polls
+		settle_seconds: how long a bundle file must go unmodified before it is analyzed
+		record_file: the record of processed bundles, None for RECORD_FILE_NAME in the spool directory
+		clean: remove the directory of each bundle extracted by the watch once it is done
+		once: exit once the bundles in the spool directory have been analyzed, rather than waiting for more
+	"""
+	spool_dir = os.path.abspath(spool_dir)
+	jobs = d2yabt.util.worker_count(jobs)
+	record = ProcessedRecord(record_file or os.path.join(spool_dir, RECORD_FILE_NAME))
+
+	# Bundles which were being analyzed when the watch stopped start again from scratch
+	for file_name in record.get_interrupted():
+		print("Analyzing", file_name, "again, its analysis was interrupted")
+
+		if record.get(file_name).get("extracted_here"):
+			d2yabt.batch.clean_bundle(os.path.join(spool_dir, file_name))
+
+		record.remove(file_name)
+
+	print("Watching", spool_dir, "for bundles, analyzing", jobs, "at a time")
+
+	last_seen = dict()
+	# Bundles which are ready, in the order they finished arriving, waiting for a worker
+	pending = list()
+	running = dict()
+	# How many times each bundle has been retried after its worker process died
+	retries = dict()
+	executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+
+	def skip(file_name, file_stat):
+		"""Returns True for a bundle which has been analyzed or is queued.
+		"""
+		bundle_path = os.path.join(spool_dir, file_name)
+
+		return record.is_processed(file_name, file_stat) or bundle_path in pending or bundle_path in running.values()
+
+	try:
+		while True:
+			ready_paths, arriving_count = poll(spool_dir, last_seen, settle_seconds, skip)
+
+			pending.extend(ready_paths)
+
+			while pending and len(running) < jobs:
+				# A bundle being retried runs on its own, so if its worker dies again it is the cause
+				if running and (retries.get(pending[0]) or any(retries.get(x) for x in running.values())):
+					break
+
+				bundle_path = pending.pop(0)
+
+				try:
+					future = _start_bundle(bundle_path, record, executor, options, clean)
+
+				# The file was removed while it waited
+				except FileNotFoundError:
+					continue
+
+				if future is not None:
+					running[future] = bundle_path
+
+			if once and not running and not pending and not arriving_count:
+				break
+
+			if not running:
+				time.sleep(interval)
+
+				continue
+
+			done_futures, _not_done = concurrent.futures.wait(running, timeout=interval, return_when=concurrent.futures.FIRST_COMPLETED)
+
+			pool_broken = False
+
+			for future in done_futures:
+				bundle_path = running.pop(future)
+
+				try:
+					result = future.result()
+
+				# Every bundle in a pool which breaks fails, so try them again, but not forever
+				except concurrent.futures.process.BrokenProcessPool:
+					pool_broken = True
+
+					if retries.get(bundle_path, 0) < d2yabt.batch.MAX_RETRIES:
+						retries[bundle_path] = retries.get(bundle_path, 0) + 1
+						pending.insert(0, bundle_path)
+
+						continue
+
+					result = d2yabt.batch.failed_result(bundle_path, "The worker process analyzing the bundle exited unexpectedly")
+
+				retries.pop(bundle_path, None)
+
+				_finish_bundle(bundle_path, result, record)
+
+			# A worker which dies takes the pool with it, so start a new one
+			if pool_broken:
+				executor.shutdown(wait=False)
+				executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+
+	finally:
+		executor.shutdown(wait=True, cancel_futures=True)
@@ -38,6 +38,6 @@ setuptools.setup(
 	install_requires=[
 		"pandas",
 	],
-	python_requires='>=3.6',
+	python_requires='>=3.9',
 )
 